@@ -0,0 +1,234 @@
+"""
+Micro-benchmarks of the hot paths of the nodes, without ROS.
+
+Runs every core function on realistic inputs: the simulator track of data/sim_waypoints.csv for
+waypoint and control functions, synthetic camera crops and segmentations for traffic light functions.
+Like timeit, calls are repeated in batches long enough to time reliably, and the best batch counts.
+Prints microseconds per call, optionally compares with a baseline written by an earlier run
+and exits with status 1 if any case got slower than --tolerance.
+
+Usage:
+
+    python -m carla_core.benchmark [--cases compute_cte pid_step] [--output result.json] [--baseline result.json]
+
+With ros/devel/setup.sh sourced, or PYTHONPATH=ros/src/carla_core/src.
+"""
+from __future__ import print_function
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import sys
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+import numpy as np
+
+from carla_core.cte import compute_cte
+from carla_core.lpf_2stages import quick_lpf
+from carla_core.pid import PID
+from carla_core.waypoints import closest_waypoint_index
+from carla_core.yaw_controller import YawController
+
+DEFAULT_WAYPOINTS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 '..', '..', '..', '..', '..', 'data', 'sim_waypoints.csv')
+# Min seconds of one timed batch of calls
+MIN_BATCH_TIME = 0.2
+# Timed batches per case, the best one counts
+REPEAT = 5
+# Waypoints in /final_waypoints, as in styx.launch
+LOOKAHEAD_WPS = 200
+# Vehicle of dbw_sim.launch, and rate of the control loop of dbw_node
+WHEEL_BASE = 3.
+STEER_RATIO = 14.8
+MAX_LAT_ACCEL = 3.
+MAX_STEER_ANGLE = 8.
+CONTROL_PERIOD = 0.02
+# Model input size of TLDetectorSegmentation
+SEGMENTATION_SHAPE = (288, 384)
+
+
+class Fields(object):
+    """Stand-in for ROS messages, with the fields given as keywords"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def make_point(x, y, z=0.):
+    return Fields(x=x, y=y, z=z)
+
+
+def make_pose(x, y, yaw):
+    return Fields(position=make_point(x, y),
+                  orientation=Fields(x=0., y=0., z=math.sin(yaw / 2.), w=math.cos(yaw / 2.)))
+
+
+def make_waypoint(x, y, z):
+    return Fields(pose=Fields(pose=Fields(position=make_point(x, y, z))))
+
+
+def load_waypoints(path):
+    """Waypoints of track csv as the waypoint loader reads it: x, y, z of each row"""
+    with open(path) as wfile:
+        return [make_waypoint(float(row[0]), float(row[1]), float(row[2])) for row in csv.reader(wfile) if row]
+
+
+def poses_along(waypoints, step=5, offset=0.5):
+    """Car poses next to every `step`th waypoint, `offset` meters to the side, heading along the track"""
+    poses = []
+    for i in range(0, len(waypoints), step):
+        a = waypoints[i].pose.pose.position
+        b = waypoints[(i + 1) % len(waypoints)].pose.pose.position
+        yaw = math.atan2(b.y - a.y, b.x - a.x)
+        poses.append(make_pose(a.x - offset * math.sin(yaw), a.y + offset * math.cos(yaw), yaw))
+    return poses
+
+
+def traffic_light_image(lit=0, height=90, width=36):
+    """BGR crop of a traffic light with the `lit`th of its three lamps on, from the top"""
+    import cv2
+    image = np.full((height, width, 3), 40, dtype=np.uint8)
+    colors = [(40, 40, 255), (0, 200, 255), (80, 255, 40)]
+    for i, color in enumerate(colors):
+        center = (width // 2, height * (2 * i + 1) // 6)
+        cv2.circle(image, center, width // 3, color if i == lit else (70, 70, 70), -1)
+    return image
+
+
+def segmentation_heatmap(lights=3, seed=0):
+    """Segmentation of model input size with `lights` traffic light blobs and a few noise pixels"""
+    random = np.random.RandomState(seed)
+    heatmap = np.zeros(SEGMENTATION_SHAPE + (1,), dtype=np.uint8)
+    for i in range(lights):
+        x = 60 + i * 110
+        y = random.randint(20, 120)
+        heatmap[y:y + 30, x:x + 12] = 1
+    noise = random.randint(0, SEGMENTATION_SHAPE[0] * SEGMENTATION_SHAPE[1], 20)
+    heatmap.reshape(-1)[noise] = 1
+    return heatmap
+
+
+def make_cases(waypoints_path):
+    """Returns OrderedDict of case name -> (function, list of argument tuples it cycles through)"""
+    waypoints = load_waypoints(waypoints_path)
+    poses = poses_along(waypoints)
+    cases = OrderedDict()
+
+    # waypoint_updater: search around the last closest waypoint while driving, of the whole track at start
+    state = {'last_index': None}
+
+    def closest_tracking(pose):
+        state['last_index'] = closest_waypoint_index(waypoints, pose, state['last_index'], LOOKAHEAD_WPS)
+    cases['closest_waypoint_index'] = (closest_tracking, [(pose,) for pose in poses])
+    cases['closest_waypoint_index_full'] = (lambda pose: closest_waypoint_index(waypoints, pose),
+                                            [(pose,) for pose in poses[::len(poses) // 10]])
+
+    # dbw_node: cte over /final_waypoints, PID, filter and steering each control step
+    lanes = [(waypoints[i * 5:i * 5 + LOOKAHEAD_WPS], pose) for i, pose in enumerate(poses)
+             if i * 5 + LOOKAHEAD_WPS <= len(waypoints)]
+    cases['compute_cte'] = (compute_cte, lanes)
+    errors = np.random.RandomState(0).normal(0., 0.5, 1000).tolist()
+    pid = PID(0.607900, 0.000172, 1.640951, -MAX_STEER_ANGLE, MAX_STEER_ANGLE)
+    cases['pid_step'] = (pid.step, [(error, CONTROL_PERIOD) for error in errors])
+    lpf = quick_lpf(nT1=2, nT2=15)
+    cases['quick_lpf_filter'] = (lpf.filter, [(error,) for error in errors])
+    steering = [(10., angular, current) for angular, current in
+                zip(np.linspace(-0.5, 0.5, 101).tolist(), np.linspace(0., 12., 101).tolist())]
+    yaw_controller = YawController(WHEEL_BASE, STEER_RATIO, 2., MAX_LAT_ACCEL, MAX_STEER_ANGLE)
+    cases['yaw_controller_get_steering'] = (yaw_controller.get_steering, steering)
+    # steering along all waypoints of /final_waypoints at once
+    linear, angular, current = (np.array(values) for values in zip(*steering))
+    trajectory = [tuple(np.resize(values, LOOKAHEAD_WPS) for values in (linear, angular, current))]
+    cases['yaw_controller_get_steering_many'] = (yaw_controller.get_steering_many, trajectory)
+
+    # tl_detector: classification of a light crop, bounding boxes of a segmentation
+    try:
+        from carla_core.tl_classification import classify_light, labeled_bboxes
+    except ImportError as e:
+        print('skipping traffic light cases: {}'.format(e), file=sys.stderr)
+        return cases
+    cases['classify_light'] = (classify_light, [(traffic_light_image(lit),) for lit in range(3)])
+    cases['labeled_bboxes'] = (labeled_bboxes, [(segmentation_heatmap(seed=seed),) for seed in range(3)])
+    return cases
+
+
+def time_calls(function, inputs, number):
+    """Seconds per call of `number` calls of function cycling through inputs"""
+    inputs = list(itertools.islice(itertools.cycle(inputs), number))
+    start = timer()
+    for args in inputs:
+        function(*args)
+    return (timer() - start) / number
+
+
+def benchmark(function, inputs, repeat=REPEAT, min_batch_time=MIN_BATCH_TIME):
+    """Times function like timeit: finds a number of calls that takes at least min_batch_time,
+    then times `repeat` batches of it.
+
+    Returns:
+        (int, np.array): calls per batch, seconds per call of each batch
+    """
+    number = 1
+    while True:
+        seconds = time_calls(function, inputs, number) * number
+        if seconds >= min_batch_time or number >= 10 ** 7:
+            break
+        number *= 10 if seconds < min_batch_time / 10. else 2
+    return number, np.array([time_calls(function, inputs, number) for _ in range(repeat)])
+
+
+def compare(results, baseline, tolerance):
+    """Names of cases slower than baseline by more than tolerance, relative"""
+    return [name for name, result in results.items()
+            if name in baseline and result['best_us'] > baseline[name]['best_us'] * (1. + tolerance)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark hot paths of the nodes without ROS')
+    parser.add_argument('--waypoints', default=DEFAULT_WAYPOINTS, help='track csv, data/sim_waypoints.csv by default')
+    parser.add_argument('--cases', nargs='+', default=None, help='cases to run, all by default')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='timed batches per case')
+    parser.add_argument('--output', default=None, help='write results as JSON, for --baseline of later runs')
+    parser.add_argument('--baseline', default=None, help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown relative to baseline')
+    args = parser.parse_args()
+
+    cases = make_cases(args.waypoints)
+    names = args.cases or list(cases)
+    unknown = [name for name in names if name not in cases]
+    if unknown:
+        parser.error('unknown cases {}, available: {}'.format(', '.join(unknown), ', '.join(cases)))
+
+    results = OrderedDict()
+    print('{:<36} {:>10} {:>12} {:>12}'.format('case', 'calls', 'best us', 'median us'))
+    for name in names:
+        function, inputs = cases[name]
+        number, seconds = benchmark(function, inputs, args.repeat)
+        results[name] = {'calls': number,
+                         'best_us': float(seconds.min() * 1e6),
+                         'median_us': float(np.median(seconds) * 1e6)}
+        print('{:<36} {:>10} {:>12.3f} {:>12.3f}'.format(name, number, results[name]['best_us'],
+                                                        results[name]['median_us']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = compare(results, baseline, args.tolerance)
+        for name in slower:
+            print('{}: {:.3f} us, baseline {:.3f} us'.format(name, results[name]['best_us'],
+                                                             baseline[name]['best_us']), file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
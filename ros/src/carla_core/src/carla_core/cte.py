@@ -6,7 +6,7 @@ Cross Track Error (CTE).
 import math
 import numpy as np
 
-from tf.transformations import euler_from_quaternion
+from carla_core.waypoints import yaw_from_orientation
 
 # How many waypoints to use to fit polynomial
 WAYPOINTS_LOOKAHEAD = 20
@@ -39,14 +39,3 @@ def get_points_wrt_pose(waypoints, pose):
         shifted_rotated_ys.append(shift_x * math.sin(0 - yaw) + shift_y * math.cos(0 - yaw))
 
     return shifted_rotated_xs, shifted_rotated_ys
-
-def yaw_from_orientation(orientation):
-    """ Computes yaw of orientation
-    """
-    quaternion = [orientation.x,
-                  orientation.y,
-                  orientation.z,
-                  orientation.w]
-    _, _, yaw = euler_from_quaternion(quaternion)
-
-    return yaw
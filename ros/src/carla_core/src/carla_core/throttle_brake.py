@@ -0,0 +1,35 @@
+"""
+Throttle and brake commands of Controller from the output of its throttle/brake PID.
+
+Shared by Controller and the offline twiddle of twist_controller, so that gains tuned offline
+see the same throttle filtering and brake torque as on the car.
+"""
+
+from carla_core.lpf_2stages import quick_lpf
+
+# Max brake torque, N*m. Same as BrakeCmd.TORQUE_MAX of dbw_mkz_msgs
+BRAKE_TORQUE_MAX = 3412.
+
+
+class ThrottleBrake(object):
+    """Filters PID output into throttle percentage, brakes with a filtered ramp up to max torque"""
+
+    def __init__(self, max_throttle_pct=1.0, max_braking_pct=-1.0):
+        self.max_throttle_pct = max_throttle_pct
+        self.max_braking_pct = max_braking_pct
+        self.avg_filter = quick_lpf(nT1=2, nT2=15)
+        self.avg_filter_brake = quick_lpf(nT1=7, nT2=15)
+
+    def control(self, accel, linear_velocity, current_velocity):
+        """Throttle and brake for PID output `accel` with target and current velocity.
+
+        Returns:
+            (float, float): throttle percentage and brake torque, N*m. One of them is 0.
+        """
+        accel = self.avg_filter.filter(accel)
+
+        if accel < 0.0 or linear_velocity < current_velocity:
+            self.avg_filter.clear()
+            return 0., self.avg_filter_brake.filter(BRAKE_TORQUE_MAX) * abs(self.max_braking_pct)
+
+        return min(accel, self.max_throttle_pct), 0.
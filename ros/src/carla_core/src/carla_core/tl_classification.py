@@ -0,0 +1,92 @@
+"""
+Traffic light image processing of the traffic light detector: bounding boxes of segmented
+traffic lights and classification of their color. Needs OpenCV and scipy.
+"""
+
+import cv2
+import numpy as np
+from scipy.ndimage.measurements import label
+
+# Traffic light colors, same IDs as in styx_msgs/TrafficLight
+RED = 0
+YELLOW = 1
+GREEN = 2
+UNKNOWN = 4
+
+
+def labeled_bboxes(heatmap):
+    """
+    Use labels() from scipy.ndimage.measurements
+    to group pixel blobs into instances of traffic lights
+
+    :param heatmap: segmentation of the image, non zero at traffic light pixels
+    :return: list of bounding boxes
+    """
+    labels = label(heatmap)
+    bboxes = []
+    for tl_number in range(1, labels[1] + 1):
+        # Find pixels with each tl_number label value
+        nonzero = (labels[0] == tl_number).nonzero()
+        # Identify x and y values of those pixels
+        nonzeroy = np.array(nonzero[0])
+        nonzerox = np.array(nonzero[1])
+        # Define a bounding box based on min/max x and y
+        bbox = ((np.min(nonzerox), np.min(nonzeroy)), (np.max(nonzerox), np.max(nonzeroy)))
+        # skip boxes which do not look realistic. too small in one dimension
+        w = bbox[1][0] - bbox[0][0]
+        h = bbox[1][1] - bbox[0][1]
+        if w < 4 or h < 8:
+            continue
+        bboxes.append(bbox)
+    return bboxes
+
+
+def classify_light(image):
+    """Determines the color of the traffic light in the image
+    Using CIELUV colorspace, the classifier extracts the lightness parameter of top, middle, and bottom areas of the image.
+    The area of the image with highest L value corresponds to the section of the traffic light that is currently lit up.
+    See TLClassifier.get_classification.
+
+    Args:
+        image (cv::Mat): BGR image containing the traffic light, with just the 3 lights/bulbs,
+            and cropped to include minimum background
+
+    Returns:
+        (int, float): ID of traffic light color (RED, YELLOW, GREEN or UNKNOWN) and confidence:
+            relative margin of the brightest section over the second brightest,
+            from 0 (tie) to 1 (only one section lit)
+    """
+    # An initial cropping can be applied to the image, to minimize the amount of background area outside of the traffic light. Tweak depending on the image source used.
+    img_h, img_w, _ = image.shape
+
+    height_trim = 0.1
+    width_trim = 0.1
+
+    # Image is trimmed, converted to CIELUV and L channel is extracted
+    l_channel = cv2.cvtColor(image, cv2.COLOR_BGR2LUV)[int(height_trim*img_h):int((1.0 - height_trim)*img_h),int(width_trim*img_w):int((1.0-width_trim)*img_w),0]
+
+    # Markers are established to enable splitting the image into top, mid, and bottom thirds
+    img_h, img_w = l_channel.shape
+
+    top_third_marker = int(img_h / 3)
+    bottom_third_marker = img_h - top_third_marker
+
+    # Magnitude of L is established for each section of the image.
+    # Summed as int64: sums of uint8 pixels wrap around with NumPy 2 scalar promotion
+    count_result = {'RED': 0 , 'YELLOW': 0, 'GREEN': 0}
+    count_result['RED'] = int(l_channel[:top_third_marker].sum(dtype=np.int64))
+    count_result['YELLOW'] = int(l_channel[top_third_marker:bottom_third_marker].sum(dtype=np.int64))
+    count_result['GREEN'] = int(l_channel[bottom_third_marker:].sum(dtype=np.int64))
+
+    #The result is classified into one of the 3 colors and returned
+    max_count = max(count_result, key=count_result.get)
+    sorted_counts = sorted(count_result.values(), reverse=True)
+    confidence = float(sorted_counts[0] - sorted_counts[1]) / sorted_counts[0] if sorted_counts[0] > 0 else 0.
+
+    if max_count == 'RED':
+        return RED, confidence
+    elif max_count == 'YELLOW':
+        return YELLOW, confidence
+    elif max_count == 'GREEN':
+        return GREEN, confidence
+    return UNKNOWN, confidence
@@ -0,0 +1,97 @@
+"""
+Waypoint geometry of the waypoint updater.
+
+Functions take styx_msgs/Waypoint and geometry_msgs/Pose messages, or any objects with the same fields.
+"""
+
+import math
+
+# Default number of waypoints ahead of the last closest one to search for the new closest one
+LOOKAHEAD_WPS = 200
+
+
+def distance(a, b):
+    """Euclidean distance of two points"""
+    return math.sqrt((a.x-b.x)**2 + (a.y-b.y)**2 + (a.z-b.z)**2)
+
+
+def yaw_from_orientation(orientation):
+    """Yaw of quaternion orientation, as tf.transformations.euler_from_quaternion computes it
+    for poses on the ground (pitch away from +-90 degrees).
+    """
+    x, y, z, w = orientation.x, orientation.y, orientation.z, orientation.w
+    return math.atan2(2. * (w * z + x * y), w * w + x * x - y * y - z * z)
+
+
+def is_waypoint_behind_pose(pose, waypoint):
+    """Check that waypoint is ahead of given pose w.r.t. to pose direction."""
+    yaw = yaw_from_orientation(pose.orientation)
+
+    shift_x = waypoint.pose.pose.position.x - pose.position.x
+    shift_y = waypoint.pose.pose.position.y - pose.position.y
+
+    shifted_rotated_x = shift_x * math.cos(0 - yaw) - shift_y * math.sin(0 - yaw)
+
+    return False if shifted_rotated_x > 0 else True
+
+
+def waypoint_indices(start_index, length, total):
+    """Computes a cyclic list of waypoint indices.
+
+    Args:
+    start_index (int): Initial index of the list
+    length (int): Desired length of resulting list, at most total
+    total (int): Number of waypoints
+
+    Returns:
+    cyclic list of waypoint indices
+    """
+
+    # making sure that length does not overpass base waypoints length
+    length = min(total, length)
+
+    end_index = start_index + length
+    q, r = divmod(end_index, total)
+
+    # q can either be 0 or 1
+    if q == 0:
+        return list(range(start_index, r))
+
+    return list(range(start_index, total)) + list(range(0, r))
+
+
+def closest_waypoint_index(waypoints, pose, last_index=None, lookahead=LOOKAHEAD_WPS):
+    """Computes the index of closest waypoint ahead of pose.
+
+    Args:
+    waypoints (list): base waypoints of the track
+    pose: current pose
+    last_index (int): last closest waypoint, searches the whole track if None
+    lookahead (int): number of waypoints after last_index to search
+
+    Returns:
+    index of closest waypoint which is not behind pose
+    """
+    total = len(waypoints)
+    if last_index is None:
+        possible_waypoint_indices = waypoint_indices(0, total, total)
+        closest_distance = float('inf')
+    else:
+        possible_waypoint_indices = waypoint_indices(last_index, lookahead, total)
+        closest_distance = distance(waypoints[last_index].pose.pose.position, pose.position)
+
+    prev_index = possible_waypoint_indices[0]
+
+    for index in possible_waypoint_indices[1:]:
+        waypoint_distance = distance(waypoints[index].pose.pose.position, pose.position)
+
+        if waypoint_distance > closest_distance:
+            break
+        closest_distance = waypoint_distance
+        prev_index = index
+
+    while is_waypoint_behind_pose(pose, waypoints[prev_index]):
+        prev_index += 1
+        prev_index %= total
+
+    return prev_index
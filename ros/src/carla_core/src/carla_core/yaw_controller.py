@@ -0,0 +1,63 @@
+from math import atan
+
+import numpy as np
+
+
+class YawController(object):
+    """
+    Computes steering wheel angle to achieve given angular velocity.
+
+    `get_steering_many` does the same for arrays of velocities, e.g. a whole planned trajectory at once.
+    """
+    def __init__(self, wheel_base, steer_ratio, min_speed, max_lat_accel, max_steer_angle):
+        self.wheel_base = wheel_base
+        self.steer_ratio = steer_ratio
+        self.min_speed = min_speed
+        self.max_lat_accel = max_lat_accel
+
+        self.min_angle = -max_steer_angle
+        self.max_angle = max_steer_angle
+
+    def _analytic_angles(self, curvatures):
+        angles = np.arctan(self.wheel_base * curvatures) * self.steer_ratio
+        return np.clip(angles, self.min_angle, self.max_angle)
+
+    def get_angle(self, radius):
+        angle = atan(self.wheel_base / radius) * self.steer_ratio
+        return max(self.min_angle, min(self.max_angle, angle))
+
+    def get_steering(self, linear_velocity, angular_velocity, current_velocity):
+        angular_velocity = current_velocity * angular_velocity / linear_velocity if abs(linear_velocity) > 0. else 0.
+
+        if abs(current_velocity) > 0.1:
+            max_yaw_rate = abs(self.max_lat_accel / current_velocity)
+            angular_velocity = max(-max_yaw_rate, min(max_yaw_rate, angular_velocity))
+
+        return self.get_angle(max(current_velocity, self.min_speed) / angular_velocity) if abs(angular_velocity) > 0. else 0.0
+
+    def get_steering_many(self, linear_velocity, angular_velocity, current_velocity):
+        """Vectorized get_steering, e.g. for all waypoints of a planned trajectory.
+
+        Arguments are arrays or scalars, broadcast against each other.
+
+        Returns:
+            np.array: steering angles
+        """
+        linear_velocity, angular_velocity, current_velocity = np.broadcast_arrays(
+            np.asarray(linear_velocity, dtype=np.float64),
+            np.asarray(angular_velocity, dtype=np.float64),
+            np.asarray(current_velocity, dtype=np.float64))
+
+        moving = np.abs(linear_velocity) > 0.
+        angular_velocity = np.where(moving,
+                                    current_velocity * angular_velocity / np.where(moving, linear_velocity, 1.),
+                                    0.)
+
+        limited = np.abs(current_velocity) > 0.1
+        max_yaw_rate = np.abs(self.max_lat_accel / np.where(limited, current_velocity, 1.))
+        angular_velocity = np.where(limited, np.clip(angular_velocity, -max_yaw_rate, max_yaw_rate), angular_velocity)
+
+        curvatures = angular_velocity / np.maximum(current_velocity, self.min_speed)
+        angles = self._analytic_angles(curvatures)
+
+        return np.where(angular_velocity != 0., angles, 0.)
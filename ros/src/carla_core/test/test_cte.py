@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Unit tests of carla_core.cte on the simulator track and on a straight lane
+"""
+import math
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from carla_core.benchmark import DEFAULT_WAYPOINTS, LOOKAHEAD_WPS, load_waypoints, make_pose, make_waypoint, poses_along
+from carla_core.cte import WAYPOINTS_LOOKAHEAD, compute_cte, get_points_wrt_pose
+
+
+def euler_yaw(orientation):
+    """Yaw of tf.transformations.euler_from_quaternion (static xyz axes), any pitch and roll"""
+    x, y, z, w = orientation.x, orientation.y, orientation.z, orientation.w
+    return math.atan2(2. * (w * z + x * y), 1. - 2. * (y * y + z * z))
+
+
+def reference_cte(waypoints, pose):
+    """compute_cte of dbw_node before the extraction into carla_core, yaw of tf"""
+    yaw = euler_yaw(pose.orientation)
+    xs, ys = [], []
+    for waypoint in waypoints[:WAYPOINTS_LOOKAHEAD]:
+        shift_x = waypoint.pose.pose.position.x - pose.position.x
+        shift_y = waypoint.pose.pose.position.y - pose.position.y
+        xs.append(shift_x * math.cos(0 - yaw) - shift_y * math.sin(0 - yaw))
+        ys.append(shift_x * math.sin(0 - yaw) + shift_y * math.cos(0 - yaw))
+    return np.poly1d(np.polyfit(xs, ys, 2))(2)
+
+
+def lanes(waypoints, offset):
+    """(lane of /final_waypoints, pose) next to every 5th waypoint, `offset` meters left of the track"""
+    return [(waypoints[i * 5:i * 5 + LOOKAHEAD_WPS], pose)
+            for i, pose in enumerate(poses_along(waypoints, offset=offset))
+            if i * 5 + LOOKAHEAD_WPS <= len(waypoints)]
+
+
+class TestCte(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.waypoints = load_waypoints(DEFAULT_WAYPOINTS)
+
+    def test_straight_lane(self):
+        # lane along y = 1 heading +x: the car 1 m right of it
+        lane = [make_waypoint(float(x), 1., 0.) for x in range(30)]
+        self.assertAlmostEqual(compute_cte(lane, make_pose(3., 0., 0.)), 1.)
+        # same lane heading -y, seen from a car on it
+        lane = [make_waypoint(5., -float(y), 0.) for y in range(30)]
+        self.assertAlmostEqual(compute_cte(lane, make_pose(5., 2., -math.pi / 2.)), 0.)
+
+    def test_points_wrt_pose(self):
+        lane = [make_waypoint(1., 3., 0.)]
+        xs, ys = get_points_wrt_pose(lane, make_pose(1., 1., math.pi / 2.))
+        self.assertAlmostEqual(xs[0], 2.)
+        self.assertAlmostEqual(ys[0], 0.)
+
+    def test_offset_from_track(self):
+        # the track is on the right of a car left of it, cte is negative
+        for offset in (0.5, -0.5):
+            ctes = [compute_cte(lane, pose) for lane, pose in lanes(self.waypoints, offset)]
+            np.testing.assert_allclose(ctes, -offset, atol=0.1)
+
+    def test_as_before(self):
+        for lane, pose in lanes(self.waypoints, 0.5):
+            self.assertAlmostEqual(compute_cte(lane, pose), reference_cte(lane, pose))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Unit tests of carla_core.tl_classification on synthetic light crops and segmentations
+"""
+import os
+import sys
+import unittest
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from carla_core.benchmark import segmentation_heatmap, traffic_light_image
+from carla_core.tl_classification import GREEN, RED, YELLOW, classify_light, labeled_bboxes
+
+
+class TestClassifyLight(unittest.TestCase):
+
+    def test_lit_lamp(self):
+        for lit, color in enumerate((RED, YELLOW, GREEN)):
+            state, confidence = classify_light(traffic_light_image(lit))
+            self.assertEqual(state, color)
+            self.assertGreater(confidence, 0.)
+            self.assertLessEqual(confidence, 1.)
+
+    def test_bgr_red_lamp(self):
+        # lit red lamp of a camera frame, unlit lamps lighter than its blue channel alone
+        image = np.full((90, 36, 3), 40, dtype=np.uint8)
+        for i in range(3):
+            cv2.circle(image, (18, 15 + 30 * i), 12, (0, 0, 255) if i == 0 else (90, 90, 90), -1)
+        state, confidence = classify_light(image)
+        self.assertEqual(state, RED)
+        self.assertGreater(confidence, 0.1)
+
+    def test_bright_crop_does_not_wrap_around(self):
+        # sums of L over thirds exceed 255 by far
+        image = traffic_light_image(2, height=300, width=120)
+        self.assertEqual(classify_light(image)[0], GREEN)
+
+    def test_no_lamp_lit(self):
+        image = np.full((90, 36, 3), 40, dtype=np.uint8)
+        self.assertEqual(classify_light(image)[1], 0.)
+
+    def test_black_image(self):
+        self.assertEqual(classify_light(np.zeros((90, 36, 3), dtype=np.uint8))[1], 0.)
+
+
+class TestLabeledBboxes(unittest.TestCase):
+
+    def test_lights_without_noise(self):
+        bboxes = labeled_bboxes(segmentation_heatmap(lights=3))
+        self.assertEqual(len(bboxes), 3)
+        for (x1, y1), (x2, y2) in bboxes:
+            self.assertEqual((x2 - x1, y2 - y1), (11, 29))
+
+    def test_empty(self):
+        self.assertEqual(labeled_bboxes(segmentation_heatmap(lights=0)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
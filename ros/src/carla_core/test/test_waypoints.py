@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Unit tests of carla_core.waypoints on the simulator track, against the algorithm waypoint_updater used before
+"""
+import math
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from carla_core.benchmark import DEFAULT_WAYPOINTS, LOOKAHEAD_WPS, load_waypoints, make_pose, poses_along
+from carla_core.waypoints import closest_waypoint_index, waypoint_indices, yaw_from_orientation
+
+
+def euler_yaw(orientation):
+    """Yaw of tf.transformations.euler_from_quaternion (static xyz axes), any pitch and roll"""
+    x, y, z, w = orientation.x, orientation.y, orientation.z, orientation.w
+    return math.atan2(2. * (w * z + x * y), 1. - 2. * (y * y + z * z))
+
+
+def reference_closest_index(waypoints, pose, last_index=None):
+    """WaypointUpdater._closest_waypoint_index before the extraction into carla_core"""
+    total = len(waypoints)
+
+    def dl(a, b):
+        return math.sqrt((a.x - b.x) ** 2 + (a.y - b.y) ** 2 + (a.z - b.z) ** 2)
+
+    def indices(start_index, length):
+        length = min(total, length)
+        q, r = divmod(start_index + length, total)
+        return list(range(start_index, r)) if q == 0 else list(range(start_index, total)) + list(range(0, r))
+
+    def is_behind(waypoint):
+        yaw = euler_yaw(pose.orientation)
+        shift_x = waypoint.pose.pose.position.x - pose.position.x
+        shift_y = waypoint.pose.pose.position.y - pose.position.y
+        return not shift_x * math.cos(0 - yaw) - shift_y * math.sin(0 - yaw) > 0
+
+    if last_index is None:
+        possible = indices(0, total)
+        closest_distance = float('inf')
+    else:
+        possible = indices(last_index, LOOKAHEAD_WPS)
+        closest_distance = dl(waypoints[last_index].pose.pose.position, pose.position)
+    prev_index = possible.pop(0)
+    closer_point_found = True
+    while closer_point_found and possible:
+        index = possible.pop(0)
+        distance = dl(waypoints[index].pose.pose.position, pose.position)
+        if distance > closest_distance:
+            closer_point_found = False
+        else:
+            closest_distance = distance
+            prev_index = index
+    while is_behind(waypoints[prev_index]):
+        prev_index = (prev_index + 1) % total
+    return prev_index
+
+
+class TestWaypoints(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.waypoints = load_waypoints(DEFAULT_WAYPOINTS)
+        cls.poses = poses_along(cls.waypoints)
+
+    def test_closest_index_tracking_as_before(self):
+        last, reference_last = None, None
+        for pose in self.poses:
+            last = closest_waypoint_index(self.waypoints, pose, last, LOOKAHEAD_WPS)
+            reference_last = reference_closest_index(self.waypoints, pose, reference_last)
+            self.assertEqual(last, reference_last)
+
+    def test_closest_index_full_search_as_before(self):
+        for pose in self.poses[::len(self.poses) // 20]:
+            self.assertEqual(closest_waypoint_index(self.waypoints, pose),
+                             reference_closest_index(self.waypoints, pose))
+
+    def test_closest_index_tracking_is_next_to_pose(self):
+        # car poses are next to every 5th waypoint, half a meter to the side. Only while tracking:
+        # the search of the whole track stops at the first local minimum, where the track passes near itself
+        last = None
+        for i, pose in enumerate(self.poses[:-1]):
+            last = closest_waypoint_index(self.waypoints, pose, last, LOOKAHEAD_WPS)
+            self.assertIn(last, (i * 5, i * 5 + 1))
+
+    def test_yaw_as_tf_on_ground(self):
+        for yaw in np.linspace(-math.pi + 0.01, math.pi - 0.01, 50):
+            orientation = make_pose(0., 0., yaw).orientation
+            self.assertAlmostEqual(yaw_from_orientation(orientation), yaw)
+            self.assertAlmostEqual(yaw_from_orientation(orientation), euler_yaw(orientation))
+
+    def test_waypoint_indices_wrap_around(self):
+        self.assertEqual(waypoint_indices(2, 3, 10), [2, 3, 4])
+        self.assertEqual(waypoint_indices(8, 4, 10), [8, 9, 0, 1])
+        self.assertEqual(waypoint_indices(5, 20, 10), [5, 6, 7, 8, 9, 0, 1, 2, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Collects LatencyTrace messages of the driving pipeline into latency histograms, see instrumentation.tracing.
+
+For every telemetry event only the first time each hop handled it counts. Histograms:
+- 'total <hop>': from telemetry event to hop
+- 'hop <from> -> <to>': between consecutive hops, see tracing.STAGES
+
+They are published on /diagnostics every ~latency_period seconds and logged (and written to ~latency_dump)
+at shutdown, like the latency histograms of the nodes.
+
+Params:
+- ~max_pending: number of most recent telemetry events whose hops are kept to match later hops (1000)
+"""
+from collections import OrderedDict
+
+import rospy
+from styx_msgs.msg import LatencyTrace
+
+from instrumentation.latency import LatencyStats
+from instrumentation.diagnostics import LatencyPublisher
+from instrumentation.tracing import TRACE_TOPIC, STAGES
+
+
+class LatencyCollector(object):
+    """Matches hops of every traced telemetry event and records latencies between them"""
+
+    def __init__(self):
+        rospy.init_node('latency_collector')
+        self.max_pending = rospy.get_param('~max_pending', 1000)
+        self.latency = LatencyStats()
+        LatencyPublisher(self.latency)
+        # (secs, nsecs) of telemetry event -> {hop: seconds}, oldest first
+        self.traces = OrderedDict()
+        rospy.Subscriber(TRACE_TOPIC, LatencyTrace, self.trace_cb, queue_size=100)
+        rospy.spin()
+
+    def trace_cb(self, msg):
+        origin = msg.header.stamp
+        hops = self.traces.get((origin.secs, origin.nsecs))
+        if hops is None:
+            hops = self.traces[(origin.secs, origin.nsecs)] = {}
+            if len(self.traces) > self.max_pending:
+                self.traces.popitem(last=False)
+        if msg.hop in hops:
+            return
+        hop_time = msg.hop_stamp.to_sec()
+        hops[msg.hop] = hop_time
+        self.latency.record('total {}'.format(msg.hop), hop_time - origin.to_sec())
+        # traces of different nodes may arrive out of order
+        for start, end in STAGES:
+            if end == msg.hop and start in hops:
+                self.latency.record('hop {} -> {}'.format(start, end), hop_time - hops[start])
+            elif start == msg.hop and end in hops:
+                self.latency.record('hop {} -> {}'.format(start, end), hops[end] - hop_time)
+
+
+if __name__ == '__main__':
+    try:
+        LatencyCollector()
+    except rospy.ROSInterruptException:
+        rospy.logerr('Could not start latency collector node.')
@@ -0,0 +1,60 @@
+"""
+Publishes LatencyStats of a node on /diagnostics and dumps them at shutdown.
+
+One DiagnosticStatus per histogram, named '<node>: <histogram>', with count, mean, percentiles
+and max in milliseconds as values. Summaries are cumulative since node start.
+
+Params (private, of the node using it):
+- ~latency_period: seconds between publications (5), 0 disables publishing
+- ~latency_dump: YAML file to write summaries to at shutdown, none by default.
+  Summaries are logged at shutdown either way. Components of one node (see node_composition)
+  write one file each, with the component name appended.
+"""
+import os
+
+import yaml
+
+import rospy
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+
+# Default seconds between publications on /diagnostics
+LATENCY_PERIOD = 5.
+
+
+class LatencyPublisher(object):
+    """Periodically publishes LatencyStats of a node. Create after rospy.init_node."""
+
+    def __init__(self, stats, node_name=None):
+        self.stats = stats
+        self.node_name = node_name or rospy.get_name()
+        self.dump_path = rospy.get_param('~latency_dump', None)
+        if self.dump_path and self.node_name != rospy.get_name():
+            root, ext = os.path.splitext(self.dump_path)
+            self.dump_path = '{}_{}{}'.format(root, self.node_name.split('/')[-1], ext)
+        period = rospy.get_param('~latency_period', LATENCY_PERIOD)
+        self.pub = rospy.Publisher('/diagnostics', DiagnosticArray, queue_size=1)
+        if period > 0:
+            rospy.Timer(rospy.Duration(period), self.publish)
+        rospy.on_shutdown(self.dump)
+
+    def publish(self, event=None):
+        msg = DiagnosticArray()
+        msg.header.stamp = rospy.Time.now()
+        for name, summary in self.stats.summaries():
+            status = DiagnosticStatus(level=DiagnosticStatus.OK,
+                                      name='{}: {}'.format(self.node_name, name),
+                                      message='latency',
+                                      hardware_id=self.node_name)
+            status.values = [KeyValue(key, '{:.3f}'.format(value) if isinstance(value, float) else str(value))
+                             for key, value in sorted(summary.items())]
+            msg.status.append(status)
+        self.pub.publish(msg)
+
+    def dump(self):
+        """Logs summaries and writes them to ~latency_dump if set"""
+        rospy.logwarn("{}: latency summary\n{}".format(self.node_name, self.stats.format_table()))
+        if self.dump_path:
+            with open(self.dump_path, 'w') as dump_file:
+                yaml.safe_dump({'node': self.node_name, 'latency': dict(self.stats.summaries())},
+                               dump_file, default_flow_style=False)
+
@@ -0,0 +1,166 @@
+"""
+Latency histograms of callbacks and loops. No ROS dependency.
+
+Every sample is counted in one of fixed, geometrically spaced buckets, so recording costs
+a bisect and an increment, memory does not grow with run time and percentiles can be
+estimated at any time. Bucket bounds grow by BUCKET_RATIO, which bounds the relative error
+of percentiles.
+
+    stats = LatencyStats()
+    rospy.Subscriber('/current_pose', PoseStamped, stats.timed('pose_cb', self.pose_cb))
+    while not rospy.is_shutdown():
+        with stats.measure('loop'):
+            ...
+"""
+import bisect
+import math
+import threading
+from timeit import default_timer as timer
+
+# Smallest and largest bucket bounds, seconds. Faster samples fall into the first bucket,
+# slower ones into an overflow bucket.
+MIN_LATENCY = 1e-5
+MAX_LATENCY = 10.
+# Ratio of consecutive bucket bounds
+BUCKET_RATIO = 1.2
+
+PERCENTILES = [50, 90, 99]
+
+
+def bucket_bounds(min_latency=MIN_LATENCY, max_latency=MAX_LATENCY, ratio=BUCKET_RATIO):
+    """Upper bounds of buckets, seconds, from min_latency up to at least max_latency"""
+    count = int(math.ceil(math.log(max_latency / min_latency) / math.log(ratio))) + 1
+    return [min_latency * ratio ** i for i in range(count)]
+
+
+class LatencyHistogram(object):
+    """Counts of samples per latency bucket, with sum and max"""
+
+    def __init__(self, bounds=None):
+        self.bounds = bounds if bounds is not None else bucket_bounds()
+        # last bucket counts samples above the last bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        """Counts one sample"""
+        i = bisect.bisect_left(self.bounds, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self):
+        """Copy that is consistent while this histogram keeps counting"""
+        copy = LatencyHistogram(self.bounds)
+        with self.lock:
+            copy.counts = list(self.counts)
+            copy.count = self.count
+            copy.total = self.total
+            copy.max = self.max
+        return copy
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.
+
+    def percentile(self, percentile):
+        """Estimated latency below which `percentile` percent of samples are, seconds.
+        Interpolated within the bucket, never above the max sample.
+        """
+        if not self.count:
+            return 0.
+        rank = percentile / 100. * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def summary(self):
+        """dict of count, mean, max and PERCENTILES in milliseconds"""
+        summary = {'count': self.count, 'mean_ms': self.mean() * 1000., 'max_ms': self.max * 1000.}
+        for percentile in PERCENTILES:
+            summary['p{}_ms'.format(percentile)] = self.percentile(percentile) * 1000.
+        return summary
+
+
+class _Measurement(object):
+    """Context manager adding time spent in its block to histogram"""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.add(timer() - self.start)
+        return False
+
+
+class LatencyStats(object):
+    """Named latency histograms of one node"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, name):
+        """Histogram `name`, created on first use"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def record(self, name, seconds):
+        self.histogram(name).add(seconds)
+
+    def measure(self, name):
+        """Context manager timing its block into histogram `name`"""
+        return _Measurement(self.histogram(name))
+
+    def timed(self, name, callback=None):
+        """Wraps callback to time every call into histogram `name`.
+        Without callback returns a decorator.
+        """
+        if callback is None:
+            return lambda function: self.timed(name, function)
+        histogram = self.histogram(name)
+
+        def timed_callback(*args, **kwargs):
+            start = timer()
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                histogram.add(timer() - start)
+        timed_callback.__name__ = getattr(callback, '__name__', name)
+        timed_callback.__doc__ = getattr(callback, '__doc__', None)
+        return timed_callback
+
+    def summaries(self):
+        """list of (name, summary dict), sorted by name"""
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+        return [(name, histogram.snapshot().summary()) for name, histogram in histograms]
+
+    def format_table(self):
+        """Summaries as fixed width text table, one line per histogram"""
+        columns = ['count', 'mean_ms'] + ['p{}_ms'.format(p) for p in PERCENTILES] + ['max_ms']
+        summaries = self.summaries()
+        width = max([len(name) for name, _ in summaries] + [4])
+        lines = ['{:<{width}} '.format('name', width=width) + ' '.join('{:>9}'.format(c) for c in columns)]
+        for name, summary in summaries:
+            values = ['{:>9d}'.format(summary['count'])] + ['{:>9.3f}'.format(summary[c]) for c in columns[1:]]
+            lines.append('{:<{width}} '.format(name, width=width) + ' '.join(values))
+        return '\n'.join(lines)
@@ -0,0 +1,110 @@
+"""
+Columnar trace recorder.
+
+Rows of float values are collected into a preallocated NumPy buffer and appended
+to a raw binary file whenever the buffer is full or `flush` is called.
+Column names and dtype are kept in a small YAML file next to the data file.
+A crash of the process loses at most the rows collected since the last write,
+a crash of the machine the rows since the last `flush`, which syncs the file to disk.
+
+Use `read_trace` to load a whole recorded session in one call. Records dbw_test.py outputs,
+control traces of dbw_node and channels of waypoint_updater/telemetry_recorder.py.
+"""
+import os
+import threading
+
+import numpy as np
+import yaml
+
+DEFAULT_CHUNK_SIZE = 4096
+# Columns of control cycle traces of dbw_node (~control_trace), input of twiddle_offline.py
+CONTROL_COLUMNS = ['time', 'current_velocity', 'linear_velocity', 'angular_velocity', 'cte']
+
+
+def header_path(path):
+    """Path of YAML file describing columns of data file `path`."""
+    return path + '.yaml'
+
+
+class TraceRecorder(object):
+    """
+    Append-only recorder of fixed set of columns.
+
+    `append` may be called from several rospy callback threads. It never waits for the disk to sync,
+    and does nothing once the recorder is closed.
+    """
+
+    def __init__(self, path, columns, chunk_size=DEFAULT_CHUNK_SIZE, dtype=np.float64):
+        self.path = path
+        self.columns = list(columns)
+        self.dtype = np.dtype(dtype)
+        self.lock = threading.Lock()
+        self.buffer = np.empty((chunk_size, len(self.columns)), dtype=self.dtype)
+        self.size = 0
+        self.rows_written = 0
+
+        with open(header_path(path), 'w') as header_file:
+            yaml.safe_dump({'columns': self.columns, 'dtype': self.dtype.str}, header_file,
+                           default_flow_style=False)
+        # truncate old session
+        self.data_file = open(path, 'wb')
+
+    def append(self, *values):
+        """Adds one row. Number of values has to match number of columns."""
+        with self.lock:
+            if self.data_file.closed:
+                return
+            self.buffer[self.size] = values
+            self.size += 1
+            if self.size == len(self.buffer):
+                self._write()
+
+    def flush(self):
+        """Writes buffered rows and syncs the file to disk."""
+        with self.lock:
+            self._write(sync=True)
+
+    def close(self):
+        """Writes buffered rows, syncs and closes the file."""
+        with self.lock:
+            self._write(sync=True)
+            self.data_file.close()
+
+    def _write(self, sync=False):
+        if self.data_file.closed:
+            return
+        if self.size > 0:
+            self.buffer[:self.size].tofile(self.data_file)
+            self.data_file.flush()
+            self.rows_written += self.size
+            self.size = 0
+        if sync:
+            os.fsync(self.data_file.fileno())
+
+
+def read_trace(path, mmap=False):
+    """Loads data recorded by TraceRecorder.
+
+    Args:
+        path (str): data file path given to TraceRecorder
+        mmap (bool): memory map the file instead of reading it
+
+    Returns:
+        dict: column name -> 1d array. Arrays are views of one (rows, columns) array.
+    """
+    with open(header_path(path)) as header_file:
+        header = yaml.safe_load(header_file)
+    columns = header['columns']
+    dtype = np.dtype(header['dtype'])
+
+    # last row may be incomplete if recorder process was killed while writing
+    rows = os.path.getsize(path) // (dtype.itemsize * len(columns))
+    if mmap:
+        if rows == 0:
+            data = np.empty((0, len(columns)), dtype=dtype)
+        else:
+            data = np.memmap(path, dtype=dtype, mode='r', shape=(rows, len(columns)))
+    else:
+        data = np.fromfile(path, dtype=dtype, count=rows * len(columns)).reshape(rows, len(columns))
+
+    return dict((column, data[:, i]) for i, column in enumerate(columns))
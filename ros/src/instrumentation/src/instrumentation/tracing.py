@@ -0,0 +1,43 @@
+"""
+End-to-end latency tracing from simulator telemetry to actuator commands.
+
+The time of a telemetry event is its trace ID. The styx server stamps /current_pose with it,
+and every stage keeps the stamp of its input in the header of its output:
+
+    telemetry -> /current_pose -> pure_pursuit -> /twist_cmd -> dbw_node -> /vehicle/*_cmd -> emit
+                              '-> waypoint_updater -> /final_waypoints
+
+Stages call TracePublisher.trace when they handle traced data, latency_collector.py
+turns the traces into per-hop and total latency histograms. DBW commands have no header,
+so the styx server listens to dbw_cmd traces to know which telemetry event the commands it emits come from.
+"""
+import rospy
+from styx_msgs.msg import LatencyTrace
+
+TRACE_TOPIC = '/latency_trace'
+
+# Hops of the traced pipeline, in order
+TELEMETRY = 'telemetry'
+FINAL_WAYPOINTS = 'final_waypoints'
+TWIST_CMD = 'twist_cmd'
+DBW_CMD = 'dbw_cmd'
+EMIT = 'emit'
+HOPS = [TELEMETRY, FINAL_WAYPOINTS, TWIST_CMD, DBW_CMD, EMIT]
+# Stages between hops as (from, to). /final_waypoints is a branch, pure_pursuit uses whatever
+# waypoints it has when the pose arrives.
+STAGES = [(TELEMETRY, FINAL_WAYPOINTS), (TELEMETRY, TWIST_CMD), (TWIST_CMD, DBW_CMD), (DBW_CMD, EMIT)]
+
+
+class TracePublisher(object):
+    """Publishes LatencyTrace messages of one node. Create after rospy.init_node."""
+
+    def __init__(self, topic=TRACE_TOPIC):
+        self.pub = rospy.Publisher(topic, LatencyTrace, queue_size=10)
+
+    def trace(self, hop, origin, now=None):
+        """Reports that `hop` handled data of telemetry event at `origin` (rospy.Time) at time `now`"""
+        if origin is None or origin.is_zero():
+            return
+        msg = LatencyTrace(hop=hop, hop_stamp=now or rospy.Time.now())
+        msg.header.stamp = origin
+        self.pub.publish(msg)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Unit tests of LatencyHistogram and LatencyStats, without ROS
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from instrumentation.latency import BUCKET_RATIO, MAX_LATENCY, PERCENTILES, LatencyHistogram, LatencyStats
+
+
+def histogram_of(samples):
+    histogram = LatencyHistogram()
+    for seconds in samples:
+        histogram.add(seconds)
+    return histogram
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.percentile(50), 0.)
+        self.assertEqual(histogram.summary(), {'count': 0, 'mean_ms': 0., 'max_ms': 0., 'p50_ms': 0.,
+                                               'p90_ms': 0., 'p99_ms': 0.})
+
+    def test_percentiles_within_bucket_ratio(self):
+        random = np.random.RandomState(0)
+        for samples in (random.uniform(0.001, 0.02, 5000), random.lognormal(np.log(0.005), 1., 5000)):
+            histogram = histogram_of(samples)
+            for percentile in PERCENTILES:
+                exact = np.percentile(samples, percentile)
+                estimate = histogram.percentile(percentile)
+                self.assertLessEqual(estimate, exact * BUCKET_RATIO)
+                self.assertGreaterEqual(estimate, exact / BUCKET_RATIO)
+
+    def test_percentile_never_above_max(self):
+        histogram = histogram_of([0.0101] * 10)
+        for percentile in (1, 50, 100):
+            self.assertLessEqual(histogram.percentile(percentile), 0.0101)
+        self.assertEqual(histogram.percentile(100), 0.0101)
+
+    def test_overflow_bucket(self):
+        histogram = histogram_of([0.001, 2 * MAX_LATENCY])
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.percentile(100), 2 * MAX_LATENCY)
+
+    def test_mean_max_count(self):
+        summary = histogram_of([0.001, 0.002, 0.006]).summary()
+        self.assertEqual(summary['count'], 3)
+        self.assertAlmostEqual(summary['mean_ms'], 3.)
+        self.assertAlmostEqual(summary['max_ms'], 6.)
+
+    def test_snapshot_is_a_copy(self):
+        histogram = histogram_of([0.001])
+        snapshot = histogram.snapshot()
+        histogram.add(0.002)
+        self.assertEqual(snapshot.count, 1)
+        self.assertEqual(sum(snapshot.counts), 1)
+
+
+class TestLatencyStats(unittest.TestCase):
+
+    def test_timed_callback(self):
+        stats = LatencyStats()
+
+        def callback(value, scale=1):
+            """doc"""
+            return value * scale
+        timed = stats.timed('callback', callback)
+        self.assertEqual(timed(2, scale=3), 6)
+        self.assertEqual(timed.__name__, 'callback')
+        self.assertEqual(timed.__doc__, 'doc')
+        self.assertEqual(stats.histogram('callback').count, 1)
+
+    def test_timed_decorator(self):
+        stats = LatencyStats()
+
+        @stats.timed('decorated')
+        def decorated():
+            return 1
+        decorated()
+        decorated()
+        self.assertEqual(stats.histogram('decorated').count, 2)
+
+    def test_timed_counts_raising_calls(self):
+        stats = LatencyStats()
+
+        def failing():
+            raise ValueError()
+        timed = stats.timed('failing', failing)
+        self.assertRaises(ValueError, timed)
+        self.assertEqual(stats.histogram('failing').count, 1)
+
+    def test_measure(self):
+        stats = LatencyStats()
+        with stats.measure('block'):
+            pass
+        try:
+            with stats.measure('block'):
+                raise KeyError()
+        except KeyError:
+            pass
+        self.assertEqual(stats.histogram('block').count, 2)
+
+    def test_format_table(self):
+        stats = LatencyStats()
+        stats.record('pose_cb', 0.002)
+        stats.record('pose_cb', 0.004)
+        stats.record('a_long_callback_name', 0.01)
+        lines = stats.format_table().split('\n')
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0].split(), ['name', 'count', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms'])
+        # sorted by name, columns aligned
+        self.assertEqual([line.split()[0] for line in lines[1:]], ['a_long_callback_name', 'pose_cb'])
+        self.assertEqual(len(set(len(line) for line in lines)), 1)
+        pose = lines[2].split()
+        self.assertEqual(pose[1], '2')
+        self.assertEqual(pose[2], '3.000')
+        self.assertEqual(pose[-1], '4.000')
+
+    def test_format_table_empty(self):
+        self.assertEqual(LatencyStats().format_table().split(), ['name', 'count', 'mean_ms', 'p50_ms', 'p90_ms',
+                                                                 'p99_ms', 'max_ms'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Unit tests of TraceRecorder and read_trace, without ROS
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from instrumentation.trace_recorder import TraceRecorder, read_trace
+
+
+class TestTraceRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'trace.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, rows, chunk_size=4):
+        recorder = TraceRecorder(self.path, ['time', 'value'], chunk_size=chunk_size)
+        for row in rows:
+            recorder.append(*row)
+        return recorder
+
+    def test_round_trip_over_several_chunks(self):
+        rows = [(i * 0.02, i * 1.5) for i in range(10)]
+        self.record(rows).close()
+        for mmap in (False, True):
+            trace = read_trace(self.path, mmap=mmap)
+            self.assertEqual(sorted(trace), ['time', 'value'])
+            np.testing.assert_array_equal(trace['time'], [row[0] for row in rows])
+            np.testing.assert_array_equal(trace['value'], [row[1] for row in rows])
+
+    def test_only_full_chunks_written_before_flush(self):
+        recorder = self.record([(i, i) for i in range(6)])
+        self.assertEqual(len(read_trace(self.path)['time']), 4)
+        recorder.flush()
+        self.assertEqual(len(read_trace(self.path)['time']), 6)
+        self.assertEqual(recorder.rows_written, 6)
+        recorder.close()
+
+    def test_append_after_close_is_ignored(self):
+        recorder = self.record([(1., 2.)])
+        recorder.close()
+        for i in range(10):
+            recorder.append(i, i)
+        recorder.flush()
+        recorder.close()
+        np.testing.assert_array_equal(read_trace(self.path)['time'], [1.])
+        self.assertEqual(recorder.rows_written, 1)
+
+    def test_empty(self):
+        self.record([]).close()
+        for mmap in (False, True):
+            self.assertEqual(len(read_trace(self.path, mmap=mmap)['value']), 0)
+
+    def test_incomplete_last_row_ignored(self):
+        self.record([(1., 2.), (3., 4.)]).close()
+        with open(self.path, 'ab') as data_file:
+            np.array([5.], dtype=np.float64).tofile(data_file)
+        np.testing.assert_array_equal(read_trace(self.path)['value'], [2., 4.])
+
+    def test_new_recorder_truncates_session(self):
+        self.record([(1., 2.), (3., 4.)]).close()
+        self.record([(5., 6.)]).close()
+        np.testing.assert_array_equal(read_trace(self.path)['time'], [5.])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Runs waypoint_updater, tl_detector and dbw_node as components of one node, in one Python process.
+
+/final_waypoints and /traffic_waypoint are passed between them by reference, and topics from other nodes
+(/current_pose, /base_waypoints, /image_color, ...) are deserialized once for all of them,
+see node_composition.intra_process. One Python/NumPy runtime is loaded instead of three.
+Topics stay the same for other nodes.
+
+Components read their private params from this node, see launch/composed_sim.launch,
+and report their latency on /diagnostics as '<this node>/<component>'.
+Their loops run in threads of this process and share the GIL: tensorflow releases it while detecting,
+use ~detector_process to move image decoding and detection out of the process altogether.
+
+Usage:
+
+    roslaunch launch/styx.launch composed:=true
+"""
+import os
+import sys
+import threading
+
+import rospkg
+import rospy
+
+from node_composition import intra_process
+
+# Topics published by the components, passed to other components by reference only
+INTRA_PROCESS_TOPICS = ['/final_waypoints', '/traffic_waypoint']
+# Packages with the node modules of the components, which import their modules by bare name
+COMPONENT_PACKAGES = ['waypoint_updater', 'tl_detector', 'twist_controller']
+
+
+def run_loop(loop):
+    """Runs loop of a component until shutdown"""
+    try:
+        loop()
+    except rospy.ROSInterruptException:
+        pass
+
+
+def main():
+    rospy.init_node('composed_nodes')
+
+    rospack = rospkg.RosPack()
+    for package in COMPONENT_PACKAGES:
+        sys.path.append(rospack.get_path(package))
+    # tl_detector loads its model relative to its package, it runs there standalone (cwd="node")
+    os.chdir(rospack.get_path('tl_detector'))
+    intra_process.enable(INTRA_PROCESS_TOPICS)
+
+    from waypoint_updater import WaypointUpdater
+    from tl_detector import TLDetector
+    from dbw_node import DBWNode
+
+    # Subscribers first, publishers of intra process topics do not latch
+    waypoint_updater = WaypointUpdater()
+    dbw_node = DBWNode()
+    tl_detector = TLDetector()
+
+    for name, loop in [('waypoint_updater', waypoint_updater.loop), ('dbw_node', dbw_node.loop)]:
+        thread = threading.Thread(target=run_loop, args=(loop,), name=name)
+        thread.daemon = True
+        thread.start()
+    rospy.logwarn("composed_nodes: running waypoint_updater, dbw_node and tl_detector")
+    tl_detector.spin()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Intra-process transport of nodes composed into one process by composed_nodes.py.
+
+Nodes create their publishers and subscribers with Publisher and Subscriber of this module.
+Run standalone, those are plain rospy ones. Once composed_nodes.py calls enable():
+- messages published in the process are handed to subscribers in the process by reference,
+  without serialization. They are published over ROS too, for subscribers outside of the process;
+  rospy serializes them only if there are any.
+- topics published from outside are subscribed over ROS once per process, with the largest queue_size
+  of the subscribers. Each message is deserialized once and handed to all subscribers in the process.
+- topics published in the process (intra process topics) are not subscribed over ROS at all.
+  rospy has no intra-process shortcut, the process would receive its own messages back over TCPROS.
+
+As with rospy, each subscriber has a queue of its queue_size latest messages and a thread calling its callback,
+so a slow callback holds up only its own node. Messages are shared: callbacks must not modify them.
+"""
+from collections import deque
+import threading
+import traceback
+
+import rospy
+
+# Seconds between checks for shutdown of idle dispatch threads
+DISPATCH_TIMEOUT = 0.5
+
+
+class _Bus(object):
+    """Subscribers in the process by topic, and the ROS subscriptions feeding them"""
+
+    def __init__(self):
+        self.enabled = False
+        self.intra_process_topics = set()
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.ros_subscribers = {}
+        # queue_size of ROS subscriptions, None for unlimited
+        self.ros_queue_sizes = {}
+        # Last message of latched topics, for subscribers that come later
+        self.latched = {}
+
+    def subscribe(self, topic, subscriber):
+        with self.lock:
+            self.subscribers.setdefault(topic, []).append(subscriber)
+            latched = self.latched.get(topic)
+        if latched is not None:
+            subscriber.put(latched)
+
+    def subscribe_ros(self, topic, name, data_class, queue_size, **kwargs):
+        """Subscribes topic over ROS, or grows queue of existing subscription to queue_size"""
+        with self.lock:
+            ros_subscriber = self.ros_subscribers.get(topic)
+            if ros_subscriber is None:
+                self.ros_subscribers[topic] = rospy.Subscriber(name, data_class, self.receive, topic,
+                                                               queue_size=queue_size, **kwargs)
+                self.ros_queue_sizes[topic] = queue_size
+                return
+            current = self.ros_queue_sizes[topic]
+            if current is not None and (queue_size is None or queue_size > current):
+                # subscribers of a topic share one rospy implementation and its queue, -1 is unlimited there
+                ros_subscriber.impl.set_queue_size(-1 if queue_size is None else queue_size)
+                self.ros_queue_sizes[topic] = queue_size
+
+    def unsubscribe(self, topic, subscriber):
+        """Removes subscriber, and the ROS subscription of topic with its last subscriber"""
+        with self.lock:
+            subscribers = self.subscribers.get(topic, [])
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+            ros_subscriber = None
+            if not subscribers:
+                self.subscribers.pop(topic, None)
+                ros_subscriber = self.ros_subscribers.pop(topic, None)
+                self.ros_queue_sizes.pop(topic, None)
+        if ros_subscriber is not None:
+            ros_subscriber.unregister()
+
+    def deliver(self, topic, msg, latch=False):
+        with self.lock:
+            if latch:
+                self.latched[topic] = msg
+            subscribers = list(self.subscribers.get(topic, ()))
+        for subscriber in subscribers:
+            subscriber.put(msg)
+
+    def receive(self, msg, topic):
+        """Callback of ROS subscriptions"""
+        header = getattr(msg, '_connection_header', None) or {}
+        self.deliver(topic, msg, header.get('latching') == '1')
+
+
+_bus = _Bus()
+
+
+def enable(intra_process_topics):
+    """Switches Publisher and Subscriber to the intra-process transport. Call after rospy.init_node,
+    before nodes are created.
+
+    Args:
+        intra_process_topics (list): topics published by nodes of this process. Their messages from
+            other processes are not received.
+    """
+    _bus.intra_process_topics = set(rospy.resolve_name(topic) for topic in intra_process_topics)
+    _bus.enabled = True
+
+
+def component_name(name):
+    """Name of a node to report, e.g. in diagnostics: the node's own name, or the component's one when composed"""
+    if not _bus.enabled:
+        return rospy.get_name()
+    return '{}/{}'.format(rospy.get_name(), name)
+
+
+class _Subscriber(object):
+    """Queue and dispatch thread of one subscriber in the process"""
+
+    def __init__(self, topic, callback, callback_args=None, queue_size=None):
+        self.topic = topic
+        self.callback = callback
+        self.callback_args = callback_args
+        self.queue = deque(maxlen=queue_size)
+        self.cond = threading.Condition()
+        self.registered = True
+        self.thread = threading.Thread(target=self.dispatch, name='intra_process {}'.format(topic))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, msg):
+        with self.cond:
+            self.queue.append(msg)
+            self.cond.notify()
+
+    def unregister(self):
+        """Stops delivery to callback, like rospy.Subscriber.unregister. Queued messages are dropped."""
+        _bus.unsubscribe(self.topic, self)
+        with self.cond:
+            self.registered = False
+            self.queue.clear()
+            self.cond.notify()
+
+    def dispatch(self):
+        while not rospy.is_shutdown():
+            with self.cond:
+                if not self.queue and self.registered:
+                    self.cond.wait(DISPATCH_TIMEOUT)
+                if not self.registered:
+                    return
+                if not self.queue:
+                    continue
+                msg = self.queue.popleft()
+            try:
+                if self.callback_args is None:
+                    self.callback(msg)
+                else:
+                    self.callback(msg, self.callback_args)
+            except Exception:
+                rospy.logerr("bad callback on {}: {}".format(self.topic, traceback.format_exc()))
+
+
+def Subscriber(name, data_class, callback=None, callback_args=None, queue_size=None, **kwargs):
+    """rospy.Subscriber, or a subscriber in the process once enabled"""
+    if not _bus.enabled:
+        return rospy.Subscriber(name, data_class, callback, callback_args, queue_size=queue_size, **kwargs)
+
+    topic = rospy.resolve_name(name)
+    subscriber = _Subscriber(topic, callback, callback_args, queue_size)
+    if topic not in _bus.intra_process_topics:
+        _bus.subscribe_ros(topic, name, data_class, queue_size, **kwargs)
+    _bus.subscribe(topic, subscriber)
+    return subscriber
+
+
+class _Publisher(object):
+    """Publishes to subscribers in the process by reference, and over ROS to all others"""
+
+    def __init__(self, name, data_class, **kwargs):
+        self.topic = rospy.resolve_name(name)
+        self.latch = kwargs.get('latch', False)
+        self.ros_publisher = rospy.Publisher(name, data_class, **kwargs)
+
+    def publish(self, msg):
+        self.ros_publisher.publish(msg)
+        _bus.deliver(self.topic, msg, self.latch)
+
+    def __getattr__(self, name):
+        return getattr(self.ros_publisher, name)
+
+
+def Publisher(name, data_class, **kwargs):
+    """rospy.Publisher, or one that also publishes to subscribers in the process once enabled"""
+    if not _bus.enabled:
+        return rospy.Publisher(name, data_class, **kwargs)
+    return _Publisher(name, data_class, **kwargs)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Unit tests of the intra-process transport, without a running ROS master
+"""
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from node_composition import intra_process
+
+# Max seconds to wait for a dispatch thread
+TIMEOUT = 5.
+
+
+class Message(object):
+
+    def __init__(self, data):
+        self.data = data
+
+
+class Received(object):
+    """Callback collecting messages, optionally blocking until released"""
+
+    def __init__(self, count=1, blocking=False):
+        self.messages = []
+        self.done = threading.Event()
+        self.count = count
+        self.release = threading.Event()
+        if not blocking:
+            self.release.set()
+        self.lock = threading.Lock()
+
+    def __call__(self, msg, *args):
+        self.release.wait(TIMEOUT)
+        with self.lock:
+            self.messages.append((msg,) + args)
+            if len(self.messages) >= self.count:
+                self.done.set()
+
+    def wait(self):
+        return self.done.wait(TIMEOUT)
+
+
+class FakeImpl(object):
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+
+    def set_queue_size(self, queue_size):
+        self.queue_size = queue_size
+
+
+class FakeRosSubscriber(object):
+    """Stands in for rospy.Subscriber, records queue size and unregister"""
+    created = []
+
+    def __init__(self, name, data_class, callback, callback_args, queue_size=None):
+        self.name = name
+        self.callback = callback
+        self.callback_args = callback_args
+        self.impl = FakeImpl(-1 if queue_size is None else queue_size)
+        self.unregistered = False
+        FakeRosSubscriber.created.append(self)
+
+    def unregister(self):
+        self.unregistered = True
+
+
+class TestIntraProcess(unittest.TestCase):
+
+    def setUp(self):
+        intra_process._bus = intra_process._Bus()
+        intra_process.enable(['/intra'])
+        self.ros_subscriber_class = intra_process.rospy.Subscriber
+        intra_process.rospy.Subscriber = FakeRosSubscriber
+        FakeRosSubscriber.created = []
+
+    def tearDown(self):
+        intra_process.rospy.Subscriber = self.ros_subscriber_class
+        for subscribers in list(intra_process._bus.subscribers.values()):
+            for subscriber in list(subscribers):
+                subscriber.unregister()
+                subscriber.thread.join(TIMEOUT)
+        intra_process._bus = intra_process._Bus()
+
+    def test_delivered_by_reference_to_all_subscribers(self):
+        first, second = Received(), Received()
+        intra_process.Subscriber('/intra', Message, first, queue_size=1)
+        intra_process.Subscriber('/intra', Message, second, 'args', queue_size=1)
+        msg = Message(1)
+        intra_process._bus.deliver('/intra', msg)
+        self.assertTrue(first.wait() and second.wait())
+        self.assertIs(first.messages[0][0], msg)
+        self.assertEqual(second.messages, [(msg, 'args')])
+
+    def test_intra_process_topic_not_subscribed_over_ros(self):
+        intra_process.Subscriber('/intra', Message, Received(), queue_size=1)
+        self.assertEqual(FakeRosSubscriber.created, [])
+
+    def test_queue_keeps_latest_messages(self):
+        received = Received(count=3, blocking=True)
+        intra_process.Subscriber('/intra', Message, received, queue_size=2)
+        messages = [Message(i) for i in range(5)]
+        intra_process._bus.deliver('/intra', messages[0])
+        # wait until dispatch thread took the first message and blocks in callback
+        for _ in range(int(TIMEOUT / 0.01)):
+            if not intra_process._bus.subscribers['/intra'][0].queue:
+                break
+            threading.Event().wait(0.01)
+        for msg in messages[1:]:
+            intra_process._bus.deliver('/intra', msg)
+        received.release.set()
+        self.assertTrue(received.wait())
+        self.assertEqual([msg.data for msg, in received.messages], [0, 3, 4])
+
+    def test_latched_message_for_late_subscriber(self):
+        intra_process._bus.deliver('/intra', Message('latched'), latch=True)
+        received = Received()
+        intra_process.Subscriber('/intra', Message, received, queue_size=1)
+        self.assertTrue(received.wait())
+        self.assertEqual(received.messages[0][0].data, 'latched')
+
+    def test_ros_subscription_shared_with_largest_queue(self):
+        received = [Received(), Received(), Received()]
+        intra_process.Subscriber('/outside', Message, received[0], queue_size=1)
+        intra_process.Subscriber('/outside', Message, received[1], queue_size=5)
+        intra_process.Subscriber('/outside', Message, received[2], queue_size=2)
+        self.assertEqual(len(FakeRosSubscriber.created), 1)
+        ros_subscriber = FakeRosSubscriber.created[0]
+        self.assertEqual(ros_subscriber.impl.queue_size, 5)
+        intra_process.Subscriber('/outside', Message, Received())
+        self.assertEqual(ros_subscriber.impl.queue_size, -1)
+        # ROS messages reach every subscriber in the process
+        msg = Message(1)
+        ros_subscriber.callback(msg, ros_subscriber.callback_args)
+        self.assertTrue(all(callback.wait() for callback in received))
+
+    def test_unregister(self):
+        kept, removed = Received(), Received()
+        intra_process.Subscriber('/outside', Message, kept, queue_size=1)
+        subscriber = intra_process.Subscriber('/outside', Message, removed, queue_size=1)
+        subscriber.unregister()
+        subscriber.thread.join(TIMEOUT)
+        self.assertFalse(subscriber.thread.is_alive())
+        intra_process._bus.deliver('/outside', Message(1))
+        self.assertTrue(kept.wait())
+        self.assertEqual(removed.messages, [])
+        ros_subscriber = FakeRosSubscriber.created[0]
+        self.assertFalse(ros_subscriber.unregistered)
+        last = intra_process._bus.subscribers['/outside'][0]
+        last.unregister()
+        last.thread.join(TIMEOUT)
+        self.assertTrue(ros_subscriber.unregistered)
+        self.assertNotIn('/outside', intra_process._bus.subscribers)
+
+
+if __name__ == '__main__':
+    unittest.main()
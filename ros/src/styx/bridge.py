@@ -66,11 +66,11 @@ class Bridge(object):
 
         return light
 
-    def create_pose(self, x, y, z, yaw=0.):
+    def create_pose(self, x, y, z, yaw=0., stamp=None):
         pose = PoseStamped()
 
         pose.header = Header()
-        pose.header.stamp = rospy.Time.now()
+        pose.header.stamp = stamp or rospy.Time.now()
         pose.header.frame_id = '/world'
 
         pose.pose.position.x = x
@@ -88,8 +88,9 @@ class Bridge(object):
         fl.data = val
         return fl
 
-    def create_twist(self, velocity, angular):
+    def create_twist(self, velocity, angular, stamp=None):
         tw = TwistStamped()
+        tw.header.stamp = stamp or rospy.Time.now()
         tw.twist.linear.x = velocity
         tw.twist.angular.z = angular
         return tw
@@ -125,8 +126,10 @@ class Bridge(object):
                          name,
                          "world")
 
-    def publish_odometry(self, data):
-        pose = self.create_pose(data['x'], data['y'], data['z'], data['yaw'])
+    def publish_odometry(self, data, stamp=None):
+        """Publishes pose and velocity of telemetry event, both stamped with `stamp` (default now)"""
+        stamp = stamp or rospy.Time.now()
+        pose = self.create_pose(data['x'], data['y'], data['z'], data['yaw'], stamp)
 
         position = (data['x'], data['y'], data['z'])
         orientation = tf.transformations.quaternion_from_euler(
@@ -137,7 +140,7 @@ class Bridge(object):
         self.vel = data['velocity'] * 0.44704
         self.angular = self.calc_angular(data['yaw'] * math.pi / 180.)
         self.publishers['current_velocity'].publish(
-            self.create_twist(self.vel, self.angular))
+            self.create_twist(self.vel, self.angular, stamp))
 
     def publish_controls(self, data):
         steering, throttle, brake = data[
@@ -0,0 +1,62 @@
+"""
+Compact log of socket.io events of the simulator, written by styx server and replayed by replay_events.py.
+
+gzip stream of records: little endian (float64 seconds since first event, uint8 event, uint32 size)
+followed by `size` bytes of JSON data of the event. Images stay base64 JPEG as the simulator sends them.
+"""
+import gzip
+import json
+import struct
+import threading
+from timeit import default_timer as timer
+
+MAGIC = b'STYXEVT1'
+RECORD = struct.Struct('<dBI')
+# Events in order of their codes in the log
+EVENTS = ['telemetry', 'control', 'trafficlights', 'image', 'lidar', 'obstacle']
+EVENT_CODES = dict((event, code) for code, event in enumerate(EVENTS))
+
+
+class EventWriter(object):
+    """Appends events to log. Safe to call from several handlers at once."""
+
+    def __init__(self, path):
+        self.file = gzip.open(path, 'wb')
+        self.file.write(MAGIC)
+        self.lock = threading.Lock()
+        self.start = None
+
+    def write(self, event, data):
+        payload = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        now = timer()
+        with self.lock:
+            if self.start is None:
+                self.start = now
+            self.file.write(RECORD.pack(now - self.start, EVENT_CODES[event], len(payload)))
+            self.file.write(payload)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_events(path):
+    """Yields (seconds since first event, event, data) of log.
+    Stops at an incomplete last record, e.g. of a server that was killed while recording.
+    """
+    log = gzip.open(path, 'rb')
+    try:
+        if log.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not a styx event log'.format(path))
+        while True:
+            try:
+                header = log.read(RECORD.size)
+                seconds, code, size = RECORD.unpack(header)
+                payload = log.read(size)
+            except (EOFError, IOError, struct.error):
+                return
+            if len(payload) < size:
+                return
+            yield seconds, EVENTS[code], json.loads(payload.decode('utf-8'))
+    finally:
+        log.close()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+"""
+Headless stand-in for the Unity simulator. Needs neither ROS nor a GPU.
+
+Connects to styx/server.py on port 4567 as the Unity simulator does and speaks the same socket.io events:
+- sends `telemetry` (pose, speed, dbw_enable), `control` (steering/throttle/brake reports),
+  `trafficlights` and optionally `image` with synthetic camera frames
+- sends `clock` with the simulated time every physics step, the Unity simulator does not
+- receives `steer`, `throttle` and `brake` commands
+
+The car is a kinematic bicycle model driven by the commands. It starts on the first waypoint of the track.
+Traffic lights stand LIGHT_DISTANCE behind the stop lines of the traffic light config and cycle
+green/yellow/red, every light with its own phase.
+
+Time is simulated: with --speedup above 1 the simulator runs faster than real time, with 0 as fast as possible.
+Telemetry then carries `time`, and the stack should run with use_sim_time, so that styx server publishes
+the `clock` events on /clock and stamps telemetry with simulated time:
+
+    roslaunch launch/styx.launch use_sim_time:=true
+
+Needs the socket.io client of python-socketio 4.x, which may be installed in a separate environment
+from the one of styx server. Clients of 5 and newer speak a socket.io protocol the server does not.
+
+Usage:
+
+    ./headless_sim.py [--host localhost] [--speedup 1] [--duration 600] [--camera-rate 10]
+"""
+from __future__ import print_function
+
+import argparse
+import base64
+import csv
+import math
+import os
+import time
+from io import BytesIO
+
+import numpy as np
+import yaml
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TRACK = os.path.join(THIS_DIR, '..', '..', '..', 'data', 'wp_yaw_const.csv')
+DEFAULT_LIGHTS = os.path.join(THIS_DIR, '..', 'tl_detector', 'sim_traffic_light_config.yaml')
+
+# Traffic light states, as in styx_msgs/TrafficLight
+RED = 0
+YELLOW = 1
+GREEN = 2
+LIGHT_COLORS = {RED: (255, 0, 0), YELLOW: (255, 255, 0), GREEN: (0, 255, 0)}
+# Distance of traffic light behind its stop line along the track, m
+LIGHT_DISTANCE = 25.
+
+# Vehicle, as in twist_controller/launch/dbw_sim.launch
+VEHICLE_MASS = 1080.
+WHEEL_RADIUS = 0.335
+WHEEL_BASE = 3.
+STEER_RATIO = 14.8
+# Acceleration at full throttle, m/s^2, and speed proportional drag, 1/s
+MAX_ACCELERATION = 4.
+DRAG = 0.05
+MPH = 0.44704
+# Supported major versions of python-socketio client
+SOCKETIO_MAJOR_VERSIONS = [4]
+
+# Physics step, simulated seconds
+PHYSICS_DT = 0.01
+
+# Synthetic camera
+IMAGE_WIDTH = 800
+IMAGE_HEIGHT = 600
+HORIZONTAL_FOV = math.radians(50.)
+CAMERA_RANGE = 120.
+# Height of the traffic light housing in image at 10 m, pixels
+LIGHT_HEIGHT_10M = 240.
+
+
+def socketio_client_error(socketio):
+    """Why module socketio is no client for styx server, None if it is"""
+    version = getattr(socketio, '__version__', 'unknown')
+    major = version.split('.')[0]
+    if not hasattr(socketio, 'Client') or not major.isdigit() or int(major) not in SOCKETIO_MAJOR_VERSIONS:
+        return 'needs socket.io client of python-socketio>=4,<5, found {}'.format(version)
+    return None
+
+
+def load_track(path):
+    """(n, 3) array of x, y, z of waypoints in csv file like the one of waypoint_loader"""
+    with open(path) as track_file:
+        return np.array([[float(value) for value in row[:3]] for row in csv.reader(track_file)])
+
+
+class Track(object):
+    """Waypoints of the track with heading and arc length at every waypoint"""
+
+    def __init__(self, points):
+        self.points = points
+        deltas = np.diff(points[:, :2], axis=0)
+        self.heading = np.arctan2(deltas[:, 1], deltas[:, 0])
+        self.heading = np.append(self.heading, self.heading[-1])
+        self.s = np.concatenate(([0.], np.cumsum(np.hypot(deltas[:, 0], deltas[:, 1]))))
+
+    def closest(self, x, y):
+        return int(np.argmin((self.points[:, 0] - x) ** 2 + (self.points[:, 1] - y) ** 2))
+
+    def ahead(self, index, distance):
+        """Index of waypoint `distance` further along the track than waypoint `index`"""
+        return min(int(np.searchsorted(self.s, self.s[index] + distance)), len(self.s) - 1)
+
+
+class TrafficLights(object):
+    """Traffic lights behind stop lines, cycling green, yellow, red with per light phase"""
+
+    def __init__(self, track, stop_lines, green=8., yellow=2., red=6.):
+        self.green, self.yellow, self.red = green, yellow, red
+        self.cycle = green + yellow + red
+        indices = [track.ahead(track.closest(x, y), LIGHT_DISTANCE) for x, y in stop_lines]
+        self.positions = track.points[indices]
+        self.yaws = track.heading[indices]
+        # spread phases so that the car meets lights in all states
+        self.offsets = [i * self.cycle / len(indices) for i in range(len(indices))]
+
+    def states(self, t):
+        states = []
+        for offset in self.offsets:
+            phase = (t + offset) % self.cycle
+            states.append(GREEN if phase < self.green else YELLOW if phase < self.green + self.yellow else RED)
+        return states
+
+    def message(self, t):
+        """Data of `trafficlights` event, like the Unity simulator sends it"""
+        return {
+            'light_pos_x': self.positions[:, 0].tolist(),
+            'light_pos_y': self.positions[:, 1].tolist(),
+            'light_pos_z': self.positions[:, 2].tolist(),
+            'light_pos_dx': np.cos(self.yaws).tolist(),
+            'light_pos_dy': np.sin(self.yaws).tolist(),
+            'light_state': self.states(t),
+        }
+
+
+class Vehicle(object):
+    """Kinematic bicycle model driven by DBW commands"""
+
+    def __init__(self, x, y, z, yaw):
+        self.x, self.y, self.z, self.yaw = x, y, z, yaw
+        self.velocity = 0.
+        # last received commands: steering wheel angle (rad), throttle (0..1), brake torque (N*m)
+        self.steering = 0.
+        self.throttle = 0.
+        self.brake = 0.
+
+    def step(self, dt):
+        acceleration = self.throttle * MAX_ACCELERATION - DRAG * self.velocity
+        acceleration -= self.brake / WHEEL_RADIUS / VEHICLE_MASS
+        self.velocity = max(0., self.velocity + acceleration * dt)
+        wheel_angle = self.steering / STEER_RATIO
+        self.yaw += self.velocity * math.tan(wheel_angle) / WHEEL_BASE * dt
+        self.x += self.velocity * math.cos(self.yaw) * dt
+        self.y += self.velocity * math.sin(self.yaw) * dt
+
+    def telemetry(self, t, dbw_enable):
+        """Data of `telemetry` event. Angles in degrees and speed in mph, like the Unity simulator"""
+        return {'x': self.x, 'y': self.y, 'z': self.z, 'yaw': math.degrees(self.yaw),
+                'velocity': self.velocity / MPH, 'dbw_enable': dbw_enable, 'time': t}
+
+    def control(self):
+        """Data of `control` event, reports of applied commands"""
+        return {'steering_angle': math.degrees(self.steering), 'throttle': self.throttle, 'brake': self.brake}
+
+
+class Camera(object):
+    """Renders synthetic front camera frames: sky, road and the traffic lights in view"""
+
+    def __init__(self, width=IMAGE_WIDTH, height=IMAGE_HEIGHT, quality=85):
+        self.quality = quality
+        self.background = np.zeros((height, width, 3), dtype=np.uint8)
+        horizon = height // 2
+        self.background[:horizon] = np.linspace(120, 200, horizon, dtype=np.uint8)[:, np.newaxis, np.newaxis]
+        self.background[:horizon, :, 2] = 230
+        self.background[horizon:] = 90
+        self.frame = np.empty_like(self.background)
+        self.focal = width / 2. / math.tan(HORIZONTAL_FOV / 2.)
+
+    def render(self, vehicle, lights, states):
+        """RGB frame as seen from vehicle"""
+        height, width = self.frame.shape[:2]
+        self.frame[:] = self.background
+        # farthest first, so that near lights are drawn over far ones
+        visible = []
+        for (x, y, _), state in zip(lights.positions, states):
+            dx, dy = x - vehicle.x, y - vehicle.y
+            forward = dx * math.cos(vehicle.yaw) + dy * math.sin(vehicle.yaw)
+            left = -dx * math.sin(vehicle.yaw) + dy * math.cos(vehicle.yaw)
+            if 1. < forward < CAMERA_RANGE and abs(math.atan2(left, forward)) < HORIZONTAL_FOV / 2.:
+                visible.append((forward, left, state))
+        for forward, left, state in sorted(visible, reverse=True):
+            size = max(6, int(LIGHT_HEIGHT_10M * 10. / forward))
+            column = int(width / 2. - self.focal * left / forward)
+            row = int(height / 2. - size)
+            x0, x1 = max(0, column - size // 6), min(width, column + size // 6 + 1)
+            y0, y1 = max(0, row), min(height, row + size)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            self.frame[y0:y1, x0:x1] = 30
+            # lamps top to bottom: red, yellow, green
+            lamp = {RED: 0, YELLOW: 1, GREEN: 2}[state]
+            ly0 = row + lamp * size // 3 + size // 24
+            ly1 = row + (lamp + 1) * size // 3 - size // 24
+            self.frame[max(0, ly0):min(height, ly1), x0 + 1:x1 - 1] = LIGHT_COLORS[state]
+        return self.frame
+
+    def message(self, vehicle, lights, states):
+        """Data of `image` event: base64 encoded JPEG"""
+        from PIL import Image
+        buffer = BytesIO()
+        Image.fromarray(self.render(vehicle, lights, states)).save(buffer, format='JPEG', quality=self.quality)
+        return {'image': base64.b64encode(buffer.getvalue()).decode('ascii')}
+
+
+class HeadlessSimulator(object):
+    """Steps vehicle and traffic lights and exchanges socket.io events with styx server"""
+
+    def __init__(self, track, lights, camera=None, telemetry_rate=25., lights_rate=4., camera_rate=10.,
+                 dbw_enable=True):
+        self.track = track
+        self.lights = lights
+        self.camera = camera
+        self.dbw_enable = dbw_enable
+        x, y, z = track.points[0]
+        self.vehicle = Vehicle(x, y, z, track.heading[0])
+        self.periods = {'telemetry': 1. / telemetry_rate, 'trafficlights': 1. / lights_rate}
+        if camera is not None and camera_rate > 0:
+            self.periods['image'] = 1. / camera_rate
+        self.next_times = dict((event, 0.) for event in self.periods)
+        self.t = 0.
+        self.commands = 0
+
+    def on_steer(self, data):
+        self.vehicle.steering = float(data['steering_angle'])
+        self.commands += 1
+
+    def on_throttle(self, data):
+        self.vehicle.throttle = float(data['throttle'])
+        self.commands += 1
+
+    def on_brake(self, data):
+        self.vehicle.brake = float(data['brake'])
+        self.commands += 1
+
+    def step(self):
+        """Advances simulation by PHYSICS_DT.
+
+        Returns:
+            list: (event, data) due at the new time
+        """
+        self.vehicle.step(PHYSICS_DT)
+        self.t += PHYSICS_DT
+        # drives /clock of the stack between telemetry events
+        events = [('clock', {'time': self.t})]
+        for event, period in self.periods.items():
+            if self.t < self.next_times[event]:
+                continue
+            self.next_times[event] += period
+            if event == 'telemetry':
+                events.append(('telemetry', self.vehicle.telemetry(self.t, self.dbw_enable)))
+                events.append(('control', self.vehicle.control()))
+            elif event == 'trafficlights':
+                events.append(('trafficlights', self.lights.message(self.t)))
+            else:
+                events.append(('image', self.camera.message(self.vehicle, self.lights, self.lights.states(self.t))))
+        return events
+
+    def run(self, emit, duration, speedup=1., report_period=10.):
+        """Runs for `duration` simulated seconds, passing events to emit(event, data).
+        Sleeps to keep simulated time at `speedup` times wall time, never with speedup 0.
+        """
+        start = time.time()
+        next_report = report_period
+        while self.t < duration:
+            for event, data in self.step():
+                emit(event, data)
+            if speedup > 0:
+                delay = start + self.t / speedup - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            if self.t >= next_report:
+                next_report += report_period
+                index = self.track.closest(self.vehicle.x, self.vehicle.y)
+                print('t={:.0f}s wall={:.1f}s waypoint={} speed={:.1f}m/s commands={}'.format(
+                    self.t, time.time() - start, index, self.vehicle.velocity, self.commands))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless simulator speaking the socket.io protocol of styx server')
+    parser.add_argument('--host', default='localhost', help='host of styx server')
+    parser.add_argument('--port', type=int, default=4567, help='port of styx server')
+    parser.add_argument('--track', default=DEFAULT_TRACK, help='waypoints csv file')
+    parser.add_argument('--lights', default=DEFAULT_LIGHTS, help='traffic light config with stop_line_positions')
+    parser.add_argument('--speedup', type=float, default=1., help='simulated seconds per wall second, 0 for max')
+    parser.add_argument('--duration', type=float, default=600., help='simulated seconds to run')
+    parser.add_argument('--telemetry-rate', type=float, default=25., help='telemetry events per simulated second')
+    parser.add_argument('--lights-rate', type=float, default=4., help='trafficlights events per simulated second')
+    parser.add_argument('--camera-rate', type=float, default=0., help='camera frames per simulated second, 0 for none')
+    parser.add_argument('--cycle', type=float, nargs=3, default=[8., 2., 6.], metavar=('GREEN', 'YELLOW', 'RED'),
+                        help='traffic light phase durations, s')
+    parser.add_argument('--manual', action='store_true', help='report dbw_enable false, as in manual mode')
+    args = parser.parse_args()
+
+    import socketio
+    error = socketio_client_error(socketio)
+    if error is not None:
+        parser.error(error)
+
+    track = Track(load_track(args.track))
+    with open(args.lights) as lights_file:
+        stop_lines = yaml.safe_load(lights_file)['stop_line_positions']
+    lights = TrafficLights(track, stop_lines, *args.cycle)
+    camera = Camera() if args.camera_rate > 0 else None
+    simulator = HeadlessSimulator(track, lights, camera, args.telemetry_rate, args.lights_rate, args.camera_rate,
+                                  dbw_enable=not args.manual)
+
+    client = socketio.Client()
+    client.on('steer', simulator.on_steer)
+    client.on('throttle', simulator.on_throttle)
+    client.on('brake', simulator.on_brake)
+    client.connect('http://{}:{}'.format(args.host, args.port))
+    try:
+        simulator.run(client.emit, args.duration, args.speedup)
+    finally:
+        client.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""
+Load generator for styx server: replays simulator events recorded with
+
+    rosrun styx server.py _record_events:=/tmp/log/events.gz
+
+over socket.io at a multiple of their original rate and reports, as JSON, per event:
+- sent and acknowledged events, throughput of acknowledged events per second
+- dropped events: lost, i.e. not acknowledged within --ack-timeout after the last one was sent,
+  and skipped, i.e. acknowledged as skipped by the server (images above its rate limit)
+- latency from send to acknowledgement (handler time plus transport and queueing), ms percentiles
+- lag: how far sending fell behind the replay schedule
+
+The server handles events one at a time, so latency grows without bound once the offered rate
+is above what it sustains: increase --speed until it does to find the saturation point.
+At most --max-pending events are in flight. Beyond that the sender waits, which shows as lag,
+so with --speed 0 the throughput is the one the server sustains.
+Handler times alone are on /diagnostics of styx_server.
+
+Needs the socket.io client of python-socketio 4.x, see headless_sim.py.
+
+Usage:
+
+    ./replay_events.py /tmp/log/events.gz [--speed 4] [--events telemetry,image] [--loops 1]
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import threading
+import time
+from timeit import default_timer as timer
+
+import numpy as np
+
+from event_log import EVENTS, read_events
+from headless_sim import socketio_client_error
+
+PERCENTILES = [50, 90, 99]
+
+
+class ReplayStats(object):
+    """Send and acknowledgement times of every event, updated by sender and socket.io threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = dict((event, 0) for event in EVENTS)
+        self.skipped = dict((event, 0) for event in EVENTS)
+        self.latencies = dict((event, []) for event in EVENTS)
+        self.lags = []
+        self.pending = 0
+        self.acked = threading.Condition(self.lock)
+        self.all_acked = threading.Event()
+        self.last_ack_time = None
+
+    def wait_pending(self, max_pending, timeout):
+        """Waits until less than max_pending events are unacknowledged, at most timeout seconds"""
+        deadline = timer() + timeout
+        with self.lock:
+            while self.pending >= max_pending and timer() < deadline:
+                self.acked.wait(deadline - timer())
+
+    def on_send(self, event, lag):
+        with self.lock:
+            self.sent[event] += 1
+            self.pending += 1
+            self.lags.append(lag)
+            self.all_acked.clear()
+
+    def ack_callback(self, event, send_time):
+        """Callback of socket.io acknowledgement of one event"""
+        def on_ack(*args):
+            now = timer()
+            with self.lock:
+                self.latencies[event].append(now - send_time)
+                self.last_ack_time = now
+                if args and args[0] is False:
+                    self.skipped[event] += 1
+                self.pending -= 1
+                self.acked.notify()
+                if self.pending == 0:
+                    self.all_acked.set()
+        return on_ack
+
+    def report(self, duration):
+        with self.lock:
+            report = {'duration_s': duration, 'events': {}}
+            for event in EVENTS:
+                if not self.sent[event]:
+                    continue
+                latencies = np.array(self.latencies[event]) * 1000.
+                lost = self.sent[event] - len(latencies)
+                stats = {
+                    'sent': self.sent[event],
+                    'acked': len(latencies),
+                    'lost': lost,
+                    'skipped': self.skipped[event],
+                    'dropped': lost + self.skipped[event],
+                    'throughput_per_s': len(latencies) / duration if duration > 0 else 0.,
+                    'latency_ms': {'mean': float(latencies.mean()) if len(latencies) else 0.,
+                                   'max': float(latencies.max()) if len(latencies) else 0.},
+                }
+                for percentile in PERCENTILES:
+                    stats['latency_ms']['p{}'.format(percentile)] = \
+                        float(np.percentile(latencies, percentile)) if len(latencies) else 0.
+                report['events'][event] = stats
+            lags = np.array(self.lags) * 1000.
+            report['lag_ms'] = {'p99': float(np.percentile(lags, 99)) if len(lags) else 0.,
+                                'max': float(lags.max()) if len(lags) else 0.}
+            report['sent'] = sum(self.sent.values())
+            report['throughput_per_s'] = sum(len(latencies) for latencies in self.latencies.values()) / duration \
+                if duration > 0 else 0.
+        return report
+
+
+def replay(emit, path, stats, events=None, speed=1., loops=1, max_pending=10, ack_timeout=5.):
+    """Emits events of log at `speed` times their recorded rate, as fast as possible with speed 0.
+    Keeps at most max_pending events unacknowledged, unless acknowledgements take longer than ack_timeout.
+
+    Returns:
+        float: seconds from first to last event sent
+    """
+    start = timer()
+    offset = 0.
+    for _ in range(loops):
+        last = 0.
+        for seconds, event, data in read_events(path):
+            last = seconds
+            if events and event not in events:
+                continue
+            due = start + (offset + seconds) / speed if speed > 0 else timer()
+            delay = due - timer()
+            if delay > 0:
+                time.sleep(delay)
+            stats.wait_pending(max_pending, ack_timeout)
+            send_time = timer()
+            stats.on_send(event, send_time - due)
+            emit(event, data, callback=stats.ack_callback(event, send_time))
+        offset += last
+    return timer() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded simulator events against styx server')
+    parser.add_argument('path', help='event log recorded by styx server with ~record_events')
+    parser.add_argument('--host', default='localhost', help='host of styx server')
+    parser.add_argument('--port', type=int, default=4567, help='port of styx server')
+    parser.add_argument('--speed', type=float, default=1., help='multiple of recorded rate, 0 for max')
+    parser.add_argument('--events', default=None, help='comma separated events to replay, all by default')
+    parser.add_argument('--loops', type=int, default=1, help='replay log that many times')
+    parser.add_argument('--max-pending', type=int, default=10, help='max events in flight')
+    parser.add_argument('--ack-timeout', type=float, default=5., help='wait for acknowledgements after last event, s')
+    parser.add_argument('--output', default=None, help='write JSON report to file instead of stdout')
+    args = parser.parse_args()
+
+    import socketio
+    error = socketio_client_error(socketio)
+    if error is not None:
+        parser.error(error)
+
+    stats = ReplayStats()
+    client = socketio.Client()
+    client.connect('http://{}:{}'.format(args.host, args.port))
+    try:
+        events = args.events.split(',') if args.events else None
+        start = timer()
+        send_duration = replay(client.emit, args.path, stats, events, args.speed, args.loops,
+                               args.max_pending, args.ack_timeout)
+        stats.all_acked.wait(args.ack_timeout)
+        # throughput up to the last acknowledgement, not counting time waiting for dropped ones
+        duration = (stats.last_ack_time or timer()) - start
+    finally:
+        client.disconnect()
+
+    report = stats.report(duration)
+    report.update({'path': args.path, 'speed': args.speed, 'loops': args.loops, 'send_duration_s': send_duration})
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
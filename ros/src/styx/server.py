@@ -12,9 +12,15 @@ import eventlet.wsgi
 import time
 from flask import Flask, render_template
 import rospy
+from rosgraph_msgs.msg import Clock
 
 from bridge import Bridge
 from conf import conf
+from event_log import EventWriter
+from instrumentation.latency import LatencyStats
+from instrumentation.diagnostics import LatencyPublisher
+from instrumentation.tracing import TracePublisher, TRACE_TOPIC, TELEMETRY, DBW_CMD, EMIT
+from styx_msgs.msg import LatencyTrace
 
 dbw_enable = False
 MONKEY_PATCH = rospy.get_param('do_monkey_patch', False)
@@ -27,9 +33,45 @@ else:
 
 rospy.init_node('styx_server')
 rospy.logwarn("monkey_patch: %r", MONKEY_PATCH)
+# Latency of simulator event handlers, published on /diagnostics
+latency = LatencyStats()
+LatencyPublisher(latency)
+# End-to-end latency tracing, keyed by time of telemetry events
+tracer = TracePublisher()
+# Telemetry event the last DBW commands were computed from
+command_origin = None
+
+def command_trace_cb(msg):
+    global command_origin
+    if msg.hop == DBW_CMD:
+        command_origin = msg.header.stamp
+
+rospy.Subscriber(TRACE_TOPIC, LatencyTrace, command_trace_cb, queue_size=10)
+
+# Optionally log simulator events to file, for replay_events.py
+RECORD_EVENTS = rospy.get_param('~record_events', '')
+event_writer = EventWriter(RECORD_EVENTS) if RECORD_EVENTS else None
+if event_writer is not None:
+    rospy.logwarn("recording simulator events to %s", RECORD_EVENTS)
+    rospy.on_shutdown(event_writer.close)
+
+def recorded(event):
+    """Decorator of event handler that logs the data first, when recording"""
+    def decorator(handler):
+        if event_writer is None:
+            return handler
+        def recording_handler(sid, data):
+            event_writer.write(event, data)
+            return handler(sid, data)
+        return recording_handler
+    return decorator
 
 app = Flask(__name__)
 msgs = {}
+# Simulators that send their time (headless_sim.py) drive ROS time when use_sim_time is set:
+# /clock advances with every `clock` event, once per physics step, and telemetry is stamped with simulated time
+use_sim_time = rospy.get_param('/use_sim_time', False)
+clock_pub = rospy.Publisher('/clock', Clock, queue_size=1) if use_sim_time else None
 
 @sio.on('connect')
 def connect(sid, environ):
@@ -51,33 +93,59 @@ bridge = Bridge(conf, send)
 
 
 @sio.on('telemetry')
+@recorded('telemetry')
+@latency.timed('telemetry')
 def telemetry(sid, data):
     global dbw_enable
     if data["dbw_enable"] != dbw_enable:
         dbw_enable = data["dbw_enable"]
         bridge.publish_dbw_status(dbw_enable)
-    bridge.publish_odometry(data)
-    for i in range(len(msgs)):
-        topic, data = msgs.popitem()
-        sio.emit(topic, data=data, skip_sid=True)
+    if use_sim_time and 'time' in data:
+        stamp = rospy.Time.from_sec(data['time'])
+    else:
+        stamp = rospy.Time.now()
+    bridge.publish_odometry(data, stamp)
+    tracer.trace(TELEMETRY, stamp)
+    if msgs:
+        # commands received since last telemetry event are only emitted now
+        for i in range(len(msgs)):
+            topic, data = msgs.popitem()
+            sio.emit(topic, data=data, skip_sid=True)
+        tracer.trace(EMIT, command_origin)
+
+
+@sio.on('clock')
+@latency.timed('clock')
+def clock(sid, data):
+    # not recorded: sent every physics step, replay_events.py does not need it
+    if clock_pub is not None:
+        clock_pub.publish(Clock(rospy.Time.from_sec(data['time'])))
 
 
 @sio.on('control')
+@recorded('control')
+@latency.timed('control')
 def control(sid, data):
     bridge.publish_controls(data)
 
 
 @sio.on('obstacle')
+@recorded('obstacle')
+@latency.timed('obstacle')
 def obstacle(sid, data):
     bridge.publish_obstacles(data)
 
 
 @sio.on('lidar')
+@recorded('lidar')
+@latency.timed('lidar')
 def obstacle(sid, data):
     bridge.publish_lidar(data)
 
 
 @sio.on('trafficlights')
+@recorded('trafficlights')
+@latency.timed('trafficlights')
 def trafficlights(sid, data):
     bridge.publish_traffic(data)
 
@@ -86,12 +154,17 @@ def trafficlights(sid, data):
 prev_time = timer()
 
 @sio.on('image')
+@recorded('image')
+@latency.timed('image')
 def image(sid, data):
     global prev_time
     if int((timer() - prev_time) * 1000)>=100:
         # publish image every 100ms at most
         bridge.publish_camera(data)
         prev_time = timer()
+        return True
+    # skipped, the return value acknowledges it as dropped to clients that ask (replay_events.py)
+    return False
 
 
 def spinning_worker():
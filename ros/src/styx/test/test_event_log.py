@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Unit tests of the simulator event log, without ROS
+"""
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from event_log import EVENTS, MAGIC, EventWriter, read_events
+
+TELEMETRY = {'x': 1.5, 'y': -2., 'z': 0., 'yaw': 90., 'velocity': 10., 'dbw_enable': True}
+LIGHTS = {'light_pos_x': [1., 2.], 'light_pos_y': [3., 4.], 'light_pos_z': [0., 0.],
+          'light_pos_dx': [0., 0.], 'light_pos_dy': [0., 0.], 'light_state': [0, 2]}
+
+
+class TestEventLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'events.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, events):
+        writer = EventWriter(self.path)
+        for event, data in events:
+            writer.write(event, data)
+        writer.close()
+
+    def test_round_trip(self):
+        events = [('telemetry', TELEMETRY), ('trafficlights', LIGHTS), ('image', {'image': 'AAAA'}),
+                  ('telemetry', dict(TELEMETRY, x=2.))]
+        self.write(events)
+        records = list(read_events(self.path))
+        self.assertEqual([(event, data) for _, event, data in records], events)
+        times = [seconds for seconds, _, _ in records]
+        self.assertEqual(times[0], 0.)
+        self.assertEqual(times, sorted(times))
+
+    def test_every_event_type(self):
+        self.write([(event, {'event': event}) for event in EVENTS])
+        self.assertEqual([data['event'] for _, _, data in read_events(self.path)], EVENTS)
+
+    def test_empty(self):
+        self.write([])
+        self.assertEqual(list(read_events(self.path)), [])
+
+    def test_incomplete_last_record_ignored(self):
+        self.write([('telemetry', TELEMETRY), ('control', {'steering_angle': 0.1})])
+        with gzip.open(self.path, 'rb') as log:
+            content = log.read()
+        for cut in (1, 5, 20):
+            with gzip.open(self.path, 'wb') as log:
+                log.write(content[:-cut])
+            self.assertEqual([event for _, event, _ in read_events(self.path)], ['telemetry'])
+
+    def test_not_an_event_log(self):
+        with gzip.open(self.path, 'wb') as log:
+            log.write(b'X' * len(MAGIC))
+        self.assertRaises(ValueError, list, read_events(self.path))
+
+    def test_unknown_event(self):
+        writer = EventWriter(self.path)
+        self.assertRaises(KeyError, writer.write, 'unknown', {})
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
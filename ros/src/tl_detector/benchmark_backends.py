@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Latency benchmark of traffic light detector with different inference backends.
+
+Runs TLDetectorSegmentation.detect() over a set of images (or synthetic frames when no
+directory is given) and prints latency percentiles and throughput for every backend.
+
+Usage:
+
+    ./benchmark_backends.py --backends tf opencv onnx --images <dir> --frames 200 --threads 4
+"""
+from __future__ import print_function
+
+import argparse
+import glob
+import os
+from timeit import default_timer as timer
+
+import numpy as np
+import cv2
+
+from inference_backends import BACKENDS
+from tl_detector_segmentation import TLDetectorSegmentation
+
+# Frames run before timing starts
+WARMUP_FRAMES = 5
+
+
+def load_images(directory, width=800, height=600):
+    """Loads jpg and png images from directory, or returns one synthetic frame if directory is None"""
+    if directory is None:
+        # fixed seed, so that runs are comparable
+        return [np.random.RandomState(0).randint(0, 256, (height, width, 3)).astype(np.uint8)]
+    paths = sorted(glob.glob(os.path.join(directory, '*.jpg')) + glob.glob(os.path.join(directory, '*.png')))
+    if not paths:
+        raise ValueError('no jpg or png images in {}'.format(directory))
+    return [cv2.imread(path) for path in paths]
+
+
+def benchmark(detector, images, frames):
+    """Times detect() on `frames` images cycling through `images`. Returns latencies in ms."""
+    for i in range(WARMUP_FRAMES):
+        detector.detect(images[i % len(images)])
+    latencies = np.empty(frames)
+    for i in range(frames):
+        start = timer()
+        detector.detect(images[i % len(images)])
+        latencies[i] = (timer() - start) * 1000.
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark traffic light detector inference backends')
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS), default=['tf'])
+    parser.add_argument('--model', action='append', default=[], metavar='BACKEND=PATH',
+                        help='model file for backend, backend default if not given')
+    parser.add_argument('--images', default=None, help='directory with camera images, synthetic if not given')
+    parser.add_argument('--frames', type=int, default=100, help='number of timed frames')
+    parser.add_argument('--threads', type=int, default=0, help='inference threads, 0 lets the engine decide')
+    args = parser.parse_args()
+
+    models = dict(model.split('=', 1) for model in args.model)
+    images = load_images(args.images)
+    for backend in args.backends:
+        start = timer()
+        detector = TLDetectorSegmentation(backend=backend, model_file=models.get(backend), threads=args.threads)
+        load_s = timer() - start
+        latencies = benchmark(detector, images, args.frames)
+        print('{}: load={:.1f}s, mean={:.1f}ms, p50={:.1f}ms, p90={:.1f}ms, p99={:.1f}ms, fps={:.1f}'.format(
+            backend, load_s, latencies.mean(), np.percentile(latencies, 50), np.percentile(latencies, 90),
+            np.percentile(latencies, 99), 1000. / latencies.mean()))
+
+
+if __name__ == '__main__':
+    main()
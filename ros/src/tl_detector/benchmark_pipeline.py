@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+"""
+Offline throughput and accuracy benchmark of the traffic light pipeline, without a running ROS graph.
+
+Every labelled frame goes through TLDetectorSegmentation.detect and TLClassifier.classify_bboxes,
+like in tl_detector. Frames are spread over a pool of worker processes, each with its own model.
+Reported as JSON: latency percentiles of every stage (resize, inference, labeling, classification),
+frames per second, per-class accuracy and confusion counts.
+
+Frames are read from either
+- a directory with subdirectories named by label: red/, yellow/, green/, unknown/ with jpg or png images
+- a bag with camera images, labelled by ground truth /vehicle/traffic_lights (simulator):
+  state of the nearest light ahead of /current_pose, unknown when there is none within --label-distance
+
+Usage:
+
+    ./benchmark_pipeline.py <directory or .bag> [--workers 4] [--backend tf] [--output result.json]
+"""
+from __future__ import print_function
+
+import argparse
+import glob
+import itertools
+import json
+import math
+import multiprocessing
+import os
+from timeit import default_timer as timer
+
+import numpy as np
+
+from styx_msgs.msg import TrafficLight
+
+from carla_core.waypoints import is_waypoint_behind_pose
+
+LABELS = {
+    'red': TrafficLight.RED,
+    'yellow': TrafficLight.YELLOW,
+    'green': TrafficLight.GREEN,
+    'unknown': TrafficLight.UNKNOWN,
+}
+LABEL_NAMES = dict((state, name) for name, state in LABELS.items())
+
+STAGES = ['resize', 'inference', 'labeling', 'classification']
+PERCENTILES = [50, 90, 99]
+
+# worker process globals, set once by _init_worker
+_DETECTOR = None
+_CLASSIFIER = None
+
+
+def directory_frames(directory):
+    """Yields (label, image path) for images in label subdirectories"""
+    for name, state in sorted(LABELS.items()):
+        for ext in ('*.jpg', '*.png'):
+            for path in sorted(glob.glob(os.path.join(directory, name, ext))):
+                yield state, path
+
+
+def light_ahead_label(pose, lights, label_distance):
+    """Ground truth label of a camera frame: state of the nearest light ahead of pose.
+
+    Args:
+        pose (geometry_msgs/Pose): car pose
+        lights (list): styx_msgs/TrafficLight ground truth lights
+        label_distance (float): max distance to the light, m
+
+    Returns:
+        int: state of the light, TrafficLight.UNKNOWN if no light ahead is within label_distance
+    """
+    ahead = [(math.hypot(light.pose.pose.position.x - pose.position.x,
+                         light.pose.pose.position.y - pose.position.y), light.state)
+             for light in lights if not is_waypoint_behind_pose(pose, light)]
+    if not ahead:
+        return TrafficLight.UNKNOWN
+    distance, state = min(ahead, key=lambda item: item[0])
+    return state if distance <= label_distance else TrafficLight.UNKNOWN
+
+
+def bag_frames(path, image_topic, label_distance):
+    """Yields (label, BGR image) for camera images in bag, labelled by ground truth light ahead"""
+    import rosbag
+    from image_ingest import ImageIngest
+
+    ingest = ImageIngest()
+    pose = None
+    lights = []
+    bag = rosbag.Bag(path)
+    try:
+        for topic, msg, _ in bag.read_messages(topics=[image_topic, '/current_pose', '/vehicle/traffic_lights']):
+            if topic == '/current_pose':
+                pose = msg.pose
+            elif topic == '/vehicle/traffic_lights':
+                lights = msg.lights
+            elif pose is not None and lights:
+                label = light_ahead_label(pose, lights, label_distance)
+                # ingest buffer is reused, frames are queued for the pool
+                yield label, ingest.from_msg(msg).copy()
+    finally:
+        bag.close()
+
+
+def _init_worker(backend, model_file, threads):
+    """Pool initializer. Loads the model once per worker process."""
+    global _DETECTOR, _CLASSIFIER
+    from light_classification.tl_classifier import TLClassifier
+    from tl_detector_segmentation import TLDetectorSegmentation
+
+    _DETECTOR = TLDetectorSegmentation(backend=backend, model_file=model_file, threads=threads)
+    _CLASSIFIER = TLClassifier()
+
+
+def _process_frame(task):
+    """Pool task: (label, image path or image) -> (label, predicted state, {stage: seconds})"""
+    import cv2
+
+    label, image = task
+    if not isinstance(image, np.ndarray):
+        image = cv2.imread(image)
+    bboxes, _ = _DETECTOR.detect(image)
+    times = dict(_DETECTOR.stage_times)
+    start = timer()
+    state, _ = _CLASSIFIER.classify_bboxes(image, bboxes)
+    times['classification'] = timer() - start
+    return label, state, times
+
+
+def summarize(results):
+    """Aggregates per frame results into JSON serializable report of latencies and accuracy"""
+    report = {'frames': len(results), 'stages_ms': {}, 'per_class': {}, 'confusion': {}}
+    for stage in STAGES:
+        times = np.array([times[stage] for _, _, times in results]) * 1000.
+        stats = {'mean': float(times.mean()) if len(times) else 0.}
+        for percentile in PERCENTILES:
+            stats['p{}'.format(percentile)] = float(np.percentile(times, percentile)) if len(times) else 0.
+        report['stages_ms'][stage] = stats
+
+    correct = 0
+    for state, name in LABEL_NAMES.items():
+        predicted = [prediction for label, prediction, _ in results if label == state]
+        if not predicted:
+            continue
+        hits = sum(prediction == state for prediction in predicted)
+        correct += hits
+        report['per_class'][name] = {'frames': len(predicted), 'accuracy': float(hits) / len(predicted)}
+        report['confusion'][name] = dict((LABEL_NAMES[other], sum(prediction == other for prediction in predicted))
+                                         for other in LABEL_NAMES)
+    report['accuracy'] = float(correct) / len(results) if results else 0.
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark traffic light detection and classification offline')
+    parser.add_argument('source', help='directory with red/yellow/green/unknown subdirectories or .bag file')
+    parser.add_argument('--workers', type=int, default=2, help='number of worker processes')
+    parser.add_argument('--backend', default='tf', help='inference backend: tf, opencv or onnx')
+    parser.add_argument('--model', default=None, help='model file, backend default if not given')
+    parser.add_argument('--threads', type=int, default=0, help='inference threads per worker, 0 lets the engine decide')
+    parser.add_argument('--image-topic', default='/image_color', help='camera topic in bag')
+    parser.add_argument('--label-distance', type=float, default=100., help='max distance to labelled light ahead in bag, m')
+    parser.add_argument('--max-frames', type=int, default=None, help='stop after that many frames')
+    parser.add_argument('--output', default=None, help='write JSON report to file instead of stdout')
+    args = parser.parse_args()
+
+    if args.source.endswith('.bag'):
+        frames = bag_frames(args.source, args.image_topic, args.label_distance)
+    else:
+        frames = directory_frames(args.source)
+    if args.max_frames is not None:
+        frames = itertools.islice(frames, args.max_frames)
+
+    pool = multiprocessing.Pool(args.workers, initializer=_init_worker,
+                                initargs=(args.backend, args.model, args.threads))
+    # models load in initializers, timing starts with the first result so that loading is not counted
+    try:
+        results = []
+        start = None
+        for result in pool.imap(_process_frame, frames):
+            if start is None:
+                start = timer()
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+    wall_time = timer() - start if start is not None else 0.
+
+    report = summarize(results)
+    report['wall_time_s'] = wall_time
+    report['fps'] = (len(results) - 1) / wall_time if wall_time > 0 else 0.
+    report.update({'source': args.source, 'workers': args.workers, 'backend': args.backend, 'model': args.model})
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
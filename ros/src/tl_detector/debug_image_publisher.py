@@ -0,0 +1,101 @@
+"""
+Publisher of /image_debug: camera image with detected traffic lights overlayed.
+
+Overlay is rendered in a separate worker thread, only when somebody is subscribed to the topic,
+and not more often than `max_rate`. Detector thread just resizes the camera image into a preallocated
+buffer, hands it over with detected boxes and carries on. Rendering uses preallocated buffers.
+"""
+from threading import Lock, Thread, Event
+from timeit import default_timer as timer
+
+import rospy
+from sensor_msgs.msg import Image
+from styx_msgs.msg import TrafficLight
+
+import numpy as np
+import cv2
+
+# BGR color of overlay for each classified state
+TL_COLORS = {
+    TrafficLight.RED: (0, 0, 255),
+    TrafficLight.YELLOW: (0, 255, 255),
+    TrafficLight.GREEN: (0, 255, 0),
+}
+UNKNOWN_COLOR = (255, 255, 255)
+
+
+class DebugImagePublisher(object):
+    """Renders and publishes debug images off the detection path."""
+
+    def __init__(self, topic, bridge, max_rate, width=400, height=300):
+        self.publisher = rospy.Publisher(topic, Image, queue_size=1)
+        self.bridge = bridge
+        self.min_period = 1. / max_rate if max_rate > 0 else 0.
+        self.last_submit_time = 0.
+
+        # preallocated buffers at output size. resized is written by submit, frame is its copy for the worker
+        self.size = (width, height)
+        self.resized = np.zeros((height, width, 3), dtype=np.uint8)
+        self.frame = np.zeros_like(self.resized)
+        self.rects = np.zeros_like(self.resized)
+        self.overlay = np.zeros_like(self.resized)
+
+        # only the most recent frame is kept. older one is dropped if worker did not get to it
+        self.lock = Lock()
+        self.event = Event()
+        self.pending = None
+        self.thread = Thread(target=self.worker)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def wants_frame(self):
+        """Is there a subscriber and is it time for next frame?"""
+        if self.publisher.get_num_connections() == 0:
+            return False
+        return timer() - self.last_submit_time >= self.min_period
+
+    def submit(self, image, detections):
+        """Resizes image into output size buffer and hands it over for rendering.
+        Image is not referenced afterwards, caller may reuse it.
+
+        Args:
+            image (np.array): camera image, BGR
+            detections (list): (bounding box, TrafficLight state, confidence) triples
+        """
+        self.last_submit_time = timer()
+        with self.lock:
+            cv2.resize(image, self.size, dst=self.resized, interpolation=cv2.INTER_LINEAR)
+            self.pending = (image.shape, detections)
+            # set under lock, else a late set wakes the worker after it took this frame already
+            self.event.set()
+
+    def worker(self):
+        """Loop of the worker thread. Renders and publishes submitted frames."""
+        while not rospy.is_shutdown():
+            if not self.event.wait(timeout=1.0):
+                continue
+            with self.lock:
+                self.event.clear()
+                if self.pending is None:
+                    continue
+                image_shape, detections = self.pending
+                self.pending = None
+                np.copyto(self.frame, self.resized)
+            self.render(image_shape, detections)
+            self.publisher.publish(self.bridge.cv2_to_imgmsg(self.overlay, encoding="bgr8"))
+
+    def render(self, image_shape, detections):
+        """Overlays detected boxes colored by their state over self.frame into self.overlay
+
+        Args:
+            image_shape (tuple): shape of the camera image of the boxes
+            detections (list): (bounding box, TrafficLight state, confidence) triples
+        """
+        scale_x = float(self.size[0]) / image_shape[1]
+        scale_y = float(self.size[1]) / image_shape[0]
+        self.rects.fill(0)
+        for box, state, _ in detections:
+            top_left = (int(box[0][0] * scale_x), int(box[0][1] * scale_y))
+            bottom_right = (int(box[1][0] * scale_x), int(box[1][1] * scale_y))
+            cv2.rectangle(self.rects, top_left, bottom_right, TL_COLORS.get(state, UNKNOWN_COLOR), thickness=-1)
+        cv2.addWeighted(self.frame, 1.0, self.rects, 0.5, 0, dst=self.overlay)
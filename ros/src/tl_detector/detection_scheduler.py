@@ -0,0 +1,53 @@
+"""
+Scheduler deciding how often to run traffic light detection.
+
+Detection is expensive and only matters when the car has to decide whether to stop.
+Far from the stop line, or when standing still with a stable detected state,
+it is enough to look at the light every now and then.
+"""
+
+# Below this velocity (m/s) car is considered stopped
+STOPPED_VELOCITY = 0.5
+
+
+class DetectionScheduler(object):
+    """
+    Computes minimal period between detections from time to reach next stop line.
+
+    Inside `decision_zone` seconds from the stop line every image is processed.
+    Further away period grows by `period_per_second` for every second above the decision zone,
+    up to `max_period`. When stopped with a stable state period is `stopped_period`.
+    """
+
+    def __init__(self, decision_zone=4., period_per_second=0.25, max_period=1., stopped_period=0.5):
+        self.decision_zone = decision_zone
+        self.period_per_second = period_per_second
+        self.max_period = max_period
+        self.stopped_period = stopped_period
+        self.last_run = None
+
+    def period(self, distance, velocity, state_stable):
+        """Minimal time between detections, seconds.
+
+        Args:
+            distance (float): arc length to the stop line, meters
+            velocity (float): current velocity, m/s
+            state_stable (bool): detected state did not change recently
+        """
+        if abs(velocity) < STOPPED_VELOCITY:
+            return self.stopped_period if state_stable else 0.
+        time_to_line = distance / abs(velocity)
+        if time_to_line <= self.decision_zone:
+            return 0.
+        return min(self.max_period, (time_to_line - self.decision_zone) * self.period_per_second)
+
+    def should_run(self, now, distance, velocity, state_stable):
+        """Is detection due at time `now`? If so it is recorded as run."""
+        if self.last_run is not None and now - self.last_run < self.period(distance, velocity, state_stable):
+            return False
+        self.last_run = now
+        return True
+
+    def reset(self):
+        """Next call to should_run returns True."""
+        self.last_run = None
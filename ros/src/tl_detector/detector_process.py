@@ -0,0 +1,214 @@
+"""
+Traffic light detection in a separate worker process.
+
+Tensorflow inference, NumPy/OpenCV post-processing and classification all hold the GIL
+for long stretches, which delays rospy callbacks of the node when they run in a thread.
+Here they run in a child process. Raw camera frames are passed through a ring of slots
+in shared memory, and only small result tuples come back through a queue.
+
+Errors of a request are sent back as its result, so its slot is freed. If the worker dies
+or hangs, the parent restarts it and drops the requests in flight.
+"""
+import ctypes
+import multiprocessing
+import os
+import signal
+import traceback
+from Queue import Empty
+from timeit import default_timer as timer
+
+import numpy as np
+
+from image_ingest import ENCODINGS, ImageIngest, image_view
+
+# Number of frame slots in shared memory ring
+RING_SLOTS = 2
+# How long the worker waits for a request before checking that parent is still alive
+WORKER_POLL_TIMEOUT = 1.0
+# Sequence number of the message worker sends once it has loaded the model
+READY_SEQ = 0
+
+
+class DetectorProcessError(Exception):
+    """Detection failed in worker process, or worker process died"""
+
+
+def create_detector(keyframe_interval=1, min_confidence=0.7, backend='tf', model_file=None, threads=0):
+    """Creates segmentation detector, wrapped in tracker if keyframe_interval > 1
+
+    Returns:
+        (detector, list): detector and (phase, seconds) timeline of its initialization
+    """
+    start = timer()
+    from tl_detector_segmentation import TLDetectorSegmentation
+    from tl_tracker import TLTracker
+    timeline = [('detector imports', timer() - start)]
+
+    detector = TLDetectorSegmentation(backend=backend, model_file=model_file, threads=threads)
+    timeline += detector.timeline
+    if keyframe_interval > 1:
+        detector = TLTracker(detector, keyframe_interval=keyframe_interval, min_confidence=min_confidence)
+    return detector, timeline
+
+
+def _worker(shared, slot_size, requests, results, detector_args):
+    """Worker process loop. Decodes frames from shared memory, detects and classifies traffic lights.
+
+    Puts (seq, slot, result, error) on results for every request: result tuple and None,
+    or None and the traceback of the failure. The first message is (READY_SEQ, None, timeline, None),
+    or (READY_SEQ, None, None, traceback) if the detector could not be created.
+    """
+    # roslaunch stops the parent, which then takes down this daemon process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        from light_classification.tl_classifier import TLClassifier
+        detector, timeline = create_detector(**detector_args)
+        classifier = TLClassifier()
+    except Exception:
+        results.put((READY_SEQ, None, None, traceback.format_exc()))
+        return
+
+    frames = np.frombuffer(shared, dtype=np.uint8).reshape(RING_SLOTS, slot_size)
+    ingest = ImageIngest()
+    parent = os.getppid()
+    results.put((READY_SEQ, None, timeline, None))
+
+    while os.getppid() == parent:
+        try:
+            seq, slot, height, width, step, encoding = requests.get(timeout=WORKER_POLL_TIMEOUT)
+        except Empty:
+            continue
+        start = timer()
+        try:
+            image = ingest.to_bgr(image_view(frames[slot], height, width, step), encoding)
+            bboxes, tf_ms = detector.detect(image)
+            state, detections = classifier.classify_bboxes(image, bboxes)
+        except Exception:
+            results.put((seq, slot, None, traceback.format_exc()))
+            continue
+        results.put((seq, slot, (state, detections, tf_ms, int((timer() - start) * 1000)), None))
+
+
+class DetectorProcess(object):
+    """
+    Runs traffic light detection and classification in a child process.
+
+    Frames are written into the next free slot of a ring in shared memory. At most
+    RING_SLOTS frames are in flight, further frames are rejected until a result comes back.
+    """
+
+    def __init__(self, max_width, max_height, **detector_args):
+        """
+        :param max_width: max width of frames, in pixels
+        :param max_height: max height of frames, in pixels
+        :param detector_args: arguments of create_detector for the worker process
+        """
+        self.slot_size = max_width * max_height * 3
+        self.shared = multiprocessing.RawArray(ctypes.c_uint8, RING_SLOTS * self.slot_size)
+        self.frames = np.frombuffer(self.shared, dtype=np.uint8).reshape(RING_SLOTS, self.slot_size)
+        self.detector_args = detector_args
+        self.seq = READY_SEQ
+        self.process = None
+        self.start()
+
+    def start(self):
+        """Starts worker process with empty queues and all slots free"""
+        self.free_slots = list(range(RING_SLOTS))
+        self.ready = False
+        self.requests = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=_worker,
+                                               args=(self.shared, self.slot_size, self.requests, self.results,
+                                                     self.detector_args))
+        self.process.daemon = True
+        self.process.start()
+
+    def restart(self):
+        """Terminates worker process and starts a new one. Requests in flight are dropped,
+        frames are rejected until the new worker is ready.
+        """
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.start()
+
+    def _receive(self, timeout):
+        """Next message from worker, polling that it is alive.
+
+        Raises:
+            Empty: no message within timeout
+            DetectorProcessError: worker process died
+        """
+        deadline = None if timeout is None else timer() + timeout
+        while True:
+            poll = WORKER_POLL_TIMEOUT if deadline is None else max(0., min(WORKER_POLL_TIMEOUT, deadline - timer()))
+            try:
+                return self.results.get(timeout=poll)
+            except Empty:
+                if not self.process.is_alive():
+                    raise DetectorProcessError("worker process exited with code {}".format(self.process.exitcode))
+                if deadline is not None and timer() >= deadline:
+                    raise
+
+    def wait_ready(self, timeout=None):
+        """Blocks until worker has loaded the model.
+
+        Returns:
+            list: (phase, seconds) timeline of detector initialization in worker, None on timeout
+
+        Raises:
+            DetectorProcessError: worker could not create the detector, or worker process died
+        """
+        if self.ready:
+            return []
+        try:
+            _, _, timeline, error = self._receive(timeout)
+        except Empty:
+            return None
+        if error is not None:
+            raise DetectorProcessError(error)
+        self.ready = True
+        return timeline
+
+    def submit(self, msg):
+        """Copies sensor_msgs/Image into a free slot and requests its detection.
+
+        Returns:
+            int: request id to pass to get_result, None if frame was rejected: worker not ready,
+                no free slot, unsupported encoding or too large
+
+        Raises:
+            DetectorProcessError: worker process failed to load the model
+        """
+        if not self.ready and self.wait_ready(timeout=0) is None:
+            return None
+        if not self.free_slots or msg.encoding not in ENCODINGS or msg.height * msg.step > self.slot_size:
+            return None
+        slot = self.free_slots.pop(0)
+        size = msg.height * msg.step
+        self.frames[slot, :size] = np.frombuffer(msg.data, dtype=np.uint8, count=size)
+        self.seq += 1
+        self.requests.put((self.seq, slot, msg.height, msg.width, msg.step, msg.encoding))
+        return self.seq
+
+    def get_result(self, seq, timeout=None):
+        """Waits for detection result of request `seq`. Results of older requests are discarded.
+
+        Returns:
+            tuple: (state, [(bounding box, state, confidence)], tf ms, total worker ms) or None on timeout
+
+        Raises:
+            DetectorProcessError: detection failed in worker, or worker process died
+        """
+        deadline = None if timeout is None else timer() + timeout
+        while True:
+            try:
+                remaining = None if deadline is None else max(0., deadline - timer())
+                result_seq, slot, result, error = self._receive(remaining)
+            except Empty:
+                return None
+            self.free_slots.append(slot)
+            if result_seq == seq:
+                if error is not None:
+                    raise DetectorProcessError(error)
+                return result
@@ -0,0 +1,45 @@
+"""
+Conversion of sensor_msgs/Image to OpenCV BGR image without per-frame allocations.
+
+Image data is viewed in place with np.frombuffer. The simulator bridge publishes rgb8
+(real RGB order), the car camera bgr8. bgr8 frames are used as they are, rgb8 frames
+are converted explicitly into a buffer that is reused from frame to frame.
+"""
+import numpy as np
+import cv2
+
+# Image encodings handled here, both 3 bytes per pixel
+ENCODINGS = ('bgr8', 'rgb8')
+
+
+def image_view(data, height, width, step):
+    """(height, width, 3) uint8 view of image with `step` bytes per row, without copy"""
+    return np.frombuffer(data, dtype=np.uint8, count=height * step).reshape(height, step)[:, :width * 3]\
+        .reshape(height, width, 3)
+
+
+class ImageIngest(object):
+    """
+    Gives BGR view of camera frames.
+
+    Returned image is only valid until the next call: rgb8 frames are converted into the same buffer.
+    It is read only when it is a view of message data. Copy it to keep or modify it.
+    """
+
+    def __init__(self):
+        self._bgr = None
+
+    def to_bgr(self, image, encoding):
+        """BGR image from (height, width, 3) image in `encoding`, one of ENCODINGS"""
+        if encoding == 'bgr8':
+            return image
+        if encoding != 'rgb8':
+            raise ValueError('unsupported image encoding {}, expected one of {}'.format(encoding, ENCODINGS))
+        if self._bgr is None or self._bgr.shape != image.shape:
+            self._bgr = np.empty(image.shape, dtype=np.uint8)
+        cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=self._bgr)
+        return self._bgr
+
+    def from_msg(self, msg):
+        """BGR image from sensor_msgs/Image"""
+        return self.to_bgr(image_view(msg.data, msg.height, msg.width, msg.step), msg.encoding)
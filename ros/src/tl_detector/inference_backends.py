@@ -0,0 +1,162 @@
+"""
+Inference backends for the traffic lights segmentation model.
+
+Every backend takes a resized BGR uint8 image and returns (height, width) uint8 mask
+which is non-zero for pixels classified as traffic light.
+Engines are imported only when their backend is created, so only the one in use has to be installed.
+
+Only the Tensorflow backend runs the frozen training graph detector_graph.pb as is. Default models
+of the other backends are converted from it by optimize_graph.py:
+
+    ./optimize_graph.py detector_graph.pb detector_graph_opt.pb --onnx detector_graph.onnx --no-compare
+
+ONNX Runtime has no Python 2.7 packages, the onnx backend runs only under Python 3.
+"""
+import importlib
+import os
+import sys
+
+import numpy as np
+
+# Class index of 'traffic light' pixels in model output. 0 is background
+TL_CLASS = 1
+# Node names of Tensorflow graph
+INPUT_NODE = 'data/images'
+KEEP_PROB_NODE = 'keep_prob'
+OUTPUT_NODE = 'predictions/prediction_class'
+
+
+class TFGraphBackend(object):
+    """Frozen Tensorflow graph (detector_graph.pb) run in tf.Session"""
+    default_model = 'detector_graph.pb'
+    engine = 'tensorflow'
+    conversion = None
+    python3_only = False
+
+    def __init__(self, model_file, threads=0):
+        import tensorflow as tf
+
+        config = tf.ConfigProto(log_device_placement=False,
+                                intra_op_parallelism_threads=threads,
+                                inter_op_parallelism_threads=threads)
+        # own graph, so several backends (e.g. original and optimized model) do not share the default one
+        graph = tf.Graph()
+        self._session = tf.Session(graph=graph, config=config)
+
+        scope = 'detector'
+        graph_def = tf.GraphDef()
+        with open(model_file, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+        with graph.as_default():
+            tf.import_graph_def(graph_def, name=scope)
+        self._input = graph.get_tensor_by_name(scope + '/' + INPUT_NODE + ':0')
+        self._output = graph.get_tensor_by_name(scope + '/' + OUTPUT_NODE + ':0')
+        # graphs optimized by optimize_graph.py have dropout stripped and no keep_prob input
+        self._feed = {}
+        if scope + '/' + KEEP_PROB_NODE in set(op.name for op in graph.get_operations()):
+            self._feed[graph.get_tensor_by_name(scope + '/' + KEEP_PROB_NODE + ':0')] = 1.0
+
+    def predict(self, image):
+        feed = dict(self._feed)
+        feed[self._input] = image[np.newaxis]
+        predicted_class = self._session.run(self._output, feed)
+        return np.array(predicted_class[0, :, :, TL_CLASS], dtype=np.uint8)
+
+
+class OpenCVDNNBackend(object):
+    """
+    OpenCV DNN module on CPU. Reads Tensorflow .pb or .onnx model.
+
+    OpenCV cannot run training only nodes (dropout), the model has to be an inference graph
+    such as detector_graph_opt.pb written by optimize_graph.py.
+    """
+    default_model = 'detector_graph_opt.pb'
+    engine = 'cv2'
+    conversion = './optimize_graph.py detector_graph.pb detector_graph_opt.pb --no-compare'
+    python3_only = False
+
+    def __init__(self, model_file, threads=0):
+        import cv2
+
+        if threads > 0:
+            cv2.setNumThreads(threads)
+        self._cv2 = cv2
+        self._net = cv2.dnn.readNet(model_file)
+        self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def predict(self, image):
+        # BGR as given, same as the Tensorflow backend: default swapRB changed from True to False after OpenCV 3.3
+        self._net.setInput(self._cv2.dnn.blobFromImage(image, swapRB=False, crop=False))
+        # NCHW class scores
+        scores = self._net.forward()
+        return (np.argmax(scores[0], axis=0) == TL_CLASS).astype(np.uint8)
+
+
+class ONNXRuntimeBackend(object):
+    """
+    ONNX Runtime CPU execution of the model converted to ONNX with tf2onnx by optimize_graph.py.
+
+    Python 3 only: onnxruntime has never been released for Python 2.7.
+    """
+    default_model = 'detector_graph.onnx'
+    engine = 'onnxruntime'
+    conversion = './optimize_graph.py detector_graph.pb detector_graph_opt.pb --onnx detector_graph.onnx --no-compare'
+    python3_only = True
+
+    def __init__(self, model_file, threads=0):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self._session = onnxruntime.InferenceSession(model_file, options)
+        inputs = self._session.get_inputs()
+        self._input = inputs[0].name
+        self._dtype = np.uint8 if 'uint8' in inputs[0].type else np.float32
+        # remaining inputs are keep_prob like scalars if dropout was not stripped on conversion
+        self._extra_feed = dict((i.name, np.array(1.0, dtype=np.float32)) for i in inputs[1:])
+
+    def predict(self, image):
+        feed = dict(self._extra_feed)
+        feed[self._input] = image[np.newaxis].astype(self._dtype, copy=False)
+        # NHWC class scores (or one-hot classes) as in Tensorflow graph
+        scores = self._session.run(None, feed)[0]
+        return (np.argmax(scores[0], axis=2) == TL_CLASS).astype(np.uint8)
+
+
+BACKENDS = {
+    'tf': TFGraphBackend,
+    'opencv': OpenCVDNNBackend,
+    'onnx': ONNXRuntimeBackend,
+}
+
+
+def _backend_class(name):
+    if name not in BACKENDS:
+        raise ValueError('unknown inference backend {}, expected one of {}'.format(name, sorted(BACKENDS)))
+    backend_class = BACKENDS[name]
+    if backend_class.python3_only and sys.version_info[0] < 3:
+        raise ImportError('{} backend needs Python 3, {} is not available for Python {}.{}'.format(
+            name, backend_class.engine, *sys.version_info[:2]))
+    return backend_class
+
+
+def import_engine(name):
+    """Imports engine module of backend `name` ahead of create_backend, e.g. to time it separately from model load"""
+    importlib.import_module(_backend_class(name).engine)
+
+
+def create_backend(name, model_file=None, threads=0):
+    """Creates inference backend by name ('tf', 'opencv' or 'onnx')
+
+    :param model_file: model path, backend default if None
+    :param threads: number of CPU threads for inference, 0 lets the engine decide
+    """
+    backend_class = _backend_class(name)
+    if model_file is None:
+        model_file = backend_class.default_model
+        if backend_class.conversion is not None and not os.path.exists(model_file):
+            raise IOError('default model {} of {} backend not found, convert it from detector_graph.pb with: {}'.format(
+                model_file, name, backend_class.conversion))
+    return backend_class(model_file, threads)
@@ -1,13 +1,61 @@
 from styx_msgs.msg import TrafficLight
 import rospy
-import os
-import cv2
+from carla_core.tl_classification import classify_light
 
+# Names of traffic light colors for logging
+LIGHT_NAMES = {TrafficLight.RED: 'RED', TrafficLight.YELLOW: 'YELLOW', TrafficLight.GREEN: 'GREEN'}
+
+# Skip smaller images to avoid false positives
+MIN_IMAGE_HEIGHT = 50
 
 
 class TLClassifier(object):
     def __init__(self):
-        pass
+        # confidence of last get_classification result
+        self.confidence = 0.
+
+    def classify_bboxes(self, image, bboxes):
+        """Classifies traffic lights in bounding boxes and comes to consensus about their state
+
+        Args:
+            image (cv::Mat): camera image
+            bboxes (list): bounding boxes ((x1, y1), (x2, y2)) of traffic lights in the image
+
+        Returns:
+            (int, list): consensus ID of traffic light color (specified in styx_msgs/TrafficLight),
+                (bounding box, color ID, confidence) for every classified traffic light
+        """
+        classification = {TrafficLight.UNKNOWN: 0,
+                          TrafficLight.RED: 0,
+                          TrafficLight.YELLOW: 0,
+                          TrafficLight.GREEN: 0}
+        detections = []
+        for box in bboxes:
+            x1 = box[0][0]
+            y1 = box[0][1]
+            x2 = box[1][0]
+            y2 = box[1][1]
+            tl_image = image[y1:y2, x1:x2]
+
+            if tl_image.shape[0] < MIN_IMAGE_HEIGHT:
+                rospy.loginfo("tl_classifier: TL image detected too small and likely a false positive. Discarding & continuing.")
+                continue
+
+            rospy.logdebug("tl_classifier: About to call classifier")
+            tl_class = self.get_classification(tl_image)
+            classification[tl_class] += 1
+            detections.append((box, tl_class, self.confidence))
+
+        # any RED light wins
+        result = TrafficLight.UNKNOWN
+        if classification[TrafficLight.RED] > 0:
+            result = TrafficLight.RED
+        elif classification[TrafficLight.YELLOW] > 0:
+            result = TrafficLight.YELLOW
+        elif classification[TrafficLight.GREEN] > 0:
+            result = TrafficLight.GREEN
+
+        return result, detections
 
     def get_classification(self, image):
         """Determines the color of the traffic light in the image
@@ -22,68 +70,22 @@ class TLClassifier(object):
             It requires adjustment to work in cases where the traffic light has different number of colors, or their arrangement is different (e.g., horizontal)
 
         Args:
-            image (cv::Mat): image containing the traffic light, with just the 3 lights/bulbs, and cropped to include minimum background. 
+            image (cv::Mat): BGR image containing the traffic light, with just the 3 lights/bulbs, and cropped to include minimum background. 
             The classifier is agnostic to the resolution or proportions of the image 
 
         Returns:
             int: ID of traffic light color (specified in styx_msgs/TrafficLight)
+            Confidence of the result is left in self.confidence: relative margin of the brightest
+            section over the second brightest, from 0 (tie) to 1 (only one section lit)
 
         """
   
         rospy.logdebug("tl_classifier: Classification requested")
 
-        # An initial cropping can be applied to the image, to minimize the amount of background area outside of the traffic light. Tweak depending on the image source used.
-        self.img_h, self.img_w, self.img_d = image.shape
-
-        height_trim = 0.1
-        width_trim = 0.1
-
-        # Image is trimmed, converted to CIELUV and L channel is extracted
-        self.l_channel = cv2.cvtColor(image, cv2.COLOR_RGB2LUV)[int(height_trim*self.img_h):int((1.0 - height_trim)*self.img_h),int(width_trim*self.img_w):int((1.0-width_trim)*self.img_w),0]
-
-        # Markers are established to enable splitting the image into top, mid, and bottom thirds
-        self.img_h, self.img_w = self.l_channel.shape
-
-        self.top_third_marker = int(self.img_h / 3)
-        self.bottom_third_marker = self.img_h - self.top_third_marker
+        state, self.confidence = classify_light(image)
 
-        # Magnitude of L is established for each section of the image
-        top = 0
-        mid = 0
-        bottom = 0
-
-        count_result = {'RED': 0 , 'YELLOW': 0, 'GREEN': 0}
-
-        for i in range(self.top_third_marker):
-            for j in range(self.img_w):
-                top += self.l_channel[i][j]
-        count_result['RED'] = top
-
-        for i in range(self.top_third_marker, self.bottom_third_marker):
-            for j in range(self.img_w):
-                mid += self.l_channel[i][j]
-        count_result['YELLOW'] = mid
-
-        for i in range(self.bottom_third_marker, self.img_h):
-            for j in range(self.img_w):
-                bottom += self.l_channel[i][j]
-        count_result['GREEN'] = bottom
-
-        #The result is classified into one of the 3 colors and returned
-        max_count = max(count_result, key=count_result.get)
-
-        if max_count == 'RED':
-            rospy.logdebug("tl_classifier: RED light detected") 
-            return TrafficLight.RED
-
-        elif max_count == 'YELLOW':
-            rospy.logdebug("tl_classifier: YELLOW light detected") 
-            return TrafficLight.YELLOW
-
-        elif max_count == 'GREEN':
-            rospy.logdebug("tl_classifier: GREEN light detected")
-            return TrafficLight.GREEN 
-
-        else:
+        if state == TrafficLight.UNKNOWN:
             rospy.logwarn("tl_classifier: ERROR - cannot classify light")
-            return TrafficLight.UNKNOWN
+        else:
+            rospy.logdebug("tl_classifier: %s light detected", LIGHT_NAMES[state])
+        return state
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+Offline optimization of frozen detector graph (detector_graph.pb) for inference.
+
+- dropout layers are removed as if keep_prob was 1, keep_prob input goes away with them
+- nodes not needed to compute predictions (training, summaries) are stripped
+- constants and batch norms are folded, identity nodes removed
+- optionally weights are quantized to 8 bit (dequantized at load, smaller file, same compute)
+
+Then original and optimized graphs are compared on the same images: file size,
+load time (including warmup frame), per-frame latency and agreement of detected boxes.
+Optimized graph is loaded by TLDetectorSegmentation like the original one,
+set ~inference_model param of tl_detector to its path. It is also the default model of the
+opencv inference backend, which cannot run dropout. With --onnx it is converted for the onnx
+backend by tf2onnx (pip install tf2onnx).
+
+Usage:
+
+    ./optimize_graph.py detector_graph.pb detector_graph_opt.pb [--quantize] [--onnx detector_graph.onnx] [--images <dir>]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+
+from inference_backends import INPUT_NODE, KEEP_PROB_NODE, OUTPUT_NODE
+
+# Graph transforms applied after dropout is stripped
+TRANSFORMS = [
+    'strip_unused_nodes',
+    'remove_nodes(op=Identity, op=CheckNumerics)',
+    'fold_constants(ignore_errors=true)',
+    'fold_batch_norms',
+    'fold_old_batch_norms',
+]
+QUANTIZE_TRANSFORMS = ['quantize_weights']
+FINAL_TRANSFORMS = ['sort_by_execution_order']
+
+
+def _node_name(tensor_name):
+    """Node name from node input reference: 'name', 'name:1' or '^name'"""
+    return tensor_name.lstrip('^').split(':')[0]
+
+
+def strip_dropout(graph_def, keep_prob=KEEP_PROB_NODE):
+    """
+    Bypasses dropout layers, in place. Returns number of layers bypassed.
+
+    Dropout is x / keep_prob * floor(keep_prob + random_uniform), i.e. Mul(RealDiv(x, keep_prob), Floor).
+    Consumers of the Mul are rewired to x. Bypassed nodes are left for strip_unused_nodes.
+    """
+    nodes = dict((node.name, node) for node in graph_def.node)
+    bypass = {}
+    for node in graph_def.node:
+        if node.op != 'Mul' or len(node.input) != 2:
+            continue
+        div, floor = [nodes.get(_node_name(name)) for name in node.input]
+        if div is not None and div.op == 'Floor':
+            div, floor = floor, div
+        if div is None or floor is None or floor.op != 'Floor' or div.op not in ('RealDiv', 'Div'):
+            continue
+        if _node_name(div.input[1]) == keep_prob:
+            bypass[node.name] = div.input[0]
+
+    for node in graph_def.node:
+        for i, name in enumerate(node.input):
+            source = bypass.get(_node_name(name))
+            if source is None:
+                continue
+            node.input[i] = '^' + _node_name(source) if name.startswith('^') else source
+    return len(bypass)
+
+
+def optimize(graph_def, quantize=False):
+    """Returns optimized copy of frozen detector GraphDef"""
+    import tensorflow as tf
+    from tensorflow.tools.graph_transforms import TransformGraph
+
+    graph_def_copy = tf.GraphDef()
+    graph_def_copy.CopyFrom(graph_def)
+    strip_dropout(graph_def_copy)
+    transforms = TRANSFORMS + (QUANTIZE_TRANSFORMS if quantize else []) + FINAL_TRANSFORMS
+    return TransformGraph(graph_def_copy, [INPUT_NODE], [OUTPUT_NODE], transforms)
+
+
+def convert_to_onnx(graph_file, onnx_file):
+    """Converts frozen inference graph to ONNX with the tf2onnx command line converter"""
+    subprocess.check_call([sys.executable, '-m', 'tf2onnx.convert', '--input', graph_file,
+                           '--inputs', INPUT_NODE + ':0', '--outputs', OUTPUT_NODE + ':0',
+                           '--output', onnx_file])
+
+
+def evaluate(model_file, images, frames):
+    """Loads model in TLDetectorSegmentation and benchmarks it.
+
+    Returns:
+        dict: size (bytes), load (s, including warmup), latencies (ms), bboxes on every image
+    """
+    from benchmark_backends import benchmark
+    from tl_detector_segmentation import TLDetectorSegmentation
+
+    start = timer()
+    detector = TLDetectorSegmentation(backend='tf', model_file=model_file)
+    load_s = timer() - start
+    return {
+        'size': os.path.getsize(model_file),
+        'load': load_s,
+        'latencies': benchmark(detector, images, frames),
+        'bboxes': [detector.detect(image)[0] for image in images],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Optimize frozen traffic light detector graph for inference')
+    parser.add_argument('input', nargs='?', default='detector_graph.pb', help='frozen graph')
+    parser.add_argument('output', nargs='?', default='detector_graph_opt.pb', help='optimized graph')
+    parser.add_argument('--quantize', action='store_true', help='store weights as 8 bit')
+    parser.add_argument('--onnx', default=None, help='also convert optimized graph to this ONNX model')
+    parser.add_argument('--images', default=None, help='directory with camera images, synthetic if not given')
+    parser.add_argument('--frames', type=int, default=50, help='number of timed frames per graph')
+    parser.add_argument('--no-compare', action='store_true', help='only write optimized graph')
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    graph_def = tf.GraphDef()
+    with open(args.input, 'rb') as f:
+        graph_def.ParseFromString(f.read())
+    optimized = optimize(graph_def, quantize=args.quantize)
+    with open(args.output, 'wb') as f:
+        f.write(optimized.SerializeToString())
+    print('nodes: {} -> {}, keep_prob input {}'.format(
+        len(graph_def.node), len(optimized.node),
+        'kept' if any(node.name == KEEP_PROB_NODE for node in optimized.node) else 'removed'))
+    if args.onnx:
+        convert_to_onnx(args.output, args.onnx)
+    if args.no_compare:
+        return
+
+    from benchmark_backends import load_images
+    images = load_images(args.images)
+    results = [(args.input, evaluate(args.input, images, args.frames)),
+               (args.output, evaluate(args.output, images, args.frames))]
+    for path, result in results:
+        latencies = result['latencies']
+        print('{}: size={:.1f}MB, load={:.2f}s, mean={:.1f}ms, p50={:.1f}ms, p90={:.1f}ms'.format(
+            path, result['size'] / 1e6, result['load'], latencies.mean(),
+            np.percentile(latencies, 50), np.percentile(latencies, 90)))
+    same = sum(a == b for a, b in zip(results[0][1]['bboxes'], results[1][1]['bboxes']))
+    print('identical detections on {}/{} images'.format(same, len(images)))
+
+
+if __name__ == '__main__':
+    main()
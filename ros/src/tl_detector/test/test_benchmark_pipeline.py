@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Unit tests of ground truth labeling of benchmark_pipeline, without ROS
+"""
+import math
+import os
+import sys
+import unittest
+
+from styx_msgs.msg import TrafficLight
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, '..'))
+sys.path.insert(0, os.path.join(TEST_DIR, '..', '..', 'carla_core', 'src'))
+
+from benchmark_pipeline import light_ahead_label
+from carla_core.benchmark import Fields, make_pose, make_point
+
+
+def make_light(x, y, state):
+    """Stand-in for styx_msgs/TrafficLight"""
+    return Fields(pose=Fields(pose=Fields(position=make_point(x, y))), state=state)
+
+
+class TestLightAheadLabel(unittest.TestCase):
+
+    def setUp(self):
+        # car at origin heading +x, a light just passed behind it, two ahead
+        self.lights = [make_light(-5., 0., TrafficLight.GREEN),
+                       make_light(60., 2., TrafficLight.YELLOW),
+                       make_light(30., -2., TrafficLight.RED)]
+
+    def test_nearest_light_ahead(self):
+        self.assertEqual(light_ahead_label(make_pose(0., 0., 0.), self.lights, 100.), TrafficLight.RED)
+
+    def test_light_behind_is_ignored(self):
+        # heading -x the green light is the one ahead
+        self.assertEqual(light_ahead_label(make_pose(0., 0., math.pi), self.lights, 100.), TrafficLight.GREEN)
+        self.assertEqual(light_ahead_label(make_pose(40., 0., 0.), self.lights, 100.), TrafficLight.YELLOW)
+
+    def test_unknown_beyond_label_distance(self):
+        self.assertEqual(light_ahead_label(make_pose(0., 0., 0.), self.lights, 20.), TrafficLight.UNKNOWN)
+
+    def test_unknown_without_light_ahead(self):
+        self.assertEqual(light_ahead_label(make_pose(70., 0., 0.), self.lights, 100.), TrafficLight.UNKNOWN)
+        self.assertEqual(light_ahead_label(make_pose(0., 0., 0.), [], 100.), TrafficLight.UNKNOWN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Unit tests of DetectionScheduler, without ROS
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from detection_scheduler import DetectionScheduler
+
+
+class TestDetectionScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = DetectionScheduler(decision_zone=4., period_per_second=0.25, max_period=1.,
+                                            stopped_period=0.5)
+
+    def test_every_frame_inside_decision_zone(self):
+        # 30 m at 10 m/s: 3 s to the stop line
+        self.assertEqual(self.scheduler.period(30., 10., True), 0.)
+        self.assertEqual(self.scheduler.period(40., 10., True), 0.)
+
+    def test_period_grows_with_time_to_line(self):
+        self.assertAlmostEqual(self.scheduler.period(60., 10., True), 0.5)
+        self.assertAlmostEqual(self.scheduler.period(60., -10., True), 0.5)
+        self.assertAlmostEqual(self.scheduler.period(1000., 10., True), 1.)
+
+    def test_stopped(self):
+        self.assertEqual(self.scheduler.period(1000., 0.1, True), 0.5)
+        self.assertEqual(self.scheduler.period(1000., 0.1, False), 0.)
+
+    def test_should_run_respects_period(self):
+        # 0.5 s period far from the line
+        runs = [self.scheduler.should_run(step * 0.1, 60., 10., True) for step in range(12)]
+        self.assertEqual([step for step, run in enumerate(runs) if run], [0, 5, 10])
+
+    def test_should_run_every_frame_near_line(self):
+        self.assertTrue(all(self.scheduler.should_run(step * 0.1, 20., 10., True) for step in range(10)))
+
+    def test_reset(self):
+        self.assertTrue(self.scheduler.should_run(0., 1000., 10., True))
+        self.assertFalse(self.scheduler.should_run(0.1, 1000., 10., True))
+        self.scheduler.reset()
+        self.assertTrue(self.scheduler.should_run(0.2, 1000., 10., True))
+
+
+if __name__ == '__main__':
+    unittest.main()
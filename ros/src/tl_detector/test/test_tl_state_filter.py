@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Unit tests of TLStateFilter: how many frames it takes to confirm a state, without ROS
+"""
+import os
+import sys
+import unittest
+
+from styx_msgs.msg import TrafficLight
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tl_state_filter import TLStateFilter
+
+# camera frames processed at 10 Hz
+PERIOD = 0.1
+
+
+class FilterRun(object):
+    """Feeds frames with one classified box each to a filter with default parameters"""
+
+    def __init__(self):
+        self.filter = TLStateFilter()
+        self.now = 0.
+
+    def frame(self, state=None, confidence=1.):
+        observations = [] if state is None else [(state, confidence)]
+        result = self.filter.update(self.now, observations)
+        self.now += PERIOD
+        return result
+
+    def frames_to(self, expected, state, confidence=1., max_frames=50):
+        """Number of frames observing `state` until filter reports `expected`"""
+        for frames in range(1, max_frames + 1):
+            if self.frame(state, confidence)[0] == expected:
+                return frames
+        return None
+
+    def stable(self, state, frames=50, confidence=1.):
+        for _ in range(frames):
+            self.frame(state, confidence)
+        return self
+
+
+class TestTLStateFilter(unittest.TestCase):
+
+    def test_unknown_without_observations(self):
+        run = FilterRun()
+        for _ in range(10):
+            self.assertEqual(run.frame(), (TrafficLight.UNKNOWN, 0.))
+
+    def test_red_confirmed_on_first_frame(self):
+        for confidence in (1., 0.6, 0.3):
+            self.assertEqual(FilterRun().frames_to(TrafficLight.RED, TrafficLight.RED, confidence), 1)
+
+    def test_green_confirmed_on_first_confident_frame(self):
+        self.assertEqual(FilterRun().frames_to(TrafficLight.GREEN, TrafficLight.GREEN, 1.), 1)
+        self.assertEqual(FilterRun().frames_to(TrafficLight.GREEN, TrafficLight.GREEN, 0.6), 2)
+
+    def test_red_after_stable_green(self):
+        self.assertEqual(FilterRun().stable(TrafficLight.GREEN).frames_to(TrafficLight.RED, TrafficLight.RED, 1.), 2)
+        self.assertEqual(FilterRun().stable(TrafficLight.GREEN).frames_to(TrafficLight.RED, TrafficLight.RED, 0.6), 3)
+        self.assertEqual(FilterRun().stable(TrafficLight.GREEN).frames_to(TrafficLight.RED, TrafficLight.RED, 0.3), 6)
+
+    def test_red_after_stable_yellow(self):
+        self.assertEqual(FilterRun().stable(TrafficLight.YELLOW).frames_to(TrafficLight.RED, TrafficLight.RED, 1.), 2)
+
+    def test_single_false_red_ignored(self):
+        run = FilterRun().stable(TrafficLight.GREEN)
+        self.assertEqual(run.frame(TrafficLight.RED, 1.)[0], TrafficLight.GREEN)
+        self.assertEqual(run.frame(TrafficLight.GREEN, 1.)[0], TrafficLight.GREEN)
+
+    def test_leaving_red_needs_min_confidence(self):
+        run = FilterRun().stable(TrafficLight.RED)
+        self.assertEqual(run.frames_to(TrafficLight.GREEN, TrafficLight.GREEN, 1.), 3)
+        self.assertGreaterEqual(run.filter.confidence, run.filter.min_confidence)
+
+    def test_red_confidence_capped_by_min_confidence(self):
+        self.assertEqual(TLStateFilter(min_confidence=0.3, red_confidence=0.4).red_confidence, 0.3)
+
+    def test_reset(self):
+        run = FilterRun().stable(TrafficLight.RED)
+        run.filter.reset()
+        self.assertEqual(run.frame(), (TrafficLight.UNKNOWN, 0.))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,23 +10,35 @@ If next traffic light is out of range or in-range but not RED then -1 is publish
 
 Implementation uses separate thread to run detector/tensorflow code because it is resource
 intensive and interferes with message dispatch for ROS if run in the same thread.
+
+Heavy modules (tensorflow, scipy, cv2, cv_bridge) are imported and the model is loaded in background,
+so that the node subscribes and publishes right after start. Until the detector is warm every
+traffic light in range is treated as RED. Readiness is published (latched) to ~ready.
 """
 from threading import Lock, Thread, Event
 from timeit import default_timer as timer
 import yaml
 
 import rospy
-from std_msgs.msg import Int32
-from geometry_msgs.msg import PoseStamped
+from std_msgs.msg import Bool, Int32
+from geometry_msgs.msg import PoseStamped, TwistStamped
 from styx_msgs.msg import Lane, TrafficLight, TrafficLightArray
 from sensor_msgs.msg import Image
-from cv_bridge import CvBridge
 
 import numpy as np
-import cv2
 
-from light_classification.tl_classifier import TLClassifier
-from tl_detector_segmentation import TLDetectorSegmentation
+from detection_scheduler import DetectionScheduler
+from tl_state_filter import TLStateFilter
+from instrumentation.latency import LatencyStats
+from instrumentation.diagnostics import LatencyPublisher
+from node_composition import intra_process
+
+# Filtered state is considered stable, and detection may run less often, from this confidence
+STABLE_STATE_CONFIDENCE = 0.95
+# Max time to wait for detection result from worker process, seconds
+DETECTOR_PROCESS_TIMEOUT = 5.
+# Default max time for worker process to load the model, seconds
+DETECTOR_PROCESS_LOAD_TIMEOUT = 120.
 
 
 class TLDetector(object):
@@ -40,9 +52,21 @@ class TLDetector(object):
 
     Publishes to /traffic_waypoint index of next waypoint with RED traffic light.
     If no RED traffic light in the vicinity publish -1.
+    Create after rospy.init_node, then run spin.
     """
     def __init__(self):
-        rospy.init_node('tl_detector')
+        start_time = timer()
+
+        # Publish the index of the waypoint nearest to the upcoming red traffic light.
+        # Intra-process publisher and subscribers when composed with other nodes, see node_composition
+        self.traffic_waypoint_pub = intra_process.Publisher('/traffic_waypoint', Int32, queue_size=1)
+        # Set once detector is loaded and warmed up. Until then lights in range are assumed RED.
+        self.ready = Event()
+        self.ready_pub = rospy.Publisher('~ready', Bool, queue_size=1, latch=True)
+        self.ready_pub.publish(Bool(False))
+        # Latency of callbacks and detector thread stages, published on /diagnostics
+        self.latency = LatencyStats()
+        LatencyPublisher(self.latency, intra_process.component_name('tl_detector'))
 
         # Lock to synchronise access to image data between 2 threads
         self.lock = Lock()
@@ -59,19 +83,43 @@ class TLDetector(object):
         self.thread.start()
         # This main thread handles callbacks from ROS
 
-        # Machinery to deal with images/detection/segmentation
-        self.bridge = CvBridge()
-        self.detector = TLDetectorSegmentation()  # TLDetector that uses semantic segmentation
-        self.classifier = TLClassifier()
+        # Machinery to deal with images/detection/segmentation. Created in background by init_detector
+        self.bridge = None
+        self.ingest = None
+        self.ingest_encodings = ()
+        self.classifier = None
+        self.detector = None
+        self.detector_process = None
+        self.image_debug_pub = None
+        detector_args = {
+            # Optionally run segmentation only every N frames and track detected boxes in between
+            'keyframe_interval': rospy.get_param('~tracker_keyframe_interval', 1),
+            'min_confidence': rospy.get_param('~tracker_min_confidence', 0.7),
+            # Inference engine of segmentation model: tf, opencv or onnx
+            'backend': rospy.get_param('~inference_backend', 'tf'),
+            'model_file': rospy.get_param('~inference_model', None),
+            'threads': rospy.get_param('~inference_threads', 0),
+        }
+        init_thread = Thread(target=self.init_detector, args=(detector_args, start_time))
+        init_thread.daemon = True
+        init_thread.start()
 
         # Subscribe to receive car pose
         self.pose = None
-        rospy.Subscriber('/current_pose', PoseStamped, self.pose_cb, queue_size=1)
+        intra_process.Subscriber('/current_pose', PoseStamped, self.latency.timed('pose_cb', self.pose_cb), queue_size=1)
+
+        # Subscribe to receive car velocity, used to decide how often to run detection
+        self.velocity = 0.
+        intra_process.Subscriber('/current_velocity', TwistStamped,
+                                 self.latency.timed('velocity_cb', self.velocity_cb), queue_size=1)
 
         # Subscribe to receive base waypoints (essentially the planned route)
         # With Carla/this project it is published just once. So we cache it.
         self.base_waypoints_np = np.array([])
-        rospy.Subscriber('/base_waypoints', Lane, self.base_waypoints_cb, queue_size=1)
+        # Arc length along the route at each base waypoint
+        self.base_waypoints_s = np.array([])
+        intra_process.Subscriber('/base_waypoints', Lane,
+                                 self.latency.timed('base_waypoints_cb', self.base_waypoints_cb), queue_size=1)
 
         # Read/cache positions of traffic lights along the route.
         self.tl_config = yaml.safe_load(rospy.get_param("/traffic_light_config"))
@@ -83,19 +131,26 @@ class TLDetector(object):
         # Do we have traffic lights potentially in range for detection in the image?
         self.in_range = False
         self.last_in_range = False
-        # Detected traffic light state.
+        # Detected traffic light state and confidence in it.
         self.state = TrafficLight.UNKNOWN
-        self.state_count = 0
-        self.last_state = TrafficLight.UNKNOWN
+        self.state_confidence = 0.
+        # Filters classifications of boxes over time into stable state.
+        self.state_filter = TLStateFilter(switch_rate=rospy.get_param('~state_switch_rate', 0.2),
+                                          min_confidence=rospy.get_param('~state_min_confidence', 0.8),
+                                          red_confidence=rospy.get_param('~state_red_confidence', 0.4))
         # Last detected index of RED oncoming traffic light.
         self.last_tl_wp_idx = -1
         # Cached positions of stop lines in front of traffic lights.
         self.stop_lines_wp_idxs = []
+        # Decides how often to run detection depending on time to reach the stop line.
+        self.scheduler = DetectionScheduler(decision_zone=rospy.get_param('~detection_decision_zone', 4.),
+                                            max_period=rospy.get_param('~detection_max_period', 1.),
+                                            stopped_period=rospy.get_param('~detection_stopped_period', 0.5))
 
         # Camera image subscription.
         self.has_image = False
         self.camera_image = None
-        rospy.Subscriber('/image_color', Image, self.image_cb, queue_size=1)
+        intra_process.Subscriber('/image_color', Image, self.latency.timed('image_cb', self.image_cb), queue_size=1)
 
         # /vehicle/traffic_lights provides the location of the traffic light in 3D map
         # space in simulator. It gives ground truth data source for the traffic light
@@ -104,97 +159,181 @@ class TLDetector(object):
         self.lights = []
         self.lights_position = []
         # For development in simulator uncomment the next line and comment out the image_cb line above.
-        #rospy.Subscriber('/vehicle/traffic_lights', TrafficLightArray, self.traffic_cb, queue_size=1)
+        #rospy.Subscriber('/vehicle/traffic_lights', TrafficLightArray, self.latency.timed('traffic_cb', self.traffic_cb),
+        #                 queue_size=1)
 
-        # Publish the index of the waypoint nearest to the upcoming red traffic light.
-        self.traffic_waypoint_pub = rospy.Publisher('/traffic_waypoint', Int32, queue_size=1)
-        # Publish debug image with detected traffic lights and bounding boxes around them.
-        self.image_debug_pub = rospy.Publisher("/image_debug", Image, queue_size=1)
+        # Safe default until first detection: no RED light known
+        self.traffic_waypoint_pub.publish(Int32(self.last_tl_wp_idx))
+        rospy.logwarn("tl_detector: subscribed in {:.2f}s, detector loading in background".format(timer() - start_time))
 
+    def spin(self):
+        """Handles callbacks until shutdown, then waits for detector thread."""
         # This thread keeps taking messages from ROS until shutdown.
         rospy.spin()
         # Wait for 5 seconds for detector thread once this thread is stopped.
         self.thread.join(timeout=5)
 
 
+    def init_detector(self, detector_args, start_time):
+        """Loads and warms up detector, then marks the node ready. Runs in background thread.
+        Logs timeline of startup phases. Shuts the node down if detector cannot be loaded.
+
+        Args:
+            detector_args (dict): arguments of create_detector
+            start_time (float): time node started, by timer()
+        """
+        try:
+            timeline = self.load_detector(detector_args)
+        except Exception as e:
+            rospy.logfatal("tl_detector: failed to load detector: {}".format(e))
+            rospy.signal_shutdown("failed to load detector")
+            raise
+
+        self.ready.set()
+        self.ready_pub.publish(Bool(True))
+        rospy.logwarn("tl_detector: detector ready {:.2f}s after start: {}".format(
+            timer() - start_time, ', '.join('{} {:.2f}s'.format(phase, seconds) for phase, seconds in timeline)))
+
+
+    def load_detector(self, detector_args):
+        """Imports heavy modules, creates detector and classifier.
+
+        Returns:
+            list: (phase, seconds) timeline of initialization
+        """
+        start = timer()
+        from cv_bridge import CvBridge
+        from light_classification.tl_classifier import TLClassifier
+        from detector_process import DetectorProcess, create_detector
+        from debug_image_publisher import DebugImagePublisher
+        from image_ingest import ENCODINGS, ImageIngest
+        timeline = [('imports', timer() - start)]
+
+        self.bridge = CvBridge()
+        # Camera frames are viewed in place, bridge only converts other encodings
+        self.ingest = ImageIngest()
+        self.ingest_encodings = ENCODINGS
+        self.classifier = TLClassifier()
+        # Publish debug image with detected traffic lights and bounding boxes around them.
+        # Rendered in background only when someone subscribes.
+        self.image_debug_pub = DebugImagePublisher("/image_debug", self.bridge,
+                                                   max_rate=rospy.get_param('~debug_image_max_rate', 5.))
+        if rospy.get_param('~detector_process', False):
+            # Decode, detection and classification run in a worker process to keep GIL free for ROS callbacks
+            start = timer()
+            detector_process = DetectorProcess(rospy.get_param('~max_image_width', 2048),
+                                               rospy.get_param('~max_image_height', 1536),
+                                               **detector_args)
+            timeline.append(('process start', timer() - start))
+            # polls that worker is alive, init_detector shuts the node down if it failed
+            load_timeout = rospy.get_param('~detector_load_timeout', DETECTOR_PROCESS_LOAD_TIMEOUT)
+            process_timeline = detector_process.wait_ready(timeout=load_timeout)
+            if process_timeline is None:
+                detector_process.process.terminate()
+                raise RuntimeError("detector process not ready in {}s".format(load_timeout))
+            timeline += process_timeline
+            self.detector_process = detector_process
+        else:
+            # TLDetector that uses semantic segmentation
+            self.detector, detector_timeline = create_detector(**detector_args)
+            timeline += detector_timeline
+        return timeline
+
+
     def pose_cb(self, msg):
         """Callback to receive pose"""
         self.pose = msg
 
 
+    def velocity_cb(self, msg):
+        """Callback to receive velocity"""
+        self.velocity = msg.twist.linear.x
+
+
     def get_light_state(self):
-        """Detects traffic lights in self.camera_image.
-        Returns single result of their classification.
-        Publishes /image_debug with bounding boxes overlayed over detected TLs
+        """Detects traffic lights in self.camera_image and classifies each of them.
+        Publishes /image_debug with bounding boxes overlayed over detected TLs if anyone is subscribed
 
         Args:
         Returns:
-            int: ID of traffic light color (specified in styx_msgs/TrafficLight)
+            list: (bounding box, ID of traffic light color (specified in styx_msgs/TrafficLight), confidence)
+                for every detected traffic light
         """
         if not self.has_image:
-            return TrafficLight.UNKNOWN
+            return []
 
         start_time = timer()
 
-        cv_image = self.bridge.imgmsg_to_cv2(self.camera_image, "bgr8")
-
-        # detect bounding boxes of what looks like traffic lights
-        bboxes, tf_ms = self.detector.detect(cv_image)
-
-        # extract TL images and classify. create debug segmented image
-        classification = {TrafficLight.UNKNOWN: 0,
-                          TrafficLight.RED: 0,
-                          TrafficLight.YELLOW: 0,
-                          TrafficLight.GREEN: 0}
-        tl_img_debug = np.copy(cv_image)
-        rect_img = np.zeros_like(tl_img_debug)
-        for i, box in enumerate(bboxes):
-            x1 = box[0][0]
-            y1 = box[0][1]
-            x2 = box[1][0]
-            y2 = box[1][1]
-            tl_image = cv_image[y1:y2, x1:x2]
-
-            # Skip small images to avoid false positives
-            MIN_IMAGE_HEIGHT = 50
-            if tl_image.shape[0] < MIN_IMAGE_HEIGHT:
-                rospy.loginfo("tl_detector: TL image detected too small and likely a false positive. Discarding & continuing.")
-                continue
-   
-            # Classification
-            rospy.logdebug("tl_detector:About to call classifier")
-            tl_class = self.classifier.get_classification(tl_image)
-            classification[tl_class] += 1
-            # debug output
-            color = [255,255,255]
-            if tl_class == TrafficLight.RED:
-                color = [0, 0, 255]
-            elif tl_class == TrafficLight.YELLOW:
-                color = [0, 255, 255]
-            elif tl_class == TrafficLight.GREEN:
-                color = [0, 255, 0]
-            cv2.rectangle(rect_img, box[0], box[1], color, thickness=-1)
-        cv2.addWeighted(tl_img_debug, 1.0, rect_img, 0.5, 0, tl_img_debug)
-
-        # come to consensus about the state of traffic lights in the picture
-        result = TrafficLight.UNKNOWN
-        if classification[TrafficLight.RED] > 0:
-            result = TrafficLight.RED
-        elif classification[TrafficLight.YELLOW] > 0:
-            result = TrafficLight.YELLOW
-        elif classification[TrafficLight.GREEN] > 0:
-            result = TrafficLight.GREEN
-
-        # publish debug image message
-        resized = cv2.resize(tl_img_debug, (400,300,), interpolation=cv2.INTER_LINEAR)
-        image_message = self.bridge.cv2_to_imgmsg(resized, encoding="bgr8")
-        self.image_debug_pub.publish(image_message)
+        image_msg = self.camera_image
+        cv_image = None
+        if self.detector_process is not None:
+            result, detections, tf_ms = self.get_light_state_from_process(image_msg)
+        else:
+            cv_image = self.image_to_bgr(image_msg)
+
+            # detect bounding boxes of what looks like traffic lights
+            with self.latency.measure('detect'):
+                bboxes, tf_ms = self.detector.detect(cv_image)
+
+            # extract TL images, classify and come to consensus about the state of traffic lights in the picture
+            with self.latency.measure('classify'):
+                result, detections = self.classifier.classify_bboxes(cv_image, bboxes)
+
+        # hand over debug image to be rendered and published in background
+        if self.image_debug_pub.wants_frame():
+            if cv_image is None:
+                cv_image = self.image_to_bgr(image_msg)
+            # resized into the small buffer of the publisher, rendered in background
+            self.image_debug_pub.submit(cv_image, detections)
         time_ms = int((timer() - start_time) * 1000)
 
-        rospy.logwarn("tl_detector: detected {} TLs in img, {}/{} tf/tot ms, result={}".format(
-            len(bboxes), tf_ms, time_ms, result))
+        rospy.logdebug("tl_detector: detected {} TLs in img, {}/{} tf/tot ms, result={}".format(
+            len(detections), tf_ms, time_ms, result))
+
+        return detections
+
+
+    def image_to_bgr(self, image_msg):
+        """BGR image of sensor_msgs/Image. Valid until next call, see ImageIngest."""
+        if image_msg.encoding in self.ingest_encodings:
+            return self.ingest.from_msg(image_msg)
+        return self.bridge.imgmsg_to_cv2(image_msg, "bgr8")
 
-        return result
+
+    def get_light_state_from_process(self, image_msg):
+        """Passes image to worker process and waits for its detection result.
+
+        Returns:
+            (int, list, int): traffic light state, (bounding box, state, confidence) triples, tf time in ms
+        """
+        from detector_process import DetectorProcessError
+        try:
+            seq = self.detector_process.submit(image_msg)
+            if seq is None and not self.detector_process.ready:
+                rospy.logdebug("tl_detector: detector process is restarting")
+                return TrafficLight.UNKNOWN, [], 0
+            if seq is None:
+                rospy.logwarn("tl_detector: image {}x{} {} rejected by detector process".format(
+                    image_msg.width, image_msg.height, image_msg.encoding))
+                return TrafficLight.UNKNOWN, [], 0
+            with self.latency.measure('detector_process'):
+                result = self.detector_process.get_result(seq, timeout=DETECTOR_PROCESS_TIMEOUT)
+        except DetectorProcessError as e:
+            if self.detector_process.process.is_alive():
+                # only this frame failed
+                rospy.logerr("tl_detector: detection failed in detector process: {}".format(e))
+            else:
+                rospy.logerr("tl_detector: detector process died, restarting it: {}".format(e))
+                self.detector_process.restart()
+            return TrafficLight.UNKNOWN, [], 0
+        if result is None:
+            # worker hangs, and holds the slot of this frame
+            rospy.logerr("tl_detector: no result from detector process in {}s, restarting it".format(
+                DETECTOR_PROCESS_TIMEOUT))
+            self.detector_process.restart()
+            return TrafficLight.UNKNOWN, [], 0
+        state, detections, tf_ms, _ = result
+        return state, detections, tf_ms
 
 
     def calculate_closest_waypoint_idx(self, pose):
@@ -287,6 +426,8 @@ class TLDetector(object):
             y_coord = point.pose.pose.position.y
             waypoints_np = np.append(waypoints_np, complex(x_coord, y_coord))
 
+        # arc length first, detector thread starts using it once base_waypoints_np is set
+        self.base_waypoints_s = np.concatenate(([0.], np.cumsum(np.abs(np.diff(waypoints_np)))))
         self.base_waypoints_np = waypoints_np
 
         rospy.logwarn("tl_detector: updated {} base waypoints".format(len(self.base_waypoints_np)))
@@ -297,8 +438,6 @@ class TLDetector(object):
         Finds next closest traffic light in front, takes its ground truth state
         and publishes to /traffic_waypoint
         """
-        start = timer()
-
         self.lights = msg.lights
         self.lights_position = []
         for position in msg.lights:
@@ -322,8 +461,7 @@ class TLDetector(object):
                 tl_wp_idx = -1
 
         self.update_state_and_publish(state, tl_wp_idx)
-        rospy.logwarn("tl_detector: traffic_cb, tl_wp_idx={}, state={}, {}ms".format(tl_wp_idx, state,
-                                                                                     int(float(timer()-start)*1000.)))
+        rospy.logdebug("tl_detector: traffic_cb, tl_wp_idx={}, state={}".format(tl_wp_idx, state))
 
     def detector_thread(self):
         """Loop that runs in separate thread. Identifies RED lights in the camera image
@@ -336,23 +474,34 @@ class TLDetector(object):
             missed_images = self.missed_images
             self.missed_images = -1
             self.lock.release()
-            start = timer()
+            with self.latency.measure('next_tl_waypoint'):
+                tl_wp_idx = self.get_next_tl_waypoint_index(self.tl_config['stop_line_positions'])
 
-            tl_wp_idx = self.get_next_tl_waypoint_index(self.tl_config['stop_line_positions'])
-            wp_time = int(float(timer()-start)*1000.)
+            rospy.logdebug("tl_detector: detector_thread next_wp {}: missed imgs {}".format(tl_wp_idx, missed_images))
 
-            rospy.logwarn("tl_detector: detector_thread next_wp {}, {}ms: missed imgs {}".format(
-                tl_wp_idx, wp_time, missed_images))
+            if not self.ready.is_set():
+                # detector still loading, stop at any light in range
+                self.traffic_waypoint_pub.publish(Int32(tl_wp_idx))
+                continue
 
             if tl_wp_idx > -1:
+                distance = abs(self.base_waypoints_s[tl_wp_idx] - self.base_waypoints_s[self.last_car_wp_idx])
+                state_stable = self.state_confidence >= STABLE_STATE_CONFIDENCE
+                if not self.scheduler.should_run(timer(), distance, self.velocity, state_stable):
+                    # not due yet, keep publishing last detected state
+                    self.traffic_waypoint_pub.publish(Int32(self.last_tl_wp_idx))
+                    continue
                 # In range of traffic light, run image detection
-                start = timer()
-                state = self.get_light_state()
-                img_time = int(float(timer() - start) * 1000.)
-                self.update_state_and_publish(state, tl_wp_idx)
-                rospy.logwarn("tl_detector: detector_thread state={}, {}ms".format(state, img_time))
+                with self.latency.measure('light_state'):
+                    detections = self.get_light_state()
+                state, confidence = self.state_filter.update(timer(), [(tl_state, tl_confidence)
+                                                                       for _, tl_state, tl_confidence in detections])
+                self.update_state_and_publish(state, tl_wp_idx, confidence)
+                rospy.logdebug("tl_detector: detector_thread state={}, confidence={:.2f}".format(state, confidence))
             else:
-                self.update_state_and_publish(TrafficLight.RED, -1)
+                self.scheduler.reset()
+                self.state_filter.reset()
+                self.update_state_and_publish(TrafficLight.UNKNOWN, -1, 0.)
 
 
     def image_cb(self, msg):
@@ -369,31 +518,25 @@ class TLDetector(object):
         self.lock.release()
 
 
-    def update_state_and_publish(self, state, tl_wp_idx):
+    def update_state_and_publish(self, state, tl_wp_idx, confidence=1.):
         """
         Publish waypoint index (in /base_waypoints) of upcoming RED light to /traffic_waypoints.
 
-        Each predicted state has to occur `STATE_COUNT_THRESHOLD` number
-        of times till we start using it. Otherwise the previous stable state is used.
+        State is expected to be stable already: filtered by self.state_filter
+        for camera detections, or ground truth in simulator.
         """
-        if self.state != state:
-            self.state_count = 1
-            self.state = state
+        self.state = state
+        self.state_confidence = confidence
+        if self.state == TrafficLight.RED:
+            self.last_tl_wp_idx = tl_wp_idx
         else:
-            self.state_count += 1
-
-        STATE_COUNT_THRESHOLD = 1
-        if self.state_count >= STATE_COUNT_THRESHOLD:
-            self.last_state = self.state
-            if self.state == TrafficLight.RED:
-                self.last_tl_wp_idx = tl_wp_idx
-            else:
-                self.last_tl_wp_idx = -1
+            self.last_tl_wp_idx = -1
         self.traffic_waypoint_pub.publish(Int32(self.last_tl_wp_idx))
 
 
 if __name__ == '__main__':
     try:
-        TLDetector()
+        rospy.init_node('tl_detector')
+        TLDetector().spin()
     except rospy.ROSInterruptException:
         rospy.logerr('Could not start traffic node.')
@@ -0,0 +1,89 @@
+"""
+Temporal filter of traffic light state over classifications of detected boxes.
+
+Single classifications are noisy, one false RED would otherwise make the car brake.
+The filter keeps a belief (probability) over RED, YELLOW and GREEN and updates it
+like a hidden Markov model forward pass:
+
+- prediction: between updates the light may switch, with probability growing with elapsed time
+- correction: every classified box is an observation, more trusted the more confident it is
+
+Stable state changes when belief in the new state reaches `min_confidence`. Missing a RED light
+costs more than braking for nothing, so RED is taken already once belief in it reaches the lower
+`red_confidence`: above the uniform belief of an unknown light, below that of a single false RED
+observed while the light was stable GREEN or YELLOW.
+"""
+import math
+
+import numpy as np
+
+from styx_msgs.msg import TrafficLight
+
+# Hidden states of the filter, indexes into belief
+STATES = [TrafficLight.RED, TrafficLight.YELLOW, TrafficLight.GREEN]
+RED_INDEX = STATES.index(TrafficLight.RED)
+
+
+class TLStateFilter(object):
+    """Bayes filter of traffic light state. Reports stable state and its confidence."""
+
+    def __init__(self, switch_rate=0.2, max_accuracy=0.9, min_confidence=0.8, red_confidence=0.4):
+        """
+        :param switch_rate: expected state changes per second
+        :param max_accuracy: probability that box classified with confidence 1 has the true state
+        :param min_confidence: belief needed to change stable state
+        :param red_confidence: belief needed to change stable state to RED, at most min_confidence
+        """
+        self.switch_rate = switch_rate
+        self.max_accuracy = max_accuracy
+        self.min_confidence = min_confidence
+        self.red_confidence = min(red_confidence, min_confidence)
+        self.reset()
+
+    def reset(self):
+        """Forgets everything, e.g. when no traffic light is in range"""
+        self.belief = np.full(len(STATES), 1. / len(STATES))
+        self.last_update = None
+        self.state = TrafficLight.UNKNOWN
+        self.confidence = 0.
+
+    def update(self, now, observations):
+        """Updates belief with classifications of one frame.
+
+        Args:
+            now (float): time of the frame, seconds
+            observations (list): (state, confidence) of every classified box, may be empty
+
+        Returns:
+            (int, float): stable state (TrafficLight.UNKNOWN until first one is established), belief in it
+        """
+        if self.last_update is not None:
+            self._predict(now - self.last_update)
+        self.last_update = now
+
+        for state, confidence in observations:
+            if state in STATES:
+                self._correct(STATES.index(state), confidence)
+
+        best = int(np.argmax(self.belief))
+        if self.belief[RED_INDEX] >= self.red_confidence:
+            self.state = TrafficLight.RED
+        elif self.belief[best] >= self.min_confidence:
+            self.state = STATES[best]
+        self.confidence = float(self.belief[STATES.index(self.state)]) if self.state in STATES else 0.
+        return self.state, self.confidence
+
+    def _predict(self, dt):
+        """Light stays in its state with probability exp(-switch_rate * dt), else switches to any other"""
+        stay = math.exp(-self.switch_rate * max(dt, 0.))
+        switch = (1. - stay) / (len(STATES) - 1)
+        self.belief = self.belief * stay + (self.belief.sum() - self.belief) * switch
+
+    def _correct(self, observed, confidence):
+        """Bayes update with box classified as STATES[observed] with classifier confidence in [0, 1]"""
+        chance = 1. / len(STATES)
+        accuracy = chance + (self.max_accuracy - chance) * min(max(confidence, 0.), 1.)
+        likelihood = np.full(len(STATES), (1. - accuracy) / (len(STATES) - 1))
+        likelihood[observed] = accuracy
+        self.belief = self.belief * likelihood
+        self.belief /= self.belief.sum()
@@ -0,0 +1,83 @@
+""" Traffic Lights tracker. Propagates bounding boxes found by the detector between keyframes using template matching """
+
+import cv2
+
+
+class TLTracker(object):
+    """
+    Runs the full detector only on keyframes and tracks its boxes in the frames in between.
+
+    Each box found on a keyframe is kept as a grayscale template. On following frames the template
+    is searched for with normalized cross-correlation in a window around the last box position.
+    Detector is run again every `keyframe_interval` frames, when any box match falls below
+    `min_confidence` or when there is nothing to track.
+
+    Has the same detect() interface as the detector it wraps.
+    """
+
+    def __init__(self, detector, keyframe_interval=5, min_confidence=0.7, search_margin=0.5):
+        """
+        :param detector: detector with detect(img) -> (bboxes, tf_ms) method
+        :param keyframe_interval: run detector at least every that many frames
+        :param min_confidence: min normalized correlation to accept tracked box
+        :param search_margin: search window around box, as fraction of box size on each side
+        """
+        self.detector = detector
+        self.keyframe_interval = keyframe_interval
+        self.min_confidence = min_confidence
+        self.search_margin = search_margin
+        self.templates = []
+        self.bboxes = []
+        self.frames_since_keyframe = 0
+
+
+    def detect(self, img):
+        """
+        Detects images of traffic lights in the input image, by tracking when possible.
+
+        :param img: image in OpenCV BGR uint8 format
+        :return: (list of bounding boxes ((x1,y1), (x2,y2)), time of tf run in ms. 0 if tracked)
+        """
+        self.frames_since_keyframe += 1
+        if self.bboxes and self.frames_since_keyframe < self.keyframe_interval:
+            bboxes = self._track(img)
+            if bboxes is not None:
+                self.bboxes = bboxes
+                return bboxes, 0
+        return self._keyframe(img)
+
+
+    def _keyframe(self, img):
+        bboxes, tf_ms = self.detector.detect(img)
+        self.bboxes = bboxes
+        self.templates = [cv2.cvtColor(img[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+                          for (x1, y1), (x2, y2) in bboxes]
+        self.frames_since_keyframe = 0
+        return bboxes, tf_ms
+
+
+    def _track(self, img):
+        """
+        Finds every template near its last position.
+        :return: list of new bounding boxes or None if any of them could not be tracked reliably
+        """
+        h, w = img.shape[0], img.shape[1]
+        bboxes = []
+        for ((x1, y1), (x2, y2)), template in zip(self.bboxes, self.templates):
+            th, tw = template.shape[0], template.shape[1]
+            if th == 0 or tw == 0:
+                return None
+            margin_x = int(tw * self.search_margin) + 1
+            margin_y = int(th * self.search_margin) + 1
+            sx1, sy1 = max(0, x1 - margin_x), max(0, y1 - margin_y)
+            sx2, sy2 = min(w, x1 + tw + margin_x), min(h, y1 + th + margin_y)
+            if sx2 - sx1 < tw or sy2 - sy1 < th:
+                return None
+            window = cv2.cvtColor(img[sy1:sy2, sx1:sx2], cv2.COLOR_BGR2GRAY)
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, confidence, _, location = cv2.minMaxLoc(scores)
+            if confidence < self.min_confidence:
+                return None
+            nx1, ny1 = sx1 + location[0], sy1 + location[1]
+            bboxes.append(((nx1, ny1), (nx1 + tw, ny1 + th)))
+        return bboxes
@@ -0,0 +1,56 @@
+"""
+Publisher of DBW commands that skips redundant messages.
+"""
+
+import rospy
+
+
+class CommandPublisher(object):
+    """
+    Publishes single value command (throttle, brake or steering) on a topic.
+
+    A new value is published only if it differs from the last published one by more than
+    `deadband`, or if nothing was published for `heartbeat_period` seconds, so the DBW
+    watchdog always sees fresh commands.
+
+    The same message instance is reused for every publish. rospy serializes
+    the message inside publish(), so it is safe to modify it afterwards.
+    """
+
+    def __init__(self, topic, msg, field, deadband, heartbeat_period):
+        """
+        Args:
+            topic (str): topic to publish to
+            msg: message instance with all fields but `field` already set
+            field (str): name of message field that carries the command value
+            deadband (float): changes of value up to this are not published
+            heartbeat_period (float): max time between published messages, seconds
+        """
+        self.publisher = rospy.Publisher(topic, type(msg), queue_size=1)
+        self.msg = msg
+        self.field = field
+        self.deadband = deadband
+        self.heartbeat_period = heartbeat_period
+        self.last_value = None
+        self.last_time = None
+
+    def publish(self, value, now):
+        """Publishes value unless it is within deadband of last one and heartbeat is not due.
+
+        Returns:
+            bool: True if message was published
+        """
+        if self.last_value is not None and abs(value - self.last_value) <= self.deadband and \
+                now - self.last_time < self.heartbeat_period:
+            return False
+
+        setattr(self.msg, self.field, value)
+        self.publisher.publish(self.msg)
+        self.last_value = value
+        self.last_time = now
+        return True
+
+    def reset(self):
+        """Forgets last published value, so next value is published unconditionally."""
+        self.last_value = None
+        self.last_time = None
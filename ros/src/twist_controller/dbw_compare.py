@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""
+Comparison of commands produced by dbw_node with commands recorded from a reference implementation.
+
+Actual (recorded in the bag) and proposed (produced by our node) commands arrive at different
+rates and with different delays. Instead of pairing each actual command with the last proposed
+one, proposed values are aligned to actual timestamps in merge-asof style (last known value or
+linear interpolation) and error statistics are computed on the aligned arrays.
+Everything is vectorized with NumPy so millions of samples take a fraction of a second.
+
+Usage, on the output directory of dbw_test.py:
+
+    ./dbw_compare.py [directory] [--method previous|linear] [--max-lag 1.0]
+
+Traces are read with package instrumentation: source ros/devel/setup.sh first.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+
+import numpy as np
+
+from instrumentation.trace_recorder import read_trace
+
+CHANNELS = ['steers', 'throttles', 'brakes']
+
+# Resolution of uniform time grid used for lag estimation, seconds. dbw_node runs at 50Hz.
+LAG_RESOLUTION = 0.02
+
+
+def align(actual_t, proposed_t, proposed_v, method='previous', tolerance=None):
+    """Aligns proposed stream to actual timestamps.
+
+    Args:
+        actual_t (np.array): sorted timestamps of actual stream
+        proposed_t (np.array): sorted timestamps of proposed stream
+        proposed_v (np.array): values of proposed stream
+        method (str): 'previous' takes last proposed value at or before actual timestamp,
+            'linear' interpolates between neighbouring proposed values
+        tolerance (float): if set, actual samples further than this from preceding proposed sample are invalid
+
+    Returns:
+        (np.array, np.array): proposed values at actual timestamps, boolean mask of valid samples
+    """
+    actual_t = np.asarray(actual_t, dtype=np.float64)
+    proposed_t = np.asarray(proposed_t, dtype=np.float64)
+    proposed_v = np.asarray(proposed_v, dtype=np.float64)
+    if len(proposed_t) == 0:
+        return np.zeros_like(actual_t), np.zeros(actual_t.shape, dtype=bool)
+
+    # index of last proposed sample at or before each actual sample
+    idx = np.searchsorted(proposed_t, actual_t, side='right') - 1
+    valid = idx >= 0
+    idx = np.maximum(idx, 0)
+    if tolerance is not None:
+        valid &= (actual_t - proposed_t[idx]) <= tolerance
+
+    if method == 'previous':
+        aligned = proposed_v[idx]
+    elif method == 'linear':
+        aligned = np.interp(actual_t, proposed_t, proposed_v)
+    else:
+        raise ValueError('unknown alignment method: {}'.format(method))
+
+    return aligned, valid
+
+
+def estimate_lag(actual_t, actual_v, proposed_t, proposed_v, max_lag=1.0, resolution=LAG_RESOLUTION):
+    """Estimates delay of proposed stream relative to actual one using cross-correlation.
+
+    Both streams are resampled to a uniform grid over their common time span.
+
+    Returns:
+        float: lag in seconds. Positive if proposed commands come later than actual ones.
+            0 if the streams do not overlap or are constant.
+    """
+    if len(actual_t) == 0 or len(proposed_t) == 0:
+        return 0.
+    start = max(actual_t[0], proposed_t[0])
+    end = min(actual_t[-1], proposed_t[-1])
+    if end - start <= 2 * resolution:
+        return 0.
+    grid = np.arange(start, end, resolution)
+    actual = np.interp(grid, actual_t, actual_v)
+    proposed = np.interp(grid, proposed_t, proposed_v)
+    actual -= actual.mean()
+    proposed -= proposed.mean()
+    if not actual.any() or not proposed.any():
+        return 0.
+
+    # at least half of the samples overlap at every searched lag
+    max_steps = min(int(max_lag / resolution), len(grid) // 2)
+    # padding by max_steps is enough to keep circular correlation from wrapping within searched lags
+    nfft = 1 << int(np.ceil(np.log2(len(grid) + max_steps)))
+    corr = np.fft.irfft(np.conj(np.fft.rfft(actual, nfft)) * np.fft.rfft(proposed, nfft), nfft)
+    # lags -max_steps..max_steps. negative lags are at the end of the circular correlation
+    corr = np.concatenate((corr[nfft - max_steps:], corr[:max_steps + 1]))
+    # mean over overlapping samples: sums over fewer samples at longer lags would pull the peak to 0
+    corr /= len(grid) - np.abs(np.arange(-max_steps, max_steps + 1))
+    return (np.argmax(corr) - max_steps) * resolution
+
+
+def compare(actual_t, actual_v, proposed_t, proposed_v, method='previous', tolerance=None, max_lag=1.0):
+    """Aligns proposed to actual stream and computes error statistics.
+
+    Returns:
+        dict: samples, rmse, mean and max absolute error, lag estimate in seconds
+    """
+    actual_v = np.asarray(actual_v, dtype=np.float64)
+    aligned, valid = align(actual_t, proposed_t, proposed_v, method=method, tolerance=tolerance)
+    error = aligned[valid] - actual_v[valid]
+    stats = {'samples': int(valid.sum()),
+             'dropped': int(len(valid) - valid.sum()),
+             'rmse': 0.,
+             'mean_error': 0.,
+             'max_abs_error': 0.,
+             'lag': 0.}
+    if len(error) > 0:
+        stats['rmse'] = float(np.sqrt(np.mean(error ** 2)))
+        stats['mean_error'] = float(np.mean(error))
+        stats['max_abs_error'] = float(np.max(np.abs(error)))
+        stats['lag'] = float(estimate_lag(np.asarray(actual_t, dtype=np.float64), actual_v,
+                                          np.asarray(proposed_t, dtype=np.float64),
+                                          np.asarray(proposed_v, dtype=np.float64), max_lag=max_lag))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare dbw_node commands with reference commands')
+    parser.add_argument('directory', nargs='?', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='directory with trace files written by dbw_test.py')
+    parser.add_argument('--method', choices=['previous', 'linear'], default='previous')
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help='max age of proposed command in seconds, older ones are not compared')
+    parser.add_argument('--max-lag', type=float, default=1.0, help='max lag to search for, seconds')
+    args = parser.parse_args()
+
+    for channel in CHANNELS:
+        actual = read_trace(os.path.join(args.directory, channel + '_actual.bin'))
+        proposed = read_trace(os.path.join(args.directory, channel + '_proposed.bin'))
+        stats = compare(actual['time'], actual['value'], proposed['time'], proposed['value'],
+                        method=args.method, tolerance=args.tolerance, max_lag=args.max_lag)
+        print('{}: samples={samples}, dropped={dropped}, rmse={rmse:f}, mean={mean_error:f}, '
+              'max={max_abs_error:f}, lag={lag:.3f}s'.format(channel, **stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -32,12 +32,20 @@ from geometry_msgs.msg import TwistStamped, PoseStamped
 from styx_msgs.msg import Lane
 
 from twist_controller import Controller
-from dbw_cte import compute_cte
+from carla_core.cte import compute_cte
+from command_publisher import CommandPublisher
+from instrumentation.trace_recorder import TraceRecorder, CONTROL_COLUMNS
+from instrumentation.latency import LatencyStats
+from instrumentation.diagnostics import LatencyPublisher
+from instrumentation.tracing import TracePublisher, TWIST_CMD, DBW_CMD
+from node_composition import intra_process
 
 # Dont publish if last published values don't differ above corresponding EPSILON
 STEERING_EPSILON = 0.1
 THROTTLE_EPSILON = 0.05
 BRAKE_EPSILON = 0.05
+# ... unless nothing was published for this long, seconds. DBW disables itself if commands stop coming.
+HEARTBEAT_PERIOD = 0.08
 
 SUBSCRIBER_QUEUE_SIZE = 1
 
@@ -48,10 +56,9 @@ class DBWNode(object):
     Using information about current state of the car ( velocity and position )
     plus the desired trajectory ( velocity and path to follow ) it publishes
     the control values for the car: throttle, brake, steer.
+    Create after rospy.init_node, then run loop.
     """
     def __init__(self):
-        rospy.init_node('dbw_node')
-
         vehicle_mass = rospy.get_param('~vehicle_mass', 1736.35)
         fuel_capacity = rospy.get_param('~fuel_capacity', 13.5)
         brake_deadband = rospy.get_param('~brake_deadband', .1)
@@ -70,22 +77,40 @@ class DBWNode(object):
 
         self.lock = threading.Lock()
 
+        # Latency of callbacks and of the control loop, published on /diagnostics
+        self.latency = LatencyStats()
+        LatencyPublisher(self.latency, intra_process.component_name('dbw_node'))
+        # End-to-end latency tracing, keyed by stamps of /twist_cmd
+        self.tracer = TracePublisher()
+
         self.dbw_enabled = False
-        self.last_throttle = 2*THROTTLE_EPSILON
-        self.last_brake = 2*BRAKE_EPSILON
-        self.last_steer = 2*STEERING_EPSILON
         self.activated = False
         self.current_velocity = None
         self.proposed_velocities = None
         self.current_pose = None
         self.waypoints = None
 
-        self.steer_pub = rospy.Publisher('/vehicle/steering_cmd',
-                                         SteeringCmd, queue_size=1)
-        self.throttle_pub = rospy.Publisher('/vehicle/throttle_cmd',
-                                            ThrottleCmd, queue_size=1)
-        self.brake_pub = rospy.Publisher('/vehicle/brake_cmd',
-                                         BrakeCmd, queue_size=1)
+        heartbeat_period = rospy.get_param('~command_heartbeat_period', HEARTBEAT_PERIOD)
+
+        # Optional trace of every control cycle, to tune PIDs offline with twiddle_offline.py
+        self.control_trace = None
+        control_trace_path = rospy.get_param('~control_trace', None)
+        if control_trace_path:
+            self.control_trace = TraceRecorder(control_trace_path, CONTROL_COLUMNS)
+            rospy.on_shutdown(self.control_trace.close)
+
+        self.steer_pub = CommandPublisher('/vehicle/steering_cmd',
+                                          SteeringCmd(enable=True),
+                                          'steering_wheel_angle_cmd',
+                                          STEERING_EPSILON, heartbeat_period)
+        self.throttle_pub = CommandPublisher('/vehicle/throttle_cmd',
+                                             ThrottleCmd(enable=True, pedal_cmd_type=ThrottleCmd.CMD_PERCENT),
+                                             'pedal_cmd',
+                                             THROTTLE_EPSILON, heartbeat_period)
+        self.brake_pub = CommandPublisher('/vehicle/brake_cmd',
+                                          BrakeCmd(enable=True, pedal_cmd_type=BrakeCmd.CMD_TORQUE),
+                                          'pedal_cmd',
+                                          BRAKE_EPSILON, heartbeat_period)
 
         self.controller = Controller(vehicle_mass,
                                      fuel_capacity,
@@ -100,32 +125,31 @@ class DBWNode(object):
                                      max_throttle_pct,
                                      max_braking_pct)
 
-        rospy.Subscriber('/current_velocity',
-                         TwistStamped,
-                         self.current_velocity_cb,
-                         queue_size=SUBSCRIBER_QUEUE_SIZE)
-
-        rospy.Subscriber('/twist_cmd',
-                         TwistStamped,
-                         self.twist_cmd_cb,
-                         queue_size=SUBSCRIBER_QUEUE_SIZE)
+        # Intra-process subscribers when composed with other nodes, see node_composition
+        intra_process.Subscriber('/current_velocity',
+                                 TwistStamped,
+                                 self.latency.timed('current_velocity_cb', self.current_velocity_cb),
+                                 queue_size=SUBSCRIBER_QUEUE_SIZE)
 
-        rospy.Subscriber('/vehicle/dbw_enabled',
-                         Bool,
-                         self.dbw_enabled_cb,
-                         queue_size=SUBSCRIBER_QUEUE_SIZE)
+        intra_process.Subscriber('/twist_cmd',
+                                 TwistStamped,
+                                 self.latency.timed('twist_cmd_cb', self.twist_cmd_cb),
+                                 queue_size=SUBSCRIBER_QUEUE_SIZE)
 
-        rospy.Subscriber('/current_pose',
-                         PoseStamped,
-                         self.current_pose_cb,
-                         queue_size=SUBSCRIBER_QUEUE_SIZE)
+        intra_process.Subscriber('/vehicle/dbw_enabled',
+                                 Bool,
+                                 self.latency.timed('dbw_enabled_cb', self.dbw_enabled_cb),
+                                 queue_size=SUBSCRIBER_QUEUE_SIZE)
 
-        rospy.Subscriber('/final_waypoints',
-                         Lane,
-                         self.waypoints_cb,
-                         queue_size=SUBSCRIBER_QUEUE_SIZE)
+        intra_process.Subscriber('/current_pose',
+                                 PoseStamped,
+                                 self.latency.timed('current_pose_cb', self.current_pose_cb),
+                                 queue_size=SUBSCRIBER_QUEUE_SIZE)
 
-        self.loop()
+        intra_process.Subscriber('/final_waypoints',
+                                 Lane,
+                                 self.latency.timed('waypoints_cb', self.waypoints_cb),
+                                 queue_size=SUBSCRIBER_QUEUE_SIZE)
 
     def loop(self):
         """Loop that computes throttle, brake and steer to publish."""
@@ -133,58 +157,69 @@ class DBWNode(object):
         while not rospy.is_shutdown():
 
             if self._valid_state():
-                with self.lock:
-                    is_activated = self.activated
-                    cte = compute_cte(self.waypoints, self.current_pose)
-
-                throttle, brake, steer = self.controller.control(is_activated,
-                                                                 cte,
-                                                                 self.proposed_velocities.twist.linear.x,
-                                                                 self.proposed_velocities.twist.angular.z,
-                                                                 self.current_velocity.twist.linear.x)
-                if is_activated:
-                    rospy.logdebug("%f, %f, %f", throttle, brake, steer)
-                    self.publish(throttle, brake, steer)
+                with self.latency.measure('control_loop'):
+                    self.control_step()
 
             rate.sleep()
 
-    def publish(self, throttle, brake, steer):
-        """Publish throttle, brake and steer."""
-        if abs(throttle - self.last_throttle) < THROTTLE_EPSILON:
-            tcmd = ThrottleCmd()
-            tcmd.enable = True
-            tcmd.pedal_cmd_type = ThrottleCmd.CMD_PERCENT
-            tcmd.pedal_cmd = throttle
-            self.throttle_pub.publish(tcmd)
+    def control_step(self):
+        """Computes throttle, brake and steer once and publishes them if activated."""
+        with self.lock:
+            is_activated = self.activated
+            with self.latency.measure('compute_cte'):
+                cte = compute_cte(self.waypoints, self.current_pose)
+
+        with self.latency.measure('controller'):
+            throttle, brake, steer = self.controller.control(is_activated,
+                                                             cte,
+                                                             self.proposed_velocities.twist.linear.x,
+                                                             self.proposed_velocities.twist.angular.z,
+                                                             self.current_velocity.twist.linear.x)
+        if self.control_trace is not None and is_activated:
+            self.control_trace.append(rospy.get_time(),
+                                      self.current_velocity.twist.linear.x,
+                                      self.proposed_velocities.twist.linear.x,
+                                      self.proposed_velocities.twist.angular.z,
+                                      cte)
+        if is_activated:
+            rospy.logdebug("%f, %f, %f", throttle, brake, steer)
+            if self.publish(throttle, brake, steer):
+                # /twist_cmd keeps the stamp of the pose pure_pursuit computed it from
+                self.tracer.trace(DBW_CMD, self.proposed_velocities.header.stamp)
         else:
-            rospy.logdebug("not publish throttle: %f", abs(throttle - self.last_throttle))
+            # publish right away once re-activated
+            self.throttle_pub.reset()
+            self.brake_pub.reset()
+            self.steer_pub.reset()
 
-        if abs(steer - self.last_steer) < STEERING_EPSILON:
-            scmd = SteeringCmd()
-            scmd.enable = True
-            scmd.steering_wheel_angle_cmd = steer
-            self.steer_pub.publish(scmd)
+    def publish(self, throttle, brake, steer):
+        """Publish throttle, brake and steer if they changed or heartbeat is due.
+
+        Returns:
+            bool: True if any of them was published
+        """
+        now = rospy.get_time()
+        published = False
+        if self.throttle_pub.publish(throttle, now):
+            published = True
         else:
-            rospy.logdebug("not publish steer: %f", abs(steer - self.last_steer))
-            
-        if abs(brake - self.last_brake) < BRAKE_EPSILON:
-            bcmd = BrakeCmd()
-            bcmd.enable = True
-            bcmd.pedal_cmd_type = BrakeCmd.CMD_TORQUE
-            bcmd.pedal_cmd = brake
-            self.brake_pub.publish(bcmd)
+            rospy.logdebug("not publish throttle: %f", abs(throttle - self.throttle_pub.last_value))
+        if self.steer_pub.publish(steer, now):
+            published = True
         else:
-            rospy.logdebug("not publish brake: %f", abs(brake - self.last_brake))
-
-        self.last_throttle = throttle
-        self.last_brake = brake
-        self.last_steer = steer
+            rospy.logdebug("not publish steer: %f", abs(steer - self.steer_pub.last_value))
+        if self.brake_pub.publish(brake, now):
+            published = True
+        else:
+            rospy.logdebug("not publish brake: %f", abs(brake - self.brake_pub.last_value))
+        return published
 
     def current_velocity_cb(self, msg):
         self.current_velocity = msg
 
     def twist_cmd_cb(self, msg):
         self.proposed_velocities = msg
+        self.tracer.trace(TWIST_CMD, msg.header.stamp)
 
     def dbw_enabled_cb(self, msg):
         if (self.activated != msg.data):
@@ -211,4 +246,5 @@ class DBWNode(object):
 
 
 if __name__ == '__main__':
-    DBWNode()
+    rospy.init_node('dbw_node')
+    DBWNode().loop()
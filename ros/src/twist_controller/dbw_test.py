@@ -1,19 +1,25 @@
 #!/usr/bin/env python
 
 import os
-import csv
 
 import rospy
 from std_msgs.msg import Bool
 from dbw_mkz_msgs.msg import ThrottleCmd, SteeringCmd, BrakeCmd, SteeringReport
 
+from instrumentation.trace_recorder import TraceRecorder
+from dbw_compare import CHANNELS
+
+# How often recorded data is written to disk
+FLUSH_PERIOD = 1.0
 
 '''
 You can use this file to test your DBW code against a bag recorded with a reference implementation.
 The bag can be found at https://drive.google.com/open?id=0B2_h37bMVw3iT0ZEdlF4N01QbHc.
 
-This file will produce 3 csv files which you can process to figure out how your DBW node is
-performing on various commands.
+This file will produce 6 binary trace files, one per command topic (steers_actual.bin,
+steers_proposed.bin, throttles_actual.bin, ...) with columns time and value. Data is written
+to disk periodically while the test runs. Run `dbw_compare.py` on them to figure out how your
+DBW node is performing on various commands.
 
 `/actual/*` are commands from the recorded bag while `/vehicle/*` are the output of your node.
 
@@ -24,6 +30,16 @@ class DBWTestNode(object):
     def __init__(self):
         rospy.init_node('dbw_test_node')
 
+        self.dbw_enabled = False
+
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        fieldnames = ['time', 'value']
+        self.recorders = {}
+        for channel in CHANNELS:
+            for source in ['actual', 'proposed']:
+                path = os.path.join(base_path, '{}_{}.bin'.format(channel, source))
+                self.recorders[channel, source] = TraceRecorder(path, fieldnames)
+
         rospy.Subscriber('/vehicle/steering_cmd', SteeringCmd, self.steer_cb)
         rospy.Subscriber('/vehicle/throttle_cmd', ThrottleCmd, self.throttle_cb)
         rospy.Subscriber('/vehicle/brake_cmd', BrakeCmd, self.brake_cb)
@@ -34,71 +50,46 @@ class DBWTestNode(object):
 
         rospy.Subscriber('/vehicle/dbw_enabled', Bool, self.dbw_enabled_cb)
 
-        self.steer = self.throttle = self.brake = None
-
-        self.steer_data = []
-        self.throttle_data = []
-        self.brake_data = []
-
-        self.dbw_enabled = False
-
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        self.steerfile = os.path.join(base_path, 'steers.csv')
-        self.throttlefile = os.path.join(base_path, 'throttles.csv')
-        self.brakefile = os.path.join(base_path, 'brakes.csv')
-
         self.loop()
 
     def loop(self):
         rate = rospy.Rate(10) # 10Hz
+        last_flush = rospy.get_time()
         while not rospy.is_shutdown():
+            if rospy.get_time() - last_flush >= FLUSH_PERIOD:
+                for recorder in self.recorders.values():
+                    recorder.flush()
+                last_flush = rospy.get_time()
             rate.sleep()
-        fieldnames = ['actual', 'proposed']
-
-        with open(self.steerfile, 'w') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(self.steer_data)
 
-        with open(self.throttlefile, 'w') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(self.throttle_data)
+        for recorder in self.recorders.values():
+            recorder.close()
 
-        with open(self.brakefile, 'w') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(self.brake_data)
+    def record(self, channel, source, value):
+        """Records timestamped command while dbw is enabled."""
+        if self.dbw_enabled:
+            self.recorders[channel, source].append(rospy.get_time(), value)
 
     def dbw_enabled_cb(self, msg):
         self.dbw_enabled = msg.data
 
     def steer_cb(self, msg):
-        self.steer = msg.steering_wheel_angle_cmd
+        self.record('steers', 'proposed', msg.steering_wheel_angle_cmd)
 
     def throttle_cb(self, msg):
-        self.throttle = msg.pedal_cmd
+        self.record('throttles', 'proposed', msg.pedal_cmd)
 
     def brake_cb(self, msg):
-        self.brake = msg.pedal_cmd
+        self.record('brakes', 'proposed', msg.pedal_cmd)
 
     def actual_steer_cb(self, msg):
-        if self.dbw_enabled and self.steer is not None:
-            self.steer_data.append({'actual': msg.steering_wheel_angle_cmd,
-                                    'proposed': self.steer})
-            self.steer = None
+        self.record('steers', 'actual', msg.steering_wheel_angle_cmd)
 
     def actual_throttle_cb(self, msg):
-        if self.dbw_enabled and self.throttle is not None:
-            self.throttle_data.append({'actual': msg.pedal_cmd,
-                                       'proposed': self.throttle})
-            self.throttle = None
+        self.record('throttles', 'actual', msg.pedal_cmd)
 
     def actual_brake_cb(self, msg):
-        if self.dbw_enabled and self.brake is not None:
-            self.brake_data.append({'actual': msg.pedal_cmd,
-                                    'proposed': self.brake})
-            self.brake = None
+        self.record('brakes', 'actual', msg.pedal_cmd)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Unit tests of CommandPublisher, without a running ROS master
+"""
+import os
+import sys
+import unittest
+
+from std_msgs.msg import Float64
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from command_publisher import CommandPublisher
+
+
+class RecordingPublisher(object):
+    """Stands in for rospy.Publisher, keeps the command value of every published message"""
+
+    def __init__(self):
+        self.values = []
+
+    def publish(self, msg):
+        self.values.append(msg.data)
+
+
+def make_publisher(deadband=0.01, heartbeat_period=0.5):
+    publisher = CommandPublisher('/test_cmd', Float64(), 'data', deadband, heartbeat_period)
+    publisher.publisher = RecordingPublisher()
+    return publisher
+
+
+class TestCommandPublisher(unittest.TestCase):
+
+    def test_first_value_published(self):
+        publisher = make_publisher()
+        self.assertTrue(publisher.publish(0., 0.))
+        self.assertEqual(publisher.publisher.values, [0.])
+
+    def test_value_within_deadband_skipped(self):
+        publisher = make_publisher(deadband=0.01)
+        publisher.publish(0.2, 0.)
+        self.assertFalse(publisher.publish(0.205, 0.02))
+        self.assertFalse(publisher.publish(0.21, 0.04))
+        self.assertEqual(publisher.publisher.values, [0.2])
+
+    def test_change_over_deadband_published(self):
+        publisher = make_publisher(deadband=0.01)
+        publisher.publish(0.2, 0.)
+        self.assertTrue(publisher.publish(0.22, 0.02))
+        # deadband is relative to the last published value, not the last given one
+        self.assertFalse(publisher.publish(0.225, 0.04))
+        self.assertTrue(publisher.publish(0.235, 0.06))
+        self.assertEqual(publisher.publisher.values, [0.2, 0.22, 0.235])
+
+    def test_heartbeat_republishes_unchanged_value(self):
+        publisher = make_publisher(heartbeat_period=0.5)
+        published = [publisher.publish(1., step * 0.02) for step in range(51)]
+        # at 0, then at the first step 0.5 s after it, then 0.5 s after that
+        self.assertEqual([step for step, sent in enumerate(published) if sent], [0, 25, 50])
+        self.assertEqual(publisher.publisher.values, [1.] * 3)
+
+    def test_reset_publishes_next_value(self):
+        publisher = make_publisher()
+        publisher.publish(1., 0.)
+        publisher.reset()
+        self.assertTrue(publisher.publish(1., 0.02))
+        self.assertEqual(publisher.publisher.values, [1., 1.])
+
+    def test_message_reused(self):
+        msg = Float64()
+        publisher = CommandPublisher('/test_cmd', msg, 'data', 0.01, 0.5)
+        publisher.publisher = RecordingPublisher()
+        publisher.publish(3., 0.)
+        self.assertIs(publisher.msg, msg)
+        self.assertEqual(msg.data, 3.)
+
+
+if __name__ == '__main__':
+    unittest.main()
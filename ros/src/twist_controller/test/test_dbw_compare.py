@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Unit tests of dbw_compare: alignment, lag estimation and error statistics, without ROS
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, '..'))
+sys.path.insert(0, os.path.join(TEST_DIR, '..', '..', 'instrumentation', 'src'))
+
+from dbw_compare import align, compare, estimate_lag
+
+# commands of dbw_node at 50Hz
+PERIOD = 0.02
+
+
+def command(t):
+    """Smooth command signal without a period in the searched lags"""
+    return np.sin(2. * t) + 0.3 * np.sin(5.3 * t)
+
+
+class TestAlign(unittest.TestCase):
+
+    def test_previous_value(self):
+        aligned, valid = align([0.5, 1., 1.5, 3.], [1., 2.], [10., 20.])
+        np.testing.assert_array_equal(valid, [False, True, True, True])
+        np.testing.assert_array_equal(aligned[valid], [10., 10., 20.])
+
+    def test_linear(self):
+        aligned, valid = align([1., 1.5, 2.], [1., 2.], [10., 20.], method='linear')
+        np.testing.assert_allclose(aligned, [10., 15., 20.])
+        self.assertTrue(valid.all())
+
+    def test_duplicate_timestamps_take_last(self):
+        aligned, valid = align([0., 1., 2.], [1., 1., 2.], [5., 6., 7.])
+        np.testing.assert_array_equal(valid, [False, True, True])
+        np.testing.assert_array_equal(aligned[valid], [6., 7.])
+
+    def test_tolerance(self):
+        aligned, valid = align([1., 1.05, 1.5], [1.], [10.], tolerance=0.1)
+        np.testing.assert_array_equal(valid, [True, True, False])
+
+    def test_empty(self):
+        aligned, valid = align([1., 2.], [], [])
+        self.assertFalse(valid.any())
+        aligned, valid = align([], [1.], [10.])
+        self.assertEqual(len(aligned), 0)
+
+    def test_unknown_method(self):
+        self.assertRaises(ValueError, align, [1.], [1.], [1.], method='nearest')
+
+
+class TestEstimateLag(unittest.TestCase):
+
+    def test_shifted_signal(self):
+        t = np.arange(0., 10., PERIOD)
+        for lag in (0., 0.1, -0.06, 0.5, -0.9):
+            # proposed commands `lag` seconds after actual ones with the same values
+            self.assertAlmostEqual(estimate_lag(t, command(t), t + lag, command(t)), lag)
+
+    def test_different_rates(self):
+        random = np.random.RandomState(0)
+        actual_t = np.sort(random.uniform(0., 20., 700))
+        proposed_t = np.arange(0., 20., 0.033)
+        lag = estimate_lag(actual_t, command(actual_t), proposed_t, command(proposed_t - 0.24))
+        self.assertAlmostEqual(lag, 0.24)
+
+    def test_shorter_than_window(self):
+        # 1 s of commands, lags up to 3 s: search is limited to half of the common time span
+        t = np.arange(0., 1., PERIOD)
+        for lag in (0.1, -0.1):
+            self.assertAlmostEqual(estimate_lag(t, command(4. * t), t + lag, command(4. * t), max_lag=3.), lag)
+        self.assertEqual(estimate_lag(t[:2], command(t[:2]), t[:2], command(t[:2])), 0.)
+
+    def test_no_overlap_or_no_samples(self):
+        t = np.arange(0., 10., PERIOD)
+        self.assertEqual(estimate_lag(t, command(t), t + 20., command(t)), 0.)
+        self.assertEqual(estimate_lag(t, command(t), [], []), 0.)
+        self.assertEqual(estimate_lag(t, np.ones_like(t), t, command(t)), 0.)
+
+
+class TestCompare(unittest.TestCase):
+
+    def test_same_stream(self):
+        t = np.arange(0., 10., PERIOD)
+        stats = compare(t, command(t), t, command(t))
+        self.assertEqual(stats['samples'], len(t))
+        self.assertEqual(stats['dropped'], 0)
+        self.assertEqual(stats['rmse'], 0.)
+        self.assertEqual(stats['lag'], 0.)
+
+    def test_offset_and_lag(self):
+        t = np.arange(0., 10., PERIOD)
+        stats = compare(t, command(t), t + 0.1, command(t) + 0.5, method='linear')
+        # first 5 actual samples are before the first proposed one
+        self.assertEqual(stats['dropped'], 5)
+        self.assertAlmostEqual(stats['lag'], 0.1)
+        self.assertGreater(stats['mean_error'], 0.)
+
+    def test_empty_and_not_overlapping(self):
+        t = np.arange(0., 10., PERIOD)
+        for proposed_t in ([], t + 20.):
+            stats = compare(t, command(t), proposed_t, command(np.asarray(proposed_t)))
+            self.assertEqual(stats['samples'], 0)
+            self.assertEqual(stats['dropped'], len(t))
+            self.assertEqual(stats['rmse'], 0.)
+        stats = compare([], [], t, command(t))
+        self.assertEqual((stats['samples'], stats['dropped']), (0, 0))
+
+    def test_stale_proposed_dropped_by_tolerance(self):
+        t = np.arange(0., 10., PERIOD)
+        stats = compare(t, command(t), t - 20., command(t), tolerance=0.1)
+        self.assertEqual(stats['samples'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
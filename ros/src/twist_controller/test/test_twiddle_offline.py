@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Unit tests of twiddle_offline, without ROS
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, '..'))
+sys.path.insert(0, os.path.join(TEST_DIR, '..', '..', 'carla_core', 'src'))
+sys.path.insert(0, os.path.join(TEST_DIR, '..', '..', 'instrumentation', 'src'))
+
+import twiddle_offline
+from instrumentation.trace_recorder import TraceRecorder, CONTROL_COLUMNS
+
+# values of dbw_sim.launch, throttle and brake not limited
+SIM_VEHICLE = dict(twiddle_offline.VEHICLE, vehicle_mass=1080., fuel_capacity=0., wheel_radius=0.335,
+                   max_throttle_percentage=1., max_braking_percentage=-1., decel_limit=-5.)
+
+
+def make_trace(targets, period=0.02, current_velocity=0., angular_velocity=0., cte=0.):
+    """Control cycle trace with target velocities `targets`"""
+    return {'time': [i * period for i in range(len(targets))],
+            'current_velocity': [current_velocity] * len(targets),
+            'linear_velocity': list(targets),
+            'angular_velocity': [angular_velocity] * len(targets),
+            'cte': [cte] * len(targets)}
+
+
+class SerialPool(object):
+    """Pool evaluating tasks in this process"""
+
+    def map(self, function, tasks):
+        return [function(task) for task in tasks]
+
+
+class TestTwiddleOffline(unittest.TestCase):
+
+    def test_load_trace_of_recorder(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'control.bin')
+            recorder = TraceRecorder(path, CONTROL_COLUMNS)
+            recorder.append(0.02, 1., 2., 0.1, -0.5)
+            recorder.append(0.04, 1.5, 2., 0.1, -0.4)
+            recorder.close()
+            trace = twiddle_offline.load_trace(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(sorted(trace), sorted(CONTROL_COLUMNS))
+        self.assertEqual(trace['time'], [0.02, 0.04])
+        self.assertEqual(trace['cte'], [-0.5, -0.4])
+
+    def test_accel_gains_track_target_velocity(self):
+        trace = make_trace([10.] * 3000)
+        tuned = twiddle_offline.simulate_accel(twiddle_offline.ACCEL_GAINS, trace, SIM_VEHICLE, 10)
+        standing = twiddle_offline.simulate_accel([0., 0., 0.], trace, SIM_VEHICLE, 10)
+        self.assertAlmostEqual(standing, 100.)
+        self.assertLess(tuned, 0.1 * standing)
+
+    def test_accel_brakes_through_controller_path(self):
+        # start faster than target: brake torque of ThrottleBrake has to slow the car down
+        trace = make_trace([5.] * 1000, current_velocity=15.)
+        error = twiddle_offline.simulate_accel(twiddle_offline.ACCEL_GAINS, trace, SIM_VEHICLE, 500)
+        self.assertLess(error, 1.)
+
+    def test_steer_keeps_zero_cte_on_straight_path(self):
+        trace = make_trace([10.] * 500, current_velocity=10.)
+        self.assertEqual(twiddle_offline.simulate_steer(twiddle_offline.STEER_GAINS, trace, SIM_VEHICLE, 10), 0.)
+
+    def test_twiddle_improves_bad_gains(self):
+        twiddle_offline._init_worker(make_trace([10.] * 1500), SIM_VEHICLE)
+        twiddle = twiddle_offline.ParallelTwiddle('accel', SerialPool(), [0.1, 0., 0.], tolerance=0.01,
+                                                  max_rounds=20, warmup=10)
+        initial_error = twiddle_offline.simulate_accel([0.1, 0., 0.], twiddle_offline._TRACE, SIM_VEHICLE, 10)
+        twiddle.run()
+        self.assertLess(twiddle.best_error, initial_error)
+
+
+if __name__ == '__main__':
+    unittest.main()
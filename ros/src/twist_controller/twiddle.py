@@ -6,7 +6,7 @@ This file contains all supporting code to implement Twiddle
 
 import rospy
 
-from pid import PID
+from carla_core.pid import PID
 
 
 
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+"""
+Offline twiddle optimizer for the steering and throttle/brake PIDs of `Controller`.
+
+`PIDWithTwiddle` tunes the live controller one parameter at a time while the car drives.
+This tool runs the same twiddle search offline against traces recorded from a real run,
+using a simple vehicle model instead of the simulator. Every twiddle round evaluates
+all +dp/-dp candidates at once in a process pool, so it is headless and uses all CPU cores.
+
+Input is a control cycle trace recorded by dbw_node, see instrumentation.trace_recorder.CONTROL_COLUMNS:
+
+    rosrun twist_controller dbw_node.py _control_trace:=/tmp/log/control.bin
+
+`current_velocity` comes from /current_velocity, `linear_velocity` and `angular_velocity`
+from /twist_cmd and `cte` is the cross track error as computed by `carla_core.cte.compute_cte`.
+The throttle/brake PID drives the model through the throttle filter and brake torque of `Controller`.
+
+Usage:
+
+    ./twiddle_offline.py /tmp/log/control.bin [--pid steer|accel|both] [--processes N] [--output gains.yaml]
+
+PID, YawController and ThrottleBrake come from package carla_core, traces are read with package
+instrumentation: source ros/devel/setup.sh first.
+"""
+from __future__ import print_function
+
+import argparse
+import math
+import multiprocessing
+from timeit import default_timer as timer
+
+import yaml
+
+from carla_core.pid import PID
+from carla_core.throttle_brake import ThrottleBrake
+from carla_core.yaw_controller import YawController
+
+from instrumentation.trace_recorder import read_trace
+
+# these mirror the values used by twist_controller.Controller
+PRED_STEERING_FACTOR = 0.2
+CORR_STEERING_FACTOR = 0.3
+STEER_GAINS = [0.607900, 0.000172, 1.640951]
+ACCEL_GAINS = [1.806471, 0.00635, 0.715603]
+
+# initial twiddle step for each of kp, ki, kd. Same as in PIDWithTwiddle.
+INITIAL_DP = [0.1, 0.0001, 0.1]
+
+# values of dbw.launch
+VEHICLE = {
+    'vehicle_mass': 1736.35,
+    'fuel_capacity': 13.5,
+    'wheel_radius': 0.2413,
+    'max_throttle_percentage': 0.1,
+    'max_braking_percentage': -0.1,
+    'wheel_base': 2.8498,
+    'steer_ratio': 14.8,
+    'max_lat_accel': 3.,
+    'max_steer_angle': 8.,
+    'decel_limit': -5.,
+    'accel_limit': 1.,
+}
+
+# error that is large enough to consider simulation diverged
+DIVERGED_ERROR = 1e3
+
+# Longitudinal model of the car, as in styx/headless_sim.py: acceleration at full throttle, m/s^2,
+# and drag per m/s of velocity, 1/s
+MAX_ACCELERATION = 4.
+DRAG = 0.05
+# kg/gallon, as in twist_controller.Controller
+GAS_DENSITY = 2.858
+
+# worker process globals, set once by _init_worker to avoid pickling the trace for every task
+_TRACE = None
+_VEHICLE = None
+
+
+def load_trace(path):
+    """Loads control cycle trace recorded by dbw_node with ~control_trace.
+
+    Returns:
+        dict: column name -> list of floats
+    """
+    return dict((column, values.tolist()) for column, values in read_trace(path).items())
+
+
+def simulate_accel(gains, trace, vehicle, warmup):
+    """Replays /twist_cmd target velocity with throttle/brake PID driving the longitudinal model of the car.
+
+    PID output goes through `ThrottleBrake` like in `Controller`: throttle percentage accelerates the car,
+    brake torque decelerates it through wheel radius and mass.
+
+    Returns:
+        float: mean squared velocity error after `warmup` samples
+    """
+    pid = PID(kp=gains[0], ki=gains[1], kd=gains[2],
+              mn=vehicle['decel_limit'], mx=vehicle['accel_limit'])
+    throttle_brake = ThrottleBrake(vehicle['max_throttle_percentage'], vehicle['max_braking_percentage'])
+    brake_factor = (vehicle['vehicle_mass'] + vehicle['fuel_capacity'] * GAS_DENSITY) * vehicle['wheel_radius']
+    times = trace['time']
+    targets = trace['linear_velocity']
+    velocity = trace['current_velocity'][0]
+    error_sum = 0.
+    count = 0
+    for i in range(1, len(times)):
+        sample_time = times[i] - times[i-1]
+        if sample_time <= 0.:
+            continue
+        error = targets[i] - velocity
+        accel = pid.step(error=error, sample_time=sample_time)
+        throttle, brake = throttle_brake.control(accel, targets[i], velocity)
+        acceleration = throttle * MAX_ACCELERATION - DRAG * velocity - brake / brake_factor
+        velocity = max(0., velocity + acceleration * sample_time)
+        if i >= warmup:
+            error_sum += error ** 2
+            count += 1
+    return error_sum / count if count > 0 else 0.
+
+
+def simulate_steer(gains, trace, vehicle, warmup):
+    """Replays recorded velocities and path curvature with steering PID driving a kinematic bicycle model.
+
+    Lateral error is seeded by recorded CTE. Path curvature comes from /twist_cmd.
+    Steering is computed the same way `Controller` does: predictive plus corrective part.
+
+    Returns:
+        float: mean squared cross track error after `warmup` samples
+    """
+    max_steer_angle = vehicle['max_steer_angle']
+    pid = PID(kp=gains[0], ki=gains[1], kd=gains[2], mn=-max_steer_angle, mx=max_steer_angle)
+    yaw_controller = YawController(wheel_base=vehicle['wheel_base'],
+                                   steer_ratio=vehicle['steer_ratio'],
+                                   min_speed=2.0,
+                                   max_lat_accel=vehicle['max_lat_accel'],
+                                   max_steer_angle=max_steer_angle)
+    times = trace['time']
+    velocities = trace['current_velocity']
+    linear = trace['linear_velocity']
+    angular = trace['angular_velocity']
+    cte = trace['cte'][0]
+    heading_error = 0.
+    error_sum = 0.
+    count = 0
+    for i in range(1, len(times)):
+        sample_time = times[i] - times[i-1]
+        if sample_time <= 0.:
+            continue
+        predictive_steer = yaw_controller.get_steering(linear_velocity=linear[i],
+                                                       angular_velocity=angular[i],
+                                                       current_velocity=velocities[i])
+        corrective_steer = pid.step(error=cte, sample_time=sample_time)
+        steer = CORR_STEERING_FACTOR * corrective_steer + PRED_STEERING_FACTOR * predictive_steer
+        wheel_angle = steer / vehicle['steer_ratio']
+
+        path_curvature = angular[i] / linear[i] if abs(linear[i]) > 0. else 0.
+        heading_error += velocities[i] * (math.tan(wheel_angle) / vehicle['wheel_base'] - path_curvature) * sample_time
+        cte -= velocities[i] * math.sin(heading_error) * sample_time
+
+        if abs(cte) > DIVERGED_ERROR:
+            return float('inf')
+        if i >= warmup:
+            error_sum += cte ** 2
+            count += 1
+    return error_sum / count if count > 0 else 0.
+
+
+SIMULATORS = {
+    'steer': simulate_steer,
+    'accel': simulate_accel,
+}
+
+
+def _init_worker(trace, vehicle):
+    """Pool initializer. Keeps trace in worker memory for all subsequent evaluations."""
+    global _TRACE, _VEHICLE
+    _TRACE = trace
+    _VEHICLE = vehicle
+
+
+def _evaluate(task):
+    """Pool task: (pid name, gains, warmup) -> error"""
+    name, gains, warmup = task
+    return SIMULATORS[name](gains, _TRACE, _VEHICLE, warmup)
+
+
+class ParallelTwiddle(object):
+    """
+    Twiddle search over kp, ki and kd of one PID, evaluated in a process pool.
+
+    Uses the same step sizes and 1.1/0.9 step adaptation as `PIDWithTwiddle`,
+    but instead of trying one parameter at a time each round evaluates +dp and -dp
+    for all parameters in parallel and moves to the best improving candidate.
+    """
+
+    def __init__(self, name, pool, gains, tolerance, max_rounds, warmup):
+        self.name = name
+        self.pool = pool
+        self.p = list(gains)
+        self.dp = list(INITIAL_DP)
+        self.tolerance = tolerance
+        self.max_rounds = max_rounds
+        self.warmup = warmup
+        self.best_error = None
+        self.rounds = 0
+
+    def evaluate(self, candidates):
+        """Evaluates list of [kp, ki, kd] candidates in parallel."""
+        return self.pool.map(_evaluate, [(self.name, gains, self.warmup) for gains in candidates])
+
+    def run(self):
+        """Runs twiddle until tolerance or max rounds is reached.
+
+        Returns:
+            list: best [kp, ki, kd]
+        """
+        self.best_error = self.evaluate([self.p])[0]
+        print('[{}] initial error: {:f}, kp={:f}, ki={:f}, kd={:f}'.format(
+            self.name, self.best_error, self.p[0], self.p[1], self.p[2]))
+
+        while sum(self.dp) >= self.tolerance and self.rounds < self.max_rounds:
+            self.rounds += 1
+            candidates = []
+            for i in range(len(self.p)):
+                for sign in (1., -1.):
+                    gains = list(self.p)
+                    gains[i] += sign * self.dp[i]
+                    candidates.append(gains)
+            errors = self.evaluate(candidates)
+
+            for i in range(len(self.p)):
+                if min(errors[2*i], errors[2*i+1]) < self.best_error:
+                    self.dp[i] *= 1.1
+                else:
+                    self.dp[i] *= 0.9
+
+            best = min(range(len(errors)), key=errors.__getitem__)
+            if errors[best] < self.best_error:
+                self.best_error = errors[best]
+                self.p = candidates[best]
+                print('[{}] round {}: new best error: {:f}, kp={:f}, ki={:f}, kd={:f}'.format(
+                    self.name, self.rounds, self.best_error, self.p[0], self.p[1], self.p[2]))
+
+        print('[{}] done after {} rounds, sum(dp)={:f}, best error: {:f}'.format(
+            self.name, self.rounds, sum(self.dp), self.best_error))
+        return self.p
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline twiddle of Controller PIDs against a recorded trace')
+    parser.add_argument('trace', help='control cycle trace recorded by dbw_node with ~control_trace')
+    parser.add_argument('--pid', choices=['steer', 'accel', 'both'], default='both', help='PID to tune')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='worker processes')
+    parser.add_argument('--tolerance', type=float, default=0.001, help='stop when sum(dp) is below this')
+    parser.add_argument('--max-rounds', type=int, default=200, help='maximum number of twiddle rounds')
+    parser.add_argument('--warmup', type=int, default=10, help='samples to skip before error is accumulated')
+    parser.add_argument('--output', help='write best gains to this YAML file')
+    for key, value in sorted(VEHICLE.items()):
+        parser.add_argument('--' + key.replace('_', '-'), type=float, default=value)
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace)
+    vehicle = dict((key, getattr(args, key)) for key in VEHICLE)
+    print('loaded {} samples from {}'.format(len(trace['time']), args.trace))
+
+    initial_gains = {'steer': STEER_GAINS, 'accel': ACCEL_GAINS}
+    names = ['steer', 'accel'] if args.pid == 'both' else [args.pid]
+
+    result = {}
+    pool = multiprocessing.Pool(processes=args.processes, initializer=_init_worker, initargs=(trace, vehicle))
+    try:
+        for name in names:
+            start = timer()
+            twiddle = ParallelTwiddle(name, pool, initial_gains[name], args.tolerance, args.max_rounds, args.warmup)
+            kp, ki, kd = twiddle.run()
+            result[name] = {'kp': kp, 'ki': ki, 'kd': kd, 'error': twiddle.best_error}
+            print('[{}] kp={:f}, ki={:f}, kd={:f} in {:.1f}s'.format(name, kp, ki, kd, timer() - start))
+    finally:
+        pool.close()
+        pool.join()
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            yaml.safe_dump(result, outfile, default_flow_style=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,9 @@ Definition of all classes used to compute values issued to control vehicle.
 
 import rospy
 
-from yaw_controller import YawController
+from carla_core.yaw_controller import YawController
 from twiddle import PIDWithTwiddle
-from dbw_mkz_msgs.msg import BrakeCmd
-from lpf_2stages import quick_lpf as lpf
+from carla_core.throttle_brake import ThrottleBrake
 
 GAS_DENSITY = 2.858
 ONE_MPH = 0.44704
@@ -44,8 +43,7 @@ class Controller(object):
         self.max_braking_pct = max_braking_pct
 
         self.prev_time = rospy.get_time()
-        self.avg_filter = lpf(nT1=2, nT2=15)
-        self.avg_filter_brake = lpf(nT1=7, nT2=15)
+        self.throttle_brake = ThrottleBrake(max_throttle_pct, max_braking_pct)
 
         # twiddle algorithm is disabled so iterations and tolerance are here to show
         # what values to use when you want to activate twiddle.
@@ -101,21 +99,10 @@ class Controller(object):
             vel_delta = linear_velocity - current_velocity
             res_accel = self.accel_pid.step(error=vel_delta, sample_time=sample_time)
 
-            res_accel = self.avg_filter.filter(res_accel)
+            throttle, brake = self.throttle_brake.control(res_accel, linear_velocity, current_velocity)
 
-            rospy.logdebug('desired vel = %f, current vel = %f, accel = %f',
-                           linear_velocity, current_velocity, res_accel)
-
-            if res_accel < 0.0 or linear_velocity < current_velocity:
-                self.avg_filter.clear()
-                if -res_accel < self.brake_deadband:
-                    res_accel = 0.0
-
-                throttle, brake = 0, self.avg_filter_brake.filter(BrakeCmd.TORQUE_MAX)*abs(self.max_braking_pct)
-            else:
-                if (res_accel > self.max_throttle_pct):
-                    res_accel = self.max_throttle_pct
-                throttle, brake = res_accel, 0
+            rospy.logdebug('desired vel = %f, current vel = %f, accel = %f, throttle = %f, brake = %f',
+                           linear_velocity, current_velocity, res_accel, throttle, brake)
 
         else:
             self.steer_pid.reset()
@@ -322,7 +322,8 @@ geometry_msgs::TwistStamped PurePursuit::outputTwist(geometry_msgs::Twist t) con
 
   geometry_msgs::TwistStamped twist;
   twist.twist = t;
-  twist.header.stamp = ros::Time::now();
+  // keep stamp of the pose the command is computed from, it traces latency from simulator telemetry
+  twist.header.stamp = current_pose_.header.stamp.isZero() ? ros::Time::now() : current_pose_.header.stamp;
 
   double v = t.linear.x;
   double omega = t.angular.z;
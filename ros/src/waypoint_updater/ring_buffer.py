@@ -0,0 +1,54 @@
+"""
+Fixed size history of timestamped telemetry, backed by a NumPy array.
+
+Every sample is written twice, at slot i and at slot i + size, so the latest samples are
+always a contiguous range of the array and can be returned as an ordered view without copying.
+
+Safe for one writer (rospy callback) and one reader (Qt thread) without locks: the writer fills
+both slots before publishing the new count, and the reader never gets the `headroom` oldest slots,
+which are the next ones to be overwritten.
+"""
+import numpy as np
+
+
+class RingBuffer(object):
+    """History of the last `capacity` samples of several columns, e.g. ['time', 'value']"""
+
+    def __init__(self, capacity, columns, dtype=np.float64, headroom=None):
+        """
+        :param capacity: max number of samples returned by view()
+        :param columns: names of columns
+        :param dtype: type of all columns
+        :param headroom: slots kept free for the writer while the reader uses its view, capacity/8 by default
+        """
+        self.capacity = capacity
+        self.columns = list(columns)
+        self.headroom = max(1, capacity // 8) if headroom is None else headroom
+        self._size = capacity + self.headroom
+        self._data = np.zeros((len(self.columns), 2 * self._size), dtype=dtype)
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def append(self, *values):
+        """Adds sample, one value per column"""
+        i = self._count % self._size
+        self._data[:, i] = values
+        self._data[:, i + self._size] = values
+        self._count += 1
+
+    def view(self, n=None):
+        """Ordered view of the last n samples (all by default), oldest first.
+
+        Returns:
+            np.array: (columns, n) view, row per column. Valid until `headroom` more samples are appended
+        """
+        count = self._count
+        n = min(count, self.capacity) if n is None else min(n, count, self.capacity)
+        end = (count - 1) % self._size + 1 + self._size if count > 0 else 0
+        return self._data[:, end - n:end]
+
+    def column(self, name, n=None):
+        """Ordered view of the last n values of column `name`"""
+        return self.view(n)[self.columns.index(name)]
@@ -8,11 +8,11 @@ import sys
 import math
 import threading
 from timeit import default_timer as timer
-from collections import deque
 
 from PyQt5 import QtGui, QtWidgets
 from PyQt5.QtGui import QPen
 from PyQt5.QtCore import Qt, QPointF, QRectF, QTimer
+from PyQt5.QtGui import QPolygonF
 
 import rospy
 from std_msgs.msg import Int32, Bool
@@ -30,7 +30,19 @@ import matplotlib
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 
-DEQUEU_MAX_LEN = 50
+from ring_buffer import RingBuffer
+
+# Samples of telemetry history kept for plots, a minute at 50Hz
+TELEMETRY_HISTORY_LEN = 50 * 60
+
+# Repaint period of the window, ms (~30 fps)
+REPAINT_INTERVAL_MS = 33
+# Matplotlib plots are redrawn at most this often, seconds
+PLOT_PERIOD = 0.1
+# When data reaches the end of time axis it is extended by this many seconds, full figure redraws are that rare
+PLOT_TIME_MARGIN = 2.
+# Relative margin added around data when y axis has to grow
+PLOT_Y_MARGIN = 0.25
 
 matplotlib.use('Qt5Agg')
 
@@ -49,45 +61,44 @@ class Visualization(QtWidgets.QWidget):
         self.start_time = timer()
 
         self.final_waypoints = None
+        # window positions of final waypoints, drawn in one drawPoints call
+        self.final_waypoints_polygon = None
         rospy.Subscriber('/final_waypoints', Lane, self.final_waypoints_cb, queue_size=1)
 
         self.base_waypoints = None
         self.max_x, self.max_y, self.min_x, self.min_y = (0.1, 0.1, 0.0, 0.0)
+        # static track is rendered once into a pixmap layer, again only when waypoints arrive or window resizes
+        self.track_polygon = None
+        self.track_layer = None
         rospy.Subscriber('/base_waypoints', Lane, self.base_waypoints_cb, queue_size=1)
 
         self.steering_cmd = 0
-        self.steering_cmd_deq = deque([], maxlen=DEQUEU_MAX_LEN)
-        self.steering_cmd_deq_t = deque([], maxlen=DEQUEU_MAX_LEN)
+        self.steering_cmd_hist = RingBuffer(TELEMETRY_HISTORY_LEN, ['time', 'value'])
         rospy.Subscriber('/vehicle/steering_cmd', SteeringCmd, self.steering_cmd_cb, queue_size=1)
         self.steering_rep = None
-        self.steering_rep_speed_deq = deque([], maxlen=DEQUEU_MAX_LEN*5)
-        self.steering_rep_angle_deq = deque([], maxlen=DEQUEU_MAX_LEN*5)
-        self.steering_rep_deq_t = deque([], maxlen=DEQUEU_MAX_LEN*5)
+        self.steering_rep_hist = RingBuffer(TELEMETRY_HISTORY_LEN, ['time', 'speed', 'angle'])
         rospy.Subscriber('/vehicle/steering_report', SteeringReport, self.steering_rep_cb, queue_size=1)
 
         self.throttle_cmd_type = None
         self.throttle_enable = None
         self.throttle_cmd = None
-        self.throttle_cmd_deq = deque([], maxlen=DEQUEU_MAX_LEN)
-        self.throttle_cmd_deq_t = deque([], maxlen=DEQUEU_MAX_LEN)
+        self.throttle_cmd_hist = RingBuffer(TELEMETRY_HISTORY_LEN, ['time', 'value'])
         rospy.Subscriber('/vehicle/throttle_cmd', ThrottleCmd, self.throttle_cmd_cb, queue_size=1)
         self.throttle_rep = None
-        self.throttle_rep_deq = deque([], maxlen=DEQUEU_MAX_LEN*5)
-        self.throttle_rep_deq_t = deque([], maxlen=DEQUEU_MAX_LEN*5)
+        self.throttle_rep_hist = RingBuffer(TELEMETRY_HISTORY_LEN, ['time', 'value'])
         rospy.Subscriber('/vehicle/throttle_report', Float, self.throttle_rep_cb, queue_size=1)
 
         self.brake_cmd_type = None
         self.brake_enable = None
         self.brake_cmd = None
-        self.brake_cmd_deq = deque([], maxlen=DEQUEU_MAX_LEN)
-        self.brake_cmd_deq_t = deque([], maxlen=DEQUEU_MAX_LEN)
+        self.brake_cmd_hist = RingBuffer(TELEMETRY_HISTORY_LEN, ['time', 'value'])
         rospy.Subscriber('/vehicle/brake_cmd', BrakeCmd, self.brake_cmd_cb, queue_size=1)
         self.brake_rep = None
-        self.brake_rep_deq = deque([], maxlen=DEQUEU_MAX_LEN*5)
-        self.brake_rep_deq_t = deque([], maxlen=DEQUEU_MAX_LEN*5)
+        self.brake_rep_hist = RingBuffer(TELEMETRY_HISTORY_LEN, ['time', 'value'])
         rospy.Subscriber('/vehicle/brake_report', Float, self.brake_rep_cb, queue_size=1)
 
         self.lights = None
+        self.lights_polygon = None
         rospy.Subscriber('/vehicle/traffic_lights', TrafficLightArray, self.traffic_cb, queue_size=1)
 
         self.traffic_light = - 1
@@ -106,9 +117,10 @@ class Visualization(QtWidgets.QWidget):
 
         self.initUI()
 
+        self.last_plot_time = 0.
         self.timer = QTimer()
-        self.timer.timeout.connect(self.repaint)
-        self.timer.setInterval(300)
+        self.timer.timeout.connect(self.update)
+        self.timer.setInterval(REPAINT_INTERVAL_MS)
         self.timer.start()
 
 
@@ -123,23 +135,53 @@ class Visualization(QtWidgets.QWidget):
 
     def initMPL(self):
         """
-        initialize matplotlib objects
+        initialize matplotlib objects. Lines are persistent artists, updated with fresh data and blitted
         """
         self.figure = Figure()
 
         self.throttle_axes = self.figure.add_subplot(411)
         self.throttle_axes.grid(True)
+        self.throttle_axes.set_ylim(0., 1.)
+        self.throttle_axes.set_ylabel("Throttle", fontsize=8)
+        self.throttle_axes.set_xlabel("Time", fontsize=8)
 
         self.brake_axes = self.figure.add_subplot(412, sharex=self.throttle_axes)
         self.brake_axes.grid(True)
+        self.brake_axes.set_ylim(0., 4000.)
+        self.brake_axes.set_ylabel("Brake", fontsize=8)
+        self.brake_axes.set_xlabel("Time", fontsize=8)
 
         self.steer_axes = self.figure.add_subplot(413, sharex=self.throttle_axes)
         self.steer_axes.grid(True)
+        self.steer_axes.set_ylabel("Steer Angle", fontsize=8)
+        self.steer_axes.set_xlabel("Time", fontsize=8)
 
         self.speed_axes = self.figure.add_subplot(414, sharex=self.throttle_axes)
         self.speed_axes.grid(True)
+        self.speed_axes.set_ylim(0, 15.)
+        self.speed_axes.set_ylabel("Speed", fontsize=8)
+        self.speed_axes.set_xlabel("Time", fontsize=8)
+
+        self.plot_axes = [self.throttle_axes, self.brake_axes, self.steer_axes, self.speed_axes]
+        # axes with data dependent y limits. others keep fixed limits
+        self.autoscale_y_axes = [self.steer_axes]
+        # (axes, line, history, column). animated lines are left out of full figure draws
+        self.plot_lines = []
+        for axes, history, column, style, alpha in [
+                (self.throttle_axes, self.throttle_cmd_hist, 'value', 'r', 1.0),
+                (self.throttle_axes, self.throttle_rep_hist, 'value', 'b', 0.5),
+                (self.brake_axes, self.brake_cmd_hist, 'value', 'r', 1.0),
+                (self.brake_axes, self.brake_rep_hist, 'value', 'b', 0.5),
+                (self.steer_axes, self.steering_cmd_hist, 'value', 'r', 1.0),
+                (self.steer_axes, self.steering_rep_hist, 'angle', 'b', 0.5),
+                (self.speed_axes, self.steering_rep_hist, 'speed', 'b', 0.5)]:
+            line, = axes.plot([], [], style, alpha=alpha, animated=True)
+            self.plot_lines.append((axes, line, history, column))
+        # axes backgrounds without lines, captured after every full draw
+        self.plot_backgrounds = None
 
         self.canvas = FigureCanvas(self.figure)
+        self.canvas.mpl_connect('draw_event', self.on_plot_draw)
         layout = QtWidgets.QVBoxLayout()
         self.plot_widget = QtWidgets.QWidget(self)
         mpl_x = 315
@@ -160,45 +202,65 @@ class Visualization(QtWidgets.QWidget):
         painter = QtGui.QPainter()
         painter.begin(self)
         self.drawPoints(painter)
-        self.draw_plots()
         painter.end()
+        if timer() - self.last_plot_time >= PLOT_PERIOD:
+            self.last_plot_time = timer()
+            self.draw_plots()
 
 
     def draw_plots(self):
         """
-        re-draw matplotlib plots with fresh data
-        """
-        self.throttle_axes.clear()
-        self.throttle_axes.set_ylim(0., 1.)
-        self.throttle_axes.grid(True)
-        self.throttle_axes.plot(self.throttle_cmd_deq_t, self.throttle_cmd_deq, 'r', alpha=1.0)
-        self.throttle_axes.plot(self.throttle_rep_deq_t, self.throttle_rep_deq, 'b', alpha=0.5)
-        self.throttle_axes.set_ylabel("Throttle", fontsize=8)
-        self.throttle_axes.set_xlabel("Time", fontsize=8)
-
-        self.brake_axes.clear()
-        self.brake_axes.set_ylim(0., 4000.)
-        self.brake_axes.grid(True)
-        self.brake_axes.plot(self.brake_cmd_deq_t, self.brake_cmd_deq, 'r', alpha=1.0)
-        self.brake_axes.plot(self.brake_rep_deq_t, self.brake_rep_deq, 'b', alpha=0.5)
-        self.brake_axes.set_ylabel("Brake", fontsize=8)
-        self.brake_axes.set_xlabel("Time", fontsize=8)
-
-        self.steer_axes.clear()
-        self.steer_axes.grid(True)
-        self.steer_axes.plot(self.steering_cmd_deq_t, self.steering_cmd_deq, 'r', alpha=1.0)
-        self.steer_axes.plot(self.steering_rep_deq_t, self.steering_rep_angle_deq, 'b', alpha=0.5)
-        self.steer_axes.set_ylabel("Steer Angle", fontsize=8)
-        self.steer_axes.set_xlabel("Time", fontsize=8)
-
-        self.speed_axes.clear()
-        self.speed_axes.set_ylim(0, 15.)
-        self.speed_axes.grid(True)
-        self.speed_axes.plot(self.steering_rep_deq_t, self.steering_rep_speed_deq, 'b', alpha=0.5)
-        self.speed_axes.set_ylabel("Speed", fontsize=8)
-        self.speed_axes.set_xlabel("Time", fontsize=8)
-
-        self.canvas.draw()
+        update matplotlib lines with fresh data. Only lines are redrawn (blitted) over saved backgrounds,
+        whole figure is drawn again only when data leaves current axes limits
+        """
+        rescale = self.plot_backgrounds is None
+        t_min, t_max = None, None
+        for axes, line, history, column in self.plot_lines:
+            # ordered views of history, appended from rospy threads meanwhile
+            data = history.view()
+            t = data[0]
+            line.set_data(t, data[history.columns.index(column)])
+            if len(t) > 0:
+                t_min = t[0] if t_min is None else min(t_min, t[0])
+                t_max = t[-1] if t_max is None else max(t_max, t[-1])
+
+        if t_max is not None and t_max > self.throttle_axes.get_xlim()[1]:
+            # shared time axis of all plots
+            self.throttle_axes.set_xlim(t_min, t_max + PLOT_TIME_MARGIN)
+            rescale = True
+        for axes in self.autoscale_y_axes:
+            values = [line.get_ydata() for line_axes, line, _, _ in self.plot_lines
+                      if line_axes is axes and len(line.get_ydata()) > 0]
+            if not values:
+                continue
+            values_min = min(np.min(line_values) for line_values in values)
+            values_max = max(np.max(line_values) for line_values in values)
+            y_min, y_max = axes.get_ylim()
+            if values_min < y_min or values_max > y_max:
+                # margin, so that slowly drifting data does not rescale every time
+                margin = PLOT_Y_MARGIN * max(values_max - values_min, 1e-3)
+                axes.set_ylim(values_min - margin, values_max + margin)
+                rescale = True
+
+        if rescale:
+            # lines are drawn by on_plot_draw
+            self.canvas.draw()
+            return
+        for axes in self.plot_axes:
+            self.canvas.restore_region(self.plot_backgrounds[axes])
+            for line_axes, line, _, _ in self.plot_lines:
+                if line_axes is axes:
+                    axes.draw_artist(line)
+            self.canvas.blit(axes.bbox)
+
+    def on_plot_draw(self, event):
+        """
+        matplotlib draw_event callback. Saves backgrounds of axes after full draw (e.g. rescale or resize)
+        and draws lines over them
+        """
+        self.plot_backgrounds = dict((axes, self.canvas.copy_from_bbox(axes.bbox)) for axes in self.plot_axes)
+        for axes, line, _, _ in self.plot_lines:
+            axes.draw_artist(line)
 
 
     def calculate_position(self, orig_x, orig_y):
@@ -216,20 +278,48 @@ class Visualization(QtWidgets.QWidget):
         y = (orig_y + mov_y) * 900 / (self.max_y - self.min_y) + 40
         return (x, y)
 
+    def positions_polygon(self, positions):
+        """
+        Window positions of map positions as polygon, to draw them all with one painter.drawPoints call
+        :param positions: list of geometry_msgs/Point
+        :return: QPolygonF
+        """
+        x, y = self.calculate_position(np.array([position.x for position in positions]),
+                                       np.array([position.y for position in positions]))
+        return QPolygonF([QPointF(px, py) for px, py in zip(x, y)])
+
+    def get_track_layer(self):
+        """
+        Pixmap with the whole track (base waypoints) drawn, rendered again only when
+        waypoints changed or window was resized
+        :return: QPixmap
+        """
+        if self.track_layer is None or self.track_layer.size() != self.size():
+            track_layer = QtGui.QPixmap(self.size())
+            track_layer.fill(Qt.transparent)
+            if self.track_polygon is not None:
+                painter = QtGui.QPainter(track_layer)
+                pen = QPen()
+                pen.setWidth(4)
+                pen.setColor(Qt.black)
+                painter.setPen(pen)
+                painter.drawPoints(self.track_polygon)
+                painter.end()
+            self.track_layer = track_layer
+        return self.track_layer
+
     def draw_traffic_lights(self, painter):
         """
         If traffic lights have been provided, draw them.
         :param painter:
         :return:
         """
-        if self.lights:
+        if self.lights_polygon is not None:
             pen = QPen()
             pen.setWidth(10)
             pen.setColor(Qt.blue)
             painter.setPen(pen)
-            for position in self.lights:
-                x, y = self.calculate_position(position.pose.pose.position.x, position.pose.pose.position.y)
-                painter.drawPoint(x, y)
+            painter.drawPoints(self.lights_polygon)
 
     def draw_dbw_enabled(self, painter):
         """
@@ -280,27 +370,16 @@ class Visualization(QtWidgets.QWidget):
         :param painter:
         :return:
         """
-        # draw the whole track (base waypoints)
-        pen = QPen()
-        pen.setWidth(4)
-        pen.setColor(Qt.black)
-        painter.setPen(pen)
-        if self.base_waypoints:
-            for waypoint in self.base_waypoints:
-                x, y = self.calculate_position(waypoint.pose.pose.position.x,
-                                               waypoint.pose.pose.position.y)
-                painter.drawPoint(x, y)
+        # draw the whole track (base waypoints), pre-rendered
+        painter.drawPixmap(0, 0, self.get_track_layer())
 
         # draw final waypoints published (immediately in front, with the required speed)
         pen = QPen()
         pen.setWidth(6)
         pen.setColor(Qt.red)
         painter.setPen(pen)
-        if self.final_waypoints:
-            for waypoint in self.final_waypoints:
-                x, y = self.calculate_position(waypoint.pose.pose.position.x,
-                                               waypoint.pose.pose.position.y)
-                painter.drawPoint(x, y)
+        if self.final_waypoints_polygon is not None:
+            painter.drawPoints(self.final_waypoints_polygon)
 
         # draw steering command and report
         cx = 130
@@ -395,6 +474,8 @@ class Visualization(QtWidgets.QWidget):
         :return:
         """
         self.final_waypoints = msg.waypoints
+        self.final_waypoints_polygon = self.positions_polygon([waypoint.pose.pose.position
+                                                               for waypoint in msg.waypoints])
 
     def steering_cmd_cb(self, msg):
         """
@@ -403,9 +484,8 @@ class Visualization(QtWidgets.QWidget):
         :return:
         """
         self.steering_cmd = msg.steering_wheel_angle_cmd
-        # add to deque for plotting
-        self.steering_cmd_deq_t.append(timer()-self.start_time)
-        self.steering_cmd_deq.append(self.steering_cmd)
+        # add to history for plotting
+        self.steering_cmd_hist.append(timer()-self.start_time, self.steering_cmd)
 
     def steering_rep_cb(self, msg):
         """
@@ -414,10 +494,9 @@ class Visualization(QtWidgets.QWidget):
         :return:
         """
         self.steering_rep = msg
-        # add to deque for plotting
-        self.steering_rep_deq_t.append(timer()-self.start_time)
-        self.steering_rep_speed_deq.append(self.steering_rep.speed)
-        self.steering_rep_angle_deq.append(self.steering_rep.steering_wheel_angle)
+        # add to history for plotting
+        self.steering_rep_hist.append(timer()-self.start_time, self.steering_rep.speed,
+                                      self.steering_rep.steering_wheel_angle)
 
     def throttle_cmd_cb(self, msg):
         """
@@ -428,9 +507,8 @@ class Visualization(QtWidgets.QWidget):
         self.throttle_enable = msg.enable
         self.throttle_cmd_type = msg.pedal_cmd_type
         self.throttle_cmd = msg.pedal_cmd
-        # add to deque for plotting
-        self.throttle_cmd_deq_t.append(timer()-self.start_time)
-        self.throttle_cmd_deq.append(self.throttle_cmd)
+        # add to history for plotting
+        self.throttle_cmd_hist.append(timer()-self.start_time, self.throttle_cmd)
 
     def throttle_rep_cb(self, msg):
         """
@@ -439,9 +517,8 @@ class Visualization(QtWidgets.QWidget):
         :return:
         """
         self.throttle_rep = msg.data
-        # add to deque for plotting
-        self.throttle_rep_deq_t.append(timer()-self.start_time)
-        self.throttle_rep_deq.append(self.throttle_rep)
+        # add to history for plotting
+        self.throttle_rep_hist.append(timer()-self.start_time, self.throttle_rep)
 
     def brake_cmd_cb(self, msg):
         """
@@ -452,9 +529,8 @@ class Visualization(QtWidgets.QWidget):
         self.brake_enable = msg.enable
         self.brake_cmd_type = msg.pedal_cmd_type
         self.brake_cmd = msg.pedal_cmd
-        # add to deque for plotting
-        self.brake_cmd_deq_t.append(timer()-self.start_time)
-        self.brake_cmd_deq.append(self.brake_cmd)
+        # add to history for plotting
+        self.brake_cmd_hist.append(timer()-self.start_time, self.brake_cmd)
 
     def brake_rep_cb(self, msg):
         """
@@ -463,9 +539,8 @@ class Visualization(QtWidgets.QWidget):
         :return:
         """
         self.brake_rep = msg.data
-        # add to deque for plotting
-        self.brake_rep_deq_t.append(timer()-self.start_time)
-        self.brake_rep_deq.append(self.brake_rep)
+        # add to history for plotting
+        self.brake_rep_hist.append(timer()-self.start_time, self.brake_rep)
 
     def base_waypoints_cb(self, msg):
         """
@@ -475,18 +550,19 @@ class Visualization(QtWidgets.QWidget):
         """
         self.base_waypoints = msg.waypoints
 
-        max_x = -sys.maxint
-        max_y = -sys.maxint
-        min_x = sys.maxint
-        min_y = sys.maxint
-        for waypoint in self.base_waypoints:
-            max_x = max(waypoint.pose.pose.position.x, max_x)
-            max_y = max(waypoint.pose.pose.position.y, max_y)
-            min_x = min(waypoint.pose.pose.position.x, min_x)
-            min_y = min(waypoint.pose.pose.position.y, min_y)
+        positions = [waypoint.pose.pose.position for waypoint in self.base_waypoints]
+        xs = np.array([position.x for position in positions])
+        ys = np.array([position.y for position in positions])
+        max_x, max_y, min_x, min_y = (xs.max(), ys.max(), xs.min(), ys.min())
         rospy.logwarn("x and y %r %r   %r %r", max_x, max_y, min_x, min_y)
         self.max_x, self.max_y, self.min_x, self.min_y = (max_x, max_y, min_x, min_y)
 
+        # render track layer again on next repaint
+        self.track_polygon = self.positions_polygon(positions)
+        self.track_layer = None
+        if self.lights:
+            self.lights_polygon = self.positions_polygon([light.pose.pose.position for light in self.lights])
+
     def camera_callback(self, data):
         """
         Callback for /image_color
@@ -509,6 +585,7 @@ class Visualization(QtWidgets.QWidget):
         :return:
         """
         self.lights = msg.lights
+        self.lights_polygon = self.positions_polygon([light.pose.pose.position for light in msg.lights])
 
     def traffic_waypoint_cb(self, msg):
         """
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+Headless telemetry recorder. Subscribes to the same topics as show_waypoints.py and writes them to disk,
+so that runs can be analyzed later with telemetry_report.py, without a display.
+
+Output directory layout:
+- index.yaml: names of channels, track stop lines and traffic light positions
+- <channel>.bin: trace of channel columns written by instrumentation.trace_recorder.TraceRecorder,
+  flushed every ~flush_period seconds. Columns are in <channel>.bin.yaml, read it back with read_trace
+- frames/<time>.png: /image_debug frames (detected traffic lights), at most one every ~image_period seconds
+
+Params:
+- ~output_dir: directory to write to, default telemetry_<date>_<time> in working directory
+- ~flush_period: seconds between writes to disk (1)
+- ~image_period: min seconds between saved debug frames (1), 0 disables frames
+"""
+import os
+import time
+
+import yaml
+
+import rospy
+from std_msgs.msg import Int32, Bool
+from std_msgs.msg import Float32 as Float
+from geometry_msgs.msg import PoseStamped
+from dbw_mkz_msgs.msg import SteeringCmd, SteeringReport, ThrottleCmd, BrakeCmd
+from styx_msgs.msg import TrafficLightArray, Lane
+from sensor_msgs.msg import Image
+from cv_bridge import CvBridge
+
+import cv2
+
+from instrumentation.trace_recorder import TraceRecorder
+
+# Columns of every recorded channel
+CHANNELS = {
+    'steering_cmd': ['time', 'value'],
+    'steering_report': ['time', 'speed', 'angle'],
+    'throttle_cmd': ['time', 'value'],
+    'throttle_report': ['time', 'value'],
+    'brake_cmd': ['time', 'value'],
+    'brake_report': ['time', 'value'],
+    'pose': ['time', 'x', 'y'],
+    'traffic_waypoint': ['time', 'index'],
+    'dbw_enabled': ['time', 'enabled'],
+    # base waypoints, written once
+    'track': ['x', 'y'],
+}
+INDEX_FILE = 'index.yaml'
+FRAMES_DIR = 'frames'
+
+
+def channel_path(directory, channel):
+    """Path of data file of channel"""
+    return os.path.join(directory, channel + '.bin')
+
+
+class TelemetryRecorder(object):
+    """Records every channel with its own TraceRecorder, flushes them to disk periodically"""
+
+    def __init__(self):
+        rospy.init_node('telemetry_recorder')
+        self.output_dir = rospy.get_param('~output_dir', time.strftime('telemetry_%Y%m%d_%H%M%S'))
+        self.image_period = rospy.get_param('~image_period', 1.)
+        flush_period = rospy.get_param('~flush_period', 1.)
+        if not os.path.isdir(os.path.join(self.output_dir, FRAMES_DIR)):
+            os.makedirs(os.path.join(self.output_dir, FRAMES_DIR))
+
+        self.recorders = dict((channel, TraceRecorder(channel_path(self.output_dir, channel), columns))
+                              for channel, columns in CHANNELS.items())
+        self.index = {'channels': sorted(CHANNELS), 'stop_lines': [], 'lights': []}
+        if rospy.has_param('/traffic_light_config'):
+            config = yaml.safe_load(rospy.get_param('/traffic_light_config'))
+            self.index['stop_lines'] = [[float(x), float(y)] for x, y in config['stop_line_positions']]
+        self.write_index()
+        self.last_image_time = 0.
+        self.bridge = CvBridge()
+
+        rospy.Subscriber('/vehicle/steering_cmd', SteeringCmd, self.steering_cmd_cb, queue_size=10)
+        rospy.Subscriber('/vehicle/steering_report', SteeringReport, self.steering_rep_cb, queue_size=10)
+        rospy.Subscriber('/vehicle/throttle_cmd', ThrottleCmd, self.throttle_cmd_cb, queue_size=10)
+        rospy.Subscriber('/vehicle/throttle_report', Float, self.throttle_rep_cb, queue_size=10)
+        rospy.Subscriber('/vehicle/brake_cmd', BrakeCmd, self.brake_cmd_cb, queue_size=10)
+        rospy.Subscriber('/vehicle/brake_report', Float, self.brake_rep_cb, queue_size=10)
+        rospy.Subscriber('/current_pose', PoseStamped, self.current_pose_cb, queue_size=10)
+        rospy.Subscriber('/traffic_waypoint', Int32, self.traffic_waypoint_cb, queue_size=10)
+        rospy.Subscriber('/vehicle/dbw_enabled', Bool, self.dbw_enabled_cb, queue_size=10)
+        rospy.Subscriber('/base_waypoints', Lane, self.base_waypoints_cb, queue_size=1)
+        rospy.Subscriber('/vehicle/traffic_lights', TrafficLightArray, self.traffic_cb, queue_size=1)
+        if self.image_period > 0:
+            rospy.Subscriber('/image_debug', Image, self.image_debug_cb, queue_size=1)
+
+        rospy.logwarn("telemetry_recorder: recording to {}".format(os.path.abspath(self.output_dir)))
+        rospy.Timer(rospy.Duration(flush_period), self.flush)
+        rospy.on_shutdown(self.close)
+        rospy.spin()
+
+    def record(self, channel, *values):
+        self.recorders[channel].append(*values)
+
+    def flush(self, event=None):
+        """Writes buffered rows of all channels to disk"""
+        for recorder in self.recorders.values():
+            recorder.flush()
+
+    def close(self):
+        for recorder in self.recorders.values():
+            recorder.close()
+
+    def write_index(self):
+        with open(os.path.join(self.output_dir, INDEX_FILE), 'w') as index_file:
+            yaml.safe_dump(self.index, index_file, default_flow_style=False)
+
+    def steering_cmd_cb(self, msg):
+        self.record('steering_cmd', rospy.get_time(), msg.steering_wheel_angle_cmd)
+
+    def steering_rep_cb(self, msg):
+        self.record('steering_report', rospy.get_time(), msg.speed, msg.steering_wheel_angle)
+
+    def throttle_cmd_cb(self, msg):
+        self.record('throttle_cmd', rospy.get_time(), msg.pedal_cmd)
+
+    def throttle_rep_cb(self, msg):
+        self.record('throttle_report', rospy.get_time(), msg.data)
+
+    def brake_cmd_cb(self, msg):
+        self.record('brake_cmd', rospy.get_time(), msg.pedal_cmd)
+
+    def brake_rep_cb(self, msg):
+        self.record('brake_report', rospy.get_time(), msg.data)
+
+    def current_pose_cb(self, msg):
+        self.record('pose', rospy.get_time(), msg.pose.position.x, msg.pose.position.y)
+
+    def traffic_waypoint_cb(self, msg):
+        self.record('traffic_waypoint', rospy.get_time(), msg.data)
+
+    def dbw_enabled_cb(self, msg):
+        self.record('dbw_enabled', rospy.get_time(), float(msg.data))
+
+    def base_waypoints_cb(self, msg):
+        """Track is written once, whole. Later messages replace it"""
+        # a new recorder truncates the track of earlier messages
+        recorder = TraceRecorder(channel_path(self.output_dir, 'track'), CHANNELS['track'],
+                                 chunk_size=max(1, len(msg.waypoints)))
+        for waypoint in msg.waypoints:
+            recorder.append(waypoint.pose.pose.position.x, waypoint.pose.pose.position.y)
+        recorder.flush()
+        self.recorders['track'].close()
+        self.recorders['track'] = recorder
+
+    def traffic_cb(self, msg):
+        """Positions of traffic lights, written to index once (simulator only)"""
+        if self.index['lights']:
+            return
+        self.index['lights'] = [[light.pose.pose.position.x, light.pose.pose.position.y] for light in msg.lights]
+        self.write_index()
+
+    def image_debug_cb(self, msg):
+        """Saves debug frame as PNG named by its time, at most every image_period seconds"""
+        now = rospy.get_time()
+        if now - self.last_image_time < self.image_period:
+            return
+        self.last_image_time = now
+        image = self.bridge.imgmsg_to_cv2(msg, 'bgr8')
+        cv2.imwrite(os.path.join(self.output_dir, FRAMES_DIR, '{:.3f}.png'.format(now)), image)
+
+
+if __name__ == '__main__':
+    try:
+        TelemetryRecorder()
+    except rospy.ROSInterruptException:
+        rospy.logerr('Could not start telemetry recorder node.')
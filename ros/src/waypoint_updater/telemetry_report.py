@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+Offline report of a run recorded by telemetry_recorder.py. Needs neither ROS nor a display,
+only package instrumentation to read the traces: source ros/devel/setup.sh or set
+PYTHONPATH=ros/src/instrumentation/src.
+
+Writes into the recording directory (or --output-dir):
+- telemetry.png: throttle, brake, steering, speed and traffic waypoint over time, like show_waypoints.py
+- track.png: track, driven path, stop lines and traffic lights
+- report.html: summary, both plots and a selection of traffic light debug frames
+
+Usage:
+
+    ./telemetry_report.py <recording directory> [--output-dir <dir>] [--max-frames 24]
+"""
+from __future__ import print_function
+
+import argparse
+import glob
+import os
+
+import numpy as np
+import yaml
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+from instrumentation.trace_recorder import read_trace
+
+INDEX_FILE = 'index.yaml'
+FRAMES_DIR = 'frames'
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Carla telemetry: {name}</title>
+<style>
+body {{ font-family: sans-serif; margin: 20px; }}
+td, th {{ padding: 2px 12px; text-align: left; }}
+.frame {{ display: inline-block; margin: 4px; font-size: 12px; }}
+</style></head>
+<body>
+<h1>Carla telemetry: {name}</h1>
+<table>{summary}</table>
+<h2>Telemetry</h2>
+<img src="{telemetry}">
+<h2>Track</h2>
+<img src="{track}">
+<h2>Traffic light debug frames</h2>
+{frames}
+</body>
+</html>
+"""
+
+
+def read_recording(directory):
+    """Reads all channels of recording.
+
+    Returns:
+        (dict, dict): index (channels, stop lines, lights), channel -> column -> np.array
+    """
+    with open(os.path.join(directory, INDEX_FILE)) as index_file:
+        index = yaml.safe_load(index_file)
+    channels = dict((channel, read_trace(os.path.join(directory, channel + '.bin')))
+                    for channel in index['channels'])
+    return index, channels
+
+
+def start_time(channels):
+    """Earliest timestamp over all channels, 0 if nothing was recorded"""
+    starts = [channel['time'][0] for channel in channels.values() if 'time' in channel and len(channel['time'])]
+    return min(starts) if starts else 0.
+
+
+def plot_telemetry(channels, t0, path):
+    """Time plots of commands and reports, like show_waypoints.py draws them"""
+    figure = Figure(figsize=(12, 12))
+    panels = [
+        ('Throttle', [('throttle_cmd', 'value', 'r', 1.0), ('throttle_report', 'value', 'b', 0.5)]),
+        ('Brake', [('brake_cmd', 'value', 'r', 1.0), ('brake_report', 'value', 'b', 0.5)]),
+        ('Steer Angle', [('steering_cmd', 'value', 'r', 1.0), ('steering_report', 'angle', 'b', 0.5)]),
+        ('Speed', [('steering_report', 'speed', 'b', 0.5)]),
+        ('Traffic Waypoint', [('traffic_waypoint', 'index', 'k', 1.0)]),
+    ]
+    axes = None
+    for i, (label, lines) in enumerate(panels):
+        axes = figure.add_subplot(len(panels), 1, i + 1, sharex=axes)
+        axes.grid(True)
+        axes.set_ylabel(label, fontsize=8)
+        for channel, column, style, alpha in lines:
+            data = channels[channel]
+            axes.plot(data['time'] - t0, data[column], style, alpha=alpha, drawstyle='steps-post')
+    axes.set_xlabel("Time, s", fontsize=8)
+    figure.tight_layout()
+    FigureCanvas(figure).print_png(path)
+
+
+def plot_track(index, channels, path):
+    """Map of the track with driven path, stop lines and traffic lights"""
+    figure = Figure(figsize=(10, 10))
+    axes = figure.add_subplot(111)
+    axes.set_aspect('equal')
+    axes.grid(True)
+    track = channels['track']
+    axes.plot(track['x'], track['y'], 'k.', markersize=1, label='track')
+    pose = channels['pose']
+    axes.plot(pose['x'], pose['y'], color='darkmagenta', linewidth=2, label='driven')
+    if index.get('stop_lines'):
+        stop_lines = np.array(index['stop_lines'])
+        axes.plot(stop_lines[:, 0], stop_lines[:, 1], 'rx', markersize=10, mew=2, label='stop lines')
+    if index.get('lights'):
+        lights = np.array(index['lights'])
+        axes.plot(lights[:, 0], lights[:, 1], 'bo', label='traffic lights')
+    axes.legend(loc='best', fontsize=8)
+    FigureCanvas(figure).print_png(path)
+
+
+def summary_rows(channels, t0):
+    """(name, value) rows of run summary"""
+    ends = [channel['time'][-1] for channel in channels.values() if 'time' in channel and len(channel['time'])]
+    rows = [('Duration, s', '{:.1f}'.format(max(ends) - t0 if ends else 0.))]
+    speed = channels['steering_report']['speed']
+    rows.append(('Max speed, km/h', '{:.1f}'.format(speed.max() * 3.6 if len(speed) else 0.)))
+    enabled = channels['dbw_enabled']['enabled']
+    rows.append(('DBW enabled samples', '{}/{}'.format(int(enabled.sum()), len(enabled))))
+    stops = channels['traffic_waypoint']['index']
+    rows.append(('Traffic waypoint RED samples', '{}/{}'.format(int((stops >= 0).sum()), len(stops))))
+    for channel in sorted(channels):
+        rows.append(('{} samples'.format(channel), str(len(next(iter(channels[channel].values()))))))
+    return rows
+
+
+def select_frames(directory, max_frames):
+    """Paths of up to max_frames debug frames spread evenly over the run, with their times"""
+    paths = sorted(glob.glob(os.path.join(directory, FRAMES_DIR, '*.png')),
+                   key=lambda path: float(os.path.splitext(os.path.basename(path))[0]))
+    if len(paths) > max_frames:
+        paths = [paths[i] for i in np.linspace(0, len(paths) - 1, max_frames).astype(int)]
+    return [(path, float(os.path.splitext(os.path.basename(path))[0])) for path in paths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate PNG/HTML report of a run recorded by telemetry_recorder')
+    parser.add_argument('directory', help='recording directory')
+    parser.add_argument('--output-dir', default=None, help='where to write report, recording directory by default')
+    parser.add_argument('--max-frames', type=int, default=24, help='max number of debug frames in report')
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or args.directory
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    index, channels = read_recording(args.directory)
+    t0 = start_time(channels)
+
+    plot_telemetry(channels, t0, os.path.join(output_dir, 'telemetry.png'))
+    plot_track(index, channels, os.path.join(output_dir, 'track.png'))
+
+    summary = ''.join('<tr><th>{}</th><td>{}</td></tr>'.format(name, value)
+                      for name, value in summary_rows(channels, t0))
+    frames = ''.join('<div class="frame"><img src="{}"><br>{:.1f}s</div>'.format(
+        os.path.relpath(path, output_dir), frame_time - t0)
+        for path, frame_time in select_frames(args.directory, args.max_frames))
+    html = HTML_TEMPLATE.format(name=os.path.basename(os.path.abspath(args.directory)), summary=summary,
+                                telemetry='telemetry.png', track='track.png', frames=frames or '<p>none</p>')
+    report_path = os.path.join(output_dir, 'report.html')
+    with open(report_path, 'w') as report_file:
+        report_file.write(html)
+    print('report written to {}'.format(report_path))
+
+
+if __name__ == '__main__':
+    main()
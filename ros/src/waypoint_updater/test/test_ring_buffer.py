@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Unit tests of RingBuffer, without ROS
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ring_buffer import RingBuffer
+
+
+def filled(count, capacity=8, headroom=None):
+    """Buffer of columns time, value with samples (i, 10 * i) for i < count"""
+    buf = RingBuffer(capacity, ['time', 'value'], headroom=headroom)
+    for i in range(count):
+        buf.append(i, 10 * i)
+    return buf
+
+
+class TestRingBuffer(unittest.TestCase):
+
+    def test_empty(self):
+        buf = filled(0)
+        self.assertEqual(len(buf), 0)
+        self.assertEqual(buf.view().shape, (2, 0))
+
+    def test_partially_filled(self):
+        buf = filled(3)
+        self.assertEqual(len(buf), 3)
+        np.testing.assert_array_equal(buf.view(), [[0, 1, 2], [0, 10, 20]])
+
+    def test_last_samples_in_order_after_wrap_around(self):
+        for count in range(8, 40):
+            buf = filled(count)
+            self.assertEqual(len(buf), 8)
+            np.testing.assert_array_equal(buf.column('time'), np.arange(count - 8, count))
+            np.testing.assert_array_equal(buf.column('value'), 10 * np.arange(count - 8, count))
+
+    def test_last_n(self):
+        buf = filled(20)
+        np.testing.assert_array_equal(buf.column('time', 3), [17, 18, 19])
+        np.testing.assert_array_equal(buf.column('time', 100), np.arange(12, 20))
+        np.testing.assert_array_equal(filled(2).column('time', 5), [0, 1])
+
+    def test_view_is_not_a_copy(self):
+        buf = filled(20)
+        self.assertIsNot(buf.view().base, None)
+
+    def test_view_valid_for_headroom_appends(self):
+        buf = filled(20, capacity=8, headroom=4)
+        view = buf.view()
+        expected = view.copy()
+        for i in range(20, 24):
+            buf.append(i, 10 * i)
+        np.testing.assert_array_equal(view, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Unit tests of telemetry_report on a recording written like telemetry_recorder writes it, without ROS
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import yaml
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, '..'))
+sys.path.insert(0, os.path.join(TEST_DIR, '..', '..', 'instrumentation', 'src'))
+
+from instrumentation.trace_recorder import TraceRecorder
+import telemetry_report
+
+# same as telemetry_recorder.CHANNELS
+CHANNELS = {
+    'steering_cmd': ['time', 'value'],
+    'steering_report': ['time', 'speed', 'angle'],
+    'throttle_cmd': ['time', 'value'],
+    'throttle_report': ['time', 'value'],
+    'brake_cmd': ['time', 'value'],
+    'brake_report': ['time', 'value'],
+    'pose': ['time', 'x', 'y'],
+    'traffic_waypoint': ['time', 'index'],
+    'dbw_enabled': ['time', 'enabled'],
+    'track': ['x', 'y'],
+}
+
+
+class TestTelemetryReport(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        recorders = dict((channel, TraceRecorder(os.path.join(self.directory, channel + '.bin'), columns))
+                         for channel, columns in CHANNELS.items())
+        for i in range(5):
+            t = 100. + i * 0.1
+            recorders['steering_report'].append(t, 10. + i, 0.1)
+            recorders['pose'].append(t, i, 2. * i)
+            recorders['traffic_waypoint'].append(t, -1 if i < 3 else 250)
+            recorders['dbw_enabled'].append(t, 1.)
+        recorders['throttle_cmd'].append(99.5, 0.2)
+        recorders['track'].append(0., 0.)
+        recorders['track'].append(1., 2.)
+        # killed recorder: rows of pose after the last flush are lost
+        recorders['pose'].flush()
+        recorders['pose'].append(200., 0., 0.)
+        self.killed = recorders.pop('pose')
+        for recorder in recorders.values():
+            recorder.close()
+        with open(os.path.join(self.directory, telemetry_report.INDEX_FILE), 'w') as index_file:
+            yaml.safe_dump({'channels': sorted(CHANNELS), 'stop_lines': [[1., 1.]], 'lights': []}, index_file)
+
+    def tearDown(self):
+        self.killed.close()
+        shutil.rmtree(self.directory)
+
+    def test_read_recording(self):
+        index, channels = telemetry_report.read_recording(self.directory)
+        self.assertEqual(index['stop_lines'], [[1., 1.]])
+        self.assertEqual(sorted(channels), sorted(CHANNELS))
+        for channel, columns in CHANNELS.items():
+            self.assertEqual(sorted(channels[channel]), sorted(columns))
+        np.testing.assert_array_equal(channels['pose']['y'], [0., 2., 4., 6., 8.])
+        np.testing.assert_array_equal(channels['track']['y'], [0., 2.])
+        self.assertEqual(len(channels['brake_cmd']['time']), 0)
+
+    def test_summary(self):
+        _, channels = telemetry_report.read_recording(self.directory)
+        t0 = telemetry_report.start_time(channels)
+        self.assertEqual(t0, 99.5)
+        rows = dict(telemetry_report.summary_rows(channels, t0))
+        self.assertEqual(rows['Duration, s'], '0.9')
+        self.assertEqual(rows['Max speed, km/h'], '50.4')
+        self.assertEqual(rows['DBW enabled samples'], '5/5')
+        self.assertEqual(rows['Traffic waypoint RED samples'], '2/5')
+        self.assertEqual(rows['brake_cmd samples'], '0')
+
+
+if __name__ == '__main__':
+    unittest.main()
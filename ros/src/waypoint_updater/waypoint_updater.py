@@ -15,56 +15,70 @@ as well as to verify your TL classifier.
 TODO (for Yousuf and Aaron): Stopline location for each traffic light.
 """
 
-import math
 import numpy as np
 import rospy
 from std_msgs.msg import Int32
 from geometry_msgs.msg import PoseStamped
-from geometry_msgs.msg import TwistStamped
-from styx_msgs.msg import Lane
-from waypoint_helper import is_waypoint_behind_pose
+from geometry_msgs.msg import Twist, TwistStamped, Vector3
+from styx_msgs.msg import Lane, Waypoint
+from carla_core.waypoints import closest_waypoint_index, distance, waypoint_indices
+from instrumentation.latency import LatencyStats
+from instrumentation.diagnostics import LatencyPublisher
+from instrumentation.tracing import TracePublisher, FINAL_WAYPOINTS
+from node_composition import intra_process
 
 LOOKAHEAD_WPS = 200 # Number of waypoints we will publish. You can change this number via parameter
 PUBLISHER_RATE = 1  # Publishin rate on channel /final_waypoints
 MAX_SPEED = 10 # replace with the configurable one
 
-dl = lambda a, b: math.sqrt((a.x-b.x)**2 + (a.y-b.y)**2  + (a.z-b.z)**2)
-
 class WaypointUpdater(object):
-    """WaypointUpdater computes the Lane the car should follow."""
+    """WaypointUpdater computes the Lane the car should follow. Create after rospy.init_node, then run loop."""
 
     def __init__(self):
         global LOOKAHEAD_WPS
-        rospy.init_node('waypoint_updater')
 
         LOOKAHEAD_WPS = rospy.get_param('lookahead_wps', LOOKAHEAD_WPS)
 
-        rospy.Subscriber('/current_pose', PoseStamped, self.pose_cb)
-        rospy.Subscriber('/base_waypoints', Lane, self.waypoints_cb)
-        rospy.Subscriber('/traffic_waypoint', Int32, self.traffic_cb)
-        rospy.Subscriber('/current_velocity', TwistStamped, self.velocity_cb)
+        # Latency of callbacks and of the publishing loop, published on /diagnostics
+        self.latency = LatencyStats()
+        LatencyPublisher(self.latency, intra_process.component_name('waypoint_updater'))
+        self.tracer = TracePublisher()
+
+        # Intra-process subscribers and publisher when composed with other nodes, see node_composition
+        intra_process.Subscriber('/current_pose', PoseStamped, self.latency.timed('pose_cb', self.pose_cb))
+        intra_process.Subscriber('/base_waypoints', Lane, self.latency.timed('waypoints_cb', self.waypoints_cb))
+        intra_process.Subscriber('/traffic_waypoint', Int32, self.latency.timed('traffic_cb', self.traffic_cb))
+        intra_process.Subscriber('/current_velocity', TwistStamped,
+                                 self.latency.timed('velocity_cb', self.velocity_cb))
 
         # TODO: Add a subscriber for /traffic_waypoint and /obstacle_waypoint below
 
-        self.final_waypoints_pub = rospy.Publisher('/final_waypoints', Lane, queue_size=1)
+        self.final_waypoints_pub = intra_process.Publisher('/final_waypoints', Lane, queue_size=1)
 
         self.current_pose = None
         self.current_frame_id = None
+        # Stamp of current pose, trace ID of the telemetry event it comes from
+        self.current_pose_stamp = None
         self.base_waypoints = None
         self.len_base_waypoints = 0
         self.seq = 0
         self.current_waypoint_ahead = None
         self.closest_obstacle = None
         self.current_velocity = 0
+
+    def loop(self):
+        """Publishes waypoints ahead at PUBLISHER_RATE until shutdown."""
         rate = rospy.Rate(PUBLISHER_RATE)
         while not rospy.is_shutdown():
-            self.publish_waypoints_ahead()
+            with self.latency.measure('publish_waypoints_ahead'):
+                self.publish_waypoints_ahead()
             rate.sleep()
 
     def pose_cb(self, msg):
         """Update the state of the vehicle and which frame is the current one."""
         self.current_pose = msg.pose
         self.current_frame_id = msg.header.frame_id
+        self.current_pose_stamp = msg.header.stamp
 
         if self.base_waypoints is None:
             return
@@ -91,14 +105,24 @@ class WaypointUpdater(object):
         return waypoint.twist.twist.linear.x
 
     def set_waypoint_velocity(self, waypoints, waypoint, velocity):
-        """Unwraps the waypoint object to set the value for the linear speed."""
-        waypoints[waypoint].twist.twist.linear.x = velocity
+        """Sets the linear speed of waypoint, replacing it in the list with a copy.
+
+        Base waypoints are not modified: when composed they are shared with tl_detector,
+        and published lanes with dbw_node, see node_composition.intra_process.
+        Only the twist is copied, the pose is shared.
+        """
+        original = waypoints[waypoint]
+        linear = original.twist.twist.linear
+        twist = TwistStamped(header=original.twist.header,
+                             twist=Twist(linear=Vector3(velocity, linear.y, linear.z),
+                                         angular=original.twist.twist.angular))
+        waypoints[waypoint] = Waypoint(pose=original.pose, twist=twist)
 
     def distance(self, waypoints, wp1, wp2):
         """Calculates the euclidean distance between two waypoints given."""
         dist = 0
         for i in xrange(wp1, wp2+1):
-            dist += dl(waypoints[wp1].pose.pose.position, waypoints[i].pose.pose.position)
+            dist += distance(waypoints[wp1].pose.pose.position, waypoints[i].pose.pose.position)
             wp1 = i
         return dist
 
@@ -112,18 +136,7 @@ class WaypointUpdater(object):
         Returns:
         cyclic list of waypoint indices
         """
-
-        # making sure that length does not overpass base waypoints length
-        length = min(self.len_base_waypoints, length)
-
-        end_index = start_index + length
-        q, r = divmod(end_index, self.len_base_waypoints)
-
-        # q can either be 0 or 1
-        if q == 0:
-            return range(start_index, r)
-
-        return range(start_index, self.len_base_waypoints) + range(0, r)
+        return waypoint_indices(start_index, length, self.len_base_waypoints)
 
     def _closest_waypoint_index(self):
         """ Computes the index of closest waypoint w.r.t current position."""
@@ -132,36 +145,10 @@ class WaypointUpdater(object):
                        self.current_pose.position.x,
                        self.current_pose.position.y)
 
-        if self.current_waypoint_ahead is None:
-            possible_waypoint_indices = self._get_waypoint_indices(0,
-                                                                   self.len_base_waypoints)
-            closest_distance = float('inf')
-        else:
-            possible_waypoint_indices = self._get_waypoint_indices(self.current_waypoint_ahead, LOOKAHEAD_WPS)
-            closest_distance = dl(self.base_waypoints[self.current_waypoint_ahead].pose.pose.position,
-                                  self.current_pose.position)
-
-        prev_index = possible_waypoint_indices.pop(0)
-        closer_point_found = True
+        self.current_waypoint_ahead = closest_waypoint_index(self.base_waypoints, self.current_pose,
+                                                             self.current_waypoint_ahead, LOOKAHEAD_WPS)
 
-        while closer_point_found and len(possible_waypoint_indices) > 0:
-            index = possible_waypoint_indices.pop(0)
-            distance = dl(self.base_waypoints[index].pose.pose.position,
-                          self.current_pose.position)
-
-            if distance > closest_distance:
-                closer_point_found = False
-            else:
-                closest_distance = distance
-                prev_index = index
-
-        while is_waypoint_behind_pose(self.current_pose, self.base_waypoints[prev_index]):
-            prev_index += 1
-            prev_index %= self.len_base_waypoints
-
-        self.current_waypoint_ahead = prev_index
-
-        return prev_index
+        return self.current_waypoint_ahead
 
 
     def publish_waypoints_ahead(self):
@@ -176,7 +163,8 @@ class WaypointUpdater(object):
 
         lane = Lane()
         lane.header.frame_id = self.current_frame_id
-        lane.header.stamp = rospy.Time.now()
+        # waypoints are computed from current pose, keep its stamp for latency tracing
+        lane.header.stamp = self.current_pose_stamp
         lane.header.seq = self.seq
         lane.waypoints = [self.base_waypoints[i] for i in waypoint_indices]
         if self.closest_obstacle is None or  self.closest_obstacle == -1 or self.closest_obstacle > waypoint_indices[-1]:
@@ -200,18 +188,20 @@ class WaypointUpdater(object):
             full_speed = np.ones(7*LOOKAHEAD_WPS//8) * MAX_SPEED
             speeds = np.concatenate((speeds, full_speed))
 
-        rospy.logwarn("wp_updater: published speed: {}".format(speeds))
+        rospy.logdebug("wp_updater: published speed: {}".format(speeds))
 
         lookahead = LOOKAHEAD_WPS if len(lane.waypoints) > LOOKAHEAD_WPS else len(lane.waypoints)
         for i in xrange(lookahead):
             self.set_waypoint_velocity(lane.waypoints, i, speeds)
 
         self.final_waypoints_pub.publish(lane)
+        self.tracer.trace(FINAL_WAYPOINTS, lane.header.stamp)
         self.seq += 1
 
 
 if __name__ == '__main__':
     try:
-        WaypointUpdater()
+        rospy.init_node('waypoint_updater')
+        WaypointUpdater().loop()
     except rospy.ROSInterruptException:
         rospy.logerr('Could not start waypoint updater node.')